@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the task-tracking CLI.
+
+Generates synthetic projects at several scales and times every command,
+in-process (cli.execute) and as a subprocess (task_tracking.py), reporting
+p50/p95/p99 latency, throughput and the `--timings` work counters of each
+command as one JSON object on stdout. The
+`startup` command times a bare interpreter against importing the CLI entry
+modules and lists the slowest imports.
+
+Example:
+    python3 references/benchmark.py --scales 1k,10k --repeat 20 > bench.json
+    python3 references/benchmark.py --scales 1k --baseline bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(BASE_DIR, "scripts")
+ENTRY = os.path.join(SCRIPTS_DIR, "task_tracking.py")
+SCALES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+MODES = ("inprocess", "subprocess")
+SORTS = ("created_at", "updated_at", "priority", "due_date")
+PRIORITIES = ("P0", "P1", "P2", "P3")
+PROJECT = "bench"
+RESULT_KEYS = ("scale", "command", "variant", "mode")
+VOCABULARY = 5000
+
+
+def _parse_scale(value):
+    value = value.strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid scale: {value}")
+    if n < 10:
+        raise argparse.ArgumentTypeError("scale must be >= 10 tasks")
+    return n
+
+
+def _status_names(count):
+    base = ["backlog", "open", "review", "done"]
+    return base[:count] + [f"status_{i}" for i in range(len(base), count)]
+
+
+def _iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+def _body(rng, body_bytes):
+    """Filler words with Zipf-like frequencies (word0 common, word1000 rare) for `search`."""
+    words = []
+    size = 0
+    while size < body_bytes:
+        word = f"word{min(int(rng.paretovariate(1.0)) - 1, VOCABULARY - 1)}"
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:body_bytes]
+
+
+def generate_project(root, tasks, statuses, tags, assignees, body_bytes, seed):
+    """Write a project in the canonical layout directly (no CLI round trips).
+
+    Returns `{task_id: status}` for the generated tasks.
+    """
+    rng = random.Random(seed)
+    names = _status_names(statuses)
+    project_dir = os.path.join(root, PROJECT)
+    indexes = {st: {} for st in names}
+    locations = {}
+    start = time.time() - 365 * 86400
+    for st in names:
+        os.makedirs(os.path.join(project_dir, st))
+    for i in range(tasks):
+        task_id = f"task_{i:07d}"
+        st = names[rng.randrange(len(names))]
+        created = start + rng.random() * 300 * 86400
+        meta = {
+            "task_id": task_id,
+            "created_at": _iso(created),
+            "updated_at": _iso(created + rng.random() * 60 * 86400),
+            "tags": sorted({f"tag_{rng.randrange(tags)}" for _ in range(rng.randint(0, 3))}),
+        }
+        if rng.random() < 0.8:
+            meta["assignee"] = f"user_{rng.randrange(assignees)}"
+        if rng.random() < 0.7:
+            meta["priority"] = PRIORITIES[rng.randrange(len(PRIORITIES))]
+        if rng.random() < 0.5:
+            meta["due_date"] = (datetime.date(2026, 1, 1) + datetime.timedelta(days=rng.randrange(365))).isoformat()
+        indexes[st][task_id] = meta
+        locations[task_id] = st
+        with open(os.path.join(project_dir, st, f"{task_id}.md"), "w", encoding="utf-8") as f:
+            f.write(_body(rng, body_bytes))
+    for st, index in indexes.items():
+        with open(os.path.join(project_dir, st, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, sort_keys=True)
+    return locations
+
+
+class Runner:
+    """Runs one CLI invocation in-process or as a subprocess and times it."""
+
+    def __init__(self, root, mode, env):
+        self.root = root
+        self.mode = mode
+        self.env = dict(env)
+
+    def run(self, argv):
+        if self.mode == "inprocess":
+            import cli
+            os.environ["TASK_TRACKING_ROOT"] = self.root
+            start = time.perf_counter_ns()
+            payload, exit_code = cli.execute(argv, env=self.env)
+            if cli.is_streamed(payload):
+                exit_code = cli.write_payload(payload, exit_code, lambda text: None)
+            else:
+                cli.render(payload)
+            return time.perf_counter_ns() - start, exit_code
+        env = dict(os.environ, **self.env)
+        env["TASK_TRACKING_ROOT"] = self.root
+        env["TASK_TRACKING_DAEMON"] = "off"
+        start = time.perf_counter_ns()
+        proc = subprocess.run(
+            [sys.executable, ENTRY] + argv,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
+        )
+        return time.perf_counter_ns() - start, proc.returncode
+
+    def counters(self, argv):
+        """`--timings` counters (files read, stats, paths resolved, indexes parsed) of one in-process run."""
+        import cli
+        os.environ["TASK_TRACKING_ROOT"] = self.root
+        payload, _ = cli.execute(argv, env=dict(self.env, TASK_TRACKING_TIMINGS="1"))
+        if cli.is_streamed(payload) or isinstance(payload, list):
+            objs = list(payload)
+            payload = objs[-1] if objs else {}
+        timings = payload.get("timings") if isinstance(payload, dict) else None
+        return timings["counters"] if timings else None
+
+
+def _percentile(sorted_values, pct):
+    # nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples_ns, errors):
+    values = sorted(samples_ns)
+    total_s = sum(values) / 1e9
+    ms = [v / 1e6 for v in values]
+    return {
+        "n": len(values),
+        "errors": errors,
+        "min_ms": round(ms[0], 3) if ms else None,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else None,
+        "p50_ms": round(_percentile(ms, 50), 3) if ms else None,
+        "p95_ms": round(_percentile(ms, 95), 3) if ms else None,
+        "p99_ms": round(_percentile(ms, 99), 3) if ms else None,
+        "max_ms": round(ms[-1], 3) if ms else None,
+        "throughput_ops_s": round(len(values) / total_s, 2) if total_s else None,
+    }
+
+
+def _list_variants():
+    variants = []
+    for sort in SORTS:
+        variants.append((f"sort={sort}", ["--sort", sort]))
+    variants.append(("sort=priority,asc", ["--sort", "priority", "--asc"]))
+    variants.append(("filter=tag", ["--tag", "tag_0"]))
+    variants.append(("filter=assignee", ["--assignee", "user_0"]))
+    variants.append(("filter=priority", ["--priority", "P1"]))
+    variants.append(("filter=tag+assignee", ["--tag", "tag_1", "--assignee", "user_1"]))
+    variants.append(("filter=tag|assignee", ["--tag", "tag_2", "--assignee", "user_2", "--filter-mode", "or"]))
+    variants.append(("page=offset500", ["--offset", "500", "--limit", "50"]))
+    variants.append(("ndjson=all", ["--ndjson", "--fields", "task_id"]))
+    return variants
+
+
+def _search_variants():
+    return [
+        ("term=common", ["word0"]),
+        ("term=rare", ["word300"]),
+        ("terms=and", ["word1 word2"]),
+        ("terms=or", ["word3 word40", "--mode", "or"]),
+    ]
+
+
+def bench_scale(args, scale, mode, root, locations, rng):
+    """Yield result dicts for every command at one scale in one mode."""
+    statuses = _status_names(args.statuses)
+    runner = Runner(root, mode, {"TASK_TRACKING_DURABILITY": args.durability} if args.durability else {})
+    task_ids = sorted(locations)
+
+    def timed(command, variant, make_argv, repeat=None):
+        samples = []
+        errors = 0
+        total = args.repeat if repeat is None else repeat
+        for i in range(args.warmup + total):
+            elapsed, exit_code = runner.run(make_argv(i))
+            if i < args.warmup:
+                continue
+            if exit_code != 0:
+                errors += 1
+            samples.append(elapsed)
+        result = {"scale": scale, "command": command, "variant": variant, "mode": mode}
+        result.update(summarize(samples, errors))
+        # one more, untimed run for the work counters (the same in both modes)
+        result["counters"] = runner.counters(make_argv(args.warmup + total))
+        return result
+
+    def pick():
+        return task_ids[rng.randrange(len(task_ids))]
+
+    if _wanted(args, "init-project"):
+        yield timed("init-project", "", lambda i: ["init-project", f"init_{mode}_{scale}_{i}", "--statuses", ",".join(statuses), "--backend", args.backend])
+    if _wanted(args, "add"):
+        yield timed("add", "", lambda i: ["add", PROJECT, "--task-id", f"add_{mode}_{i}", "--tags", "tag_0,tag_1", "--assignee", "user_0", "--priority", "P2", "--body", "benchmark"])
+    if _wanted(args, "list"):
+        for variant, extra in _list_variants():
+            yield timed("list", variant, lambda i, extra=extra: ["list", PROJECT] + extra)
+    if _wanted(args, "show"):
+        yield timed("show", "meta", lambda i: ["show", PROJECT, pick()])
+        yield timed("show", "body", lambda i: ["show", PROJECT, pick(), "--body"])
+    if _wanted(args, "move"):
+        def move_argv(i):
+            task_id = pick()
+            target = statuses[(statuses.index(locations[task_id]) + 1) % len(statuses)]
+            locations[task_id] = target
+            return ["move", PROJECT, task_id, target]
+        yield timed("move", "", move_argv)
+    if _wanted(args, "meta-update"):
+        yield timed("meta-update", "", lambda i: ["meta-update", PROJECT, pick(), "--patch-json", json.dumps({"set": {"priority": PRIORITIES[i % 4]}})])
+    if _wanted(args, "set-body"):
+        yield timed("set-body", "", lambda i: ["set-body", PROJECT, pick(), "--text", f"benchmark body {i}"])
+    if _wanted(args, "integrity-check"):
+        repeat = max(1, min(args.repeat, args.check_repeat))
+        yield timed("integrity-check", "", lambda i: ["integrity-check", PROJECT], repeat=repeat)
+        yield timed("integrity-check", "fix", lambda i: ["integrity-check", PROJECT, "--fix"], repeat=repeat)
+    if _wanted(args, "export") or _wanted(args, "import"):
+        # both run over the whole project, so they are capped like integrity-check
+        repeat = max(1, min(args.repeat, args.check_repeat))
+        for fmt in ("ndjson", "csv"):
+            path = f"{root}.{fmt}"
+            if _wanted(args, "export"):
+                yield timed("export", fmt, lambda i, fmt=fmt, path=path: ["export", PROJECT, "--format", fmt, "--output", path], repeat=repeat)
+            if _wanted(args, "import"):
+                if not os.path.exists(path):
+                    runner.run(["export", PROJECT, "--format", fmt, "--output", path])
+
+                def import_argv(i, fmt=fmt, path=path):
+                    # a fresh project per run; creating it is not part of the measurement
+                    project = f"import_{fmt}_{i}"
+                    runner.run(["init-project", project, "--statuses", ",".join(statuses), "--backend", args.backend])
+                    return ["import", project, "--format", fmt, "--file", path]
+                yield timed("import", fmt, import_argv, repeat=repeat)
+            if os.path.exists(path):
+                os.remove(path)
+    if _wanted(args, "search"):
+        # last, so the other commands run without a search index; the warmup run builds it
+        for variant, extra in _search_variants():
+            yield timed("search", variant, lambda i, extra=extra: ["search", PROJECT] + extra)
+
+
+def _import_profile(code, top=10):
+    """Modules with the largest self time under `python -X importtime`."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[0].startswith("import time:"):
+            continue
+        try:
+            self_us = int(parts[0].split(":", 1)[1])
+            cumulative_us = int(parts[1])
+        except ValueError:
+            continue
+        modules.append({"module": parts[2].strip(), "self_us": self_us, "cumulative_us": cumulative_us})
+    modules.sort(key=lambda m: m["self_us"], reverse=True)
+    return modules[:top]
+
+
+def bench_startup(args):
+    """Yield interpreter and CLI import cost (scale-independent, subprocess only)."""
+    load = f"import sys; sys.path.insert(0, {SCRIPTS_DIR!r}); import client, cli"
+    variants = (("python", "pass"), ("import", load))
+    for variant, code in variants:
+        samples = []
+        errors = 0
+        for i in range(args.warmup + args.repeat):
+            start = time.perf_counter_ns()
+            proc = subprocess.run([sys.executable, "-c", code], stdin=subprocess.DEVNULL)
+            elapsed = time.perf_counter_ns() - start
+            if i < args.warmup:
+                continue
+            if proc.returncode != 0:
+                errors += 1
+            samples.append(elapsed)
+        result = {"scale": None, "command": "startup", "variant": variant, "mode": "subprocess"}
+        result.update(summarize(samples, errors))
+        if variant == "import":
+            result["top_imports"] = _import_profile(load)
+        yield result
+
+
+def _convert(root, backend):
+    env = dict(os.environ, TASK_TRACKING_ROOT=root, TASK_TRACKING_DAEMON="off")
+    proc = subprocess.run([sys.executable, ENTRY, "convert-backend", PROJECT, "--to", backend], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"convert-backend failed: {proc.stdout.strip()}")
+
+
+def _wanted(args, command):
+    return not args.commands or command in args.commands
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "-C", BASE_DIR, "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {tuple(r.get(k) for k in RESULT_KEYS): r for r in baseline.get("results", [])}
+    for result in results:
+        before = previous.get(tuple(result[k] for k in RESULT_KEYS))
+        if not before:
+            continue
+        for field in ("p50_ms", "p95_ms", "p99_ms"):
+            if before.get(field) and result.get(field) is not None:
+                result[f"{field}_change_pct"] = round((result[field] - before[field]) / before[field] * 100, 1)
+        if before.get("counters") and result.get("counters"):
+            names = set(before["counters"]) | set(result["counters"])
+            change = {n: result["counters"].get(n, 0) - before["counters"].get(n, 0) for n in sorted(names)}
+            result["counters_change"] = {n: d for n, d in change.items() if d}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the task-tracking CLI on synthetic projects.")
+    parser.add_argument("--scales", default="1k,10k", help="comma list of 1k,10k,100k,1m or task counts")
+    parser.add_argument("--statuses", type=int, default=4)
+    parser.add_argument("--tags", type=int, default=50, help="distinct tag values")
+    parser.add_argument("--assignees", type=int, default=20, help="distinct assignee values")
+    parser.add_argument("--body-bytes", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per command and variant")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before each measurement")
+    parser.add_argument("--check-repeat", type=int, default=5, help="cap on timed integrity-check runs")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--commands", default="", help="comma list of commands to run (default: all)")
+    parser.add_argument("--durability", choices=("strict", "batch", "none"))
+    parser.add_argument("--backend", choices=("fs", "sqlite"), default="fs", help="storage backend of the generated projects")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--root", help="work directory (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated projects")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier report; adds *_change_pct fields")
+    args = parser.parse_args(argv)
+    args.scale_list = [_parse_scale(s) for s in args.scales.split(",") if s.strip()]
+    args.mode_list = [m.strip() for m in args.modes.split(",") if m.strip()]
+    if any(m not in MODES for m in args.mode_list):
+        parser.error(f"--modes must be a subset of {','.join(MODES)}")
+    args.commands = {c.strip() for c in args.commands.split(",") if c.strip()}
+    if args.statuses < 2:
+        parser.error("--statuses must be >= 2")
+    if args.tags < 3 or args.assignees < 3:
+        parser.error("--tags and --assignees must be >= 3")
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error("--repeat must be >= 1 and --warmup >= 0")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    sys.path.insert(0, SCRIPTS_DIR)
+    work = args.root or tempfile.mkdtemp(prefix="task-tracking-bench-")
+    results = []
+    generation = {}
+    try:
+        if "subprocess" in args.mode_list and _wanted(args, "startup"):
+            for result in bench_startup(args):
+                results.append(result)
+                print(json.dumps(result), file=sys.stderr)
+        for scale in args.scale_list:
+            for mode in args.mode_list:
+                root = os.path.join(work, f"{scale}-{mode}")
+                if os.path.exists(root):
+                    shutil.rmtree(root)
+                os.makedirs(root)
+                start = time.perf_counter()
+                locations = generate_project(root, scale, args.statuses, args.tags, args.assignees, args.body_bytes, args.seed)
+                if args.backend != "fs":
+                    _convert(root, args.backend)
+                generation[f"{scale}-{mode}"] = round(time.perf_counter() - start, 3)
+                rng = random.Random(args.seed + scale)
+                for result in bench_scale(args, scale, mode, root, locations, rng):
+                    results.append(result)
+                    print(json.dumps(result), file=sys.stderr)
+                if not args.keep:
+                    shutil.rmtree(root)
+    finally:
+        if not args.root and not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    if args.baseline:
+        _compare(results, args.baseline)
+    report = {
+        "version": 1,
+        "meta": {
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": started_at,
+            "generation_s": generation,
+        },
+        "params": {
+            "scales": args.scale_list,
+            "statuses": args.statuses,
+            "tags": args.tags,
+            "assignees": args.assignees,
+            "body_bytes": args.body_bytes,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "modes": args.mode_list,
+            "durability": args.durability or os.getenv("TASK_TRACKING_DURABILITY") or "strict",
+            "backend": args.backend,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    sys.stdout.write(text + "\n")
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
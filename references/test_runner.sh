@@ -293,6 +293,821 @@ fi
 
 run_fail "18.9 TASK_TRACKING_ROOT rejects '..'" 2 env TASK_TRACKING_ROOT=../escape python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --limit 1
 
+log "== Incremental preflight =="
+gen_of(){ python3 -c "import json,sys;print(json.load(open(sys.argv[1]))['generation'])" "$ROOT/acme-s4/.integrity.json" 2>/dev/null; }
+python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --limit 1 >/dev/null 2>&1
+g1=$(gen_of)
+python3 "${baseDir}/scripts/task_tracking.py" show acme-s4 fix_posting_logic >/dev/null 2>&1
+g2=$(gen_of)
+if [ -n "$g1" ] && [ "$g1" = "$g2" ]; then log "PASS: read-only commands keep manifest generation"; pass=$((pass+1)); else log "FAIL: manifest generation changed on read ($g1 -> $g2)"; fail=$((fail+1)); fi
+python3 "${baseDir}/scripts/task_tracking.py" meta-update acme-s4 fix_posting_logic --patch-json '{"set":{"priority":"P3"}}' >/dev/null 2>&1
+g3=$(gen_of)
+if [ -n "$g3" ] && [ "$g3" -gt "$g2" ]; then log "PASS: mutation bumps manifest generation"; pass=$((pass+1)); else log "FAIL: manifest generation not bumped ($g2 -> $g3)"; fail=$((fail+1)); fi
+rm -f "$ROOT/acme-s4/.integrity.json"
+run_ok "list rebuilds missing manifest" python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --limit 1
+if [ -f "$ROOT/acme-s4/.integrity.json" ]; then log "PASS: manifest rewritten after full preflight"; pass=$((pass+1)); else log "FAIL: manifest not rewritten"; fail=$((fail+1)); fi
+
+log "== Shared reader lock =="
+python3 - "$baseDir" "$ROOT" <<'PY'
+import subprocess, sys
+base, root = sys.argv[1], sys.argv[2]
+sys.path.insert(0, base + "/scripts")
+from storage import ProjectLock
+cli = [sys.executable, base + "/scripts/task_tracking.py"]
+with ProjectLock(root + "/acme-s4", shared=True):
+    reader = subprocess.run(cli + ["show", "acme-s4", "fix_posting_logic"], capture_output=True).returncode
+    writer = subprocess.run(cli + ["meta-update", "acme-s4", "fix_posting_logic", "--patch-json", "{}"], capture_output=True).returncode
+raise SystemExit(0 if (reader, writer) == (0, 4) else 1)
+PY
+if [ $? -eq 0 ]; then log "PASS: shared lock admits readers and blocks writers"; pass=$((pass+1)); else log "FAIL: shared lock semantics"; fail=$((fail+1)); fi
+
+log "== Lock timeout =="
+python3 - "$baseDir" "$ROOT" <<'PY'
+import json, subprocess, sys, time
+base, root = sys.argv[1], sys.argv[2]
+sys.path.insert(0, base + "/scripts")
+from storage import ProjectLock
+cli = [sys.executable, base + "/scripts/task_tracking.py", "show", "acme-s4", "fix_posting_logic"]
+with ProjectLock(root + "/acme-s4"):
+    waiting = subprocess.Popen(cli + ["--lock-timeout-ms", "5000"], stdout=subprocess.PIPE, text=True)
+    expired = subprocess.run(cli + ["--lock-timeout-ms", "100"], capture_output=True, text=True)
+    time.sleep(0.3)
+out = json.loads(waiting.communicate()[0])
+err = json.loads(expired.stdout)
+ok = (waiting.returncode == 0 and out.get("lock_wait_ms", 0) > 0
+      and expired.returncode == 4 and err["error"]["details"].get("lock_wait_ms", 0) >= 100)
+raise SystemExit(0 if ok else 1)
+PY
+if [ $? -eq 0 ]; then log "PASS: lock timeout waits and expires"; pass=$((pass+1)); else log "FAIL: lock timeout semantics"; fail=$((fail+1)); fi
+run_fail "lock timeout negative" 2 python3 "${baseDir}/scripts/task_tracking.py" show acme-s4 fix_posting_logic --lock-timeout-ms -1
+
+log "== Daemon =="
+python3 "${baseDir}/scripts/task_tracking.py" serve --idle-timeout-s 30 > /tmp/tt-serve.json 2>&1 &
+serve_pid=$!
+for i in $(seq 50); do [ -S "$ROOT/.daemon.sock" ] && break; sleep 0.1; done
+via_daemon=$(python3 "${baseDir}/scripts/task_tracking.py" show acme-s4 fix_posting_logic 2>&1)
+in_process=$(TASK_TRACKING_DAEMON=off python3 "${baseDir}/scripts/task_tracking.py" show acme-s4 fix_posting_logic 2>&1)
+if [ -S "$ROOT/.daemon.sock" ] && [ "$via_daemon" = "$in_process" ]; then log "PASS: daemon output matches in-process output"; pass=$((pass+1)); else log "FAIL: daemon output differs out=$via_daemon"; fail=$((fail+1)); fi
+run_fail "daemon forwards exit codes" 3 python3 "${baseDir}/scripts/task_tracking.py" show acme-s4 no_such_task
+run_ok_cmd "daemon forwards stdin" "printf '{\"set\":{\"priority\":\"P2\"}}' | python3 ${baseDir}/scripts/task_tracking.py meta-update acme-s4 fix_posting_logic --stdin"
+run_fail "second daemon conflicts" 4 python3 "${baseDir}/scripts/task_tracking.py" serve
+kill $serve_pid; wait $serve_pid 2>/dev/null
+if [ ! -e "$ROOT/.daemon.sock" ] && grep -q '"requests"' /tmp/tt-serve.json; then log "PASS: daemon shuts down cleanly"; pass=$((pass+1)); else log "FAIL: daemon shutdown"; fail=$((fail+1)); fi
+
+log "== Batch =="
+out=$(printf '%s\n' '{"op":"add","task_id":"batch_a","tags":["b"]}' '{"op":"move","task_id":"batch_a","to":"done"}' '{"op":"set-body","task_id":"batch_a","text":"via batch"}' | python3 "${baseDir}/scripts/task_tracking.py" batch acme-s4 2>&1); code=$?
+summary=$(echo "$out" | tail -n 1)
+if [ $code -eq 0 ] && echo "$summary" | grep -q '"failed": 0' && [ "$(cat "$ROOT/acme-s4/done/batch_a.md")" = "via batch" ] && [ ! -e "$ROOT/acme-s4/.tx_move.json" ]; then log "PASS: batch applies add/move/set-body"; pass=$((pass+1)); else log "FAIL: batch mixed stream (exit $code) out=$out"; fail=$((fail+1)); fi
+run_fail_cmd "batch reports first failing exit code" 2 "printf '%s\n' 'not json' '{\"op\":\"move\",\"task_id\":\"missing\",\"to\":\"done\"}' '{\"op\":\"meta-update\",\"task_id\":\"batch_a\",\"patch\":{\"set\":{\"priority\":\"P1\"}}}' | python3 ${baseDir}/scripts/task_tracking.py batch acme-s4"
+if grep -q '"priority": "P1"' "$ROOT/acme-s4/done/index.json"; then log "PASS: batch keeps applying after a failed line"; pass=$((pass+1)); else log "FAIL: batch stopped after failed line"; fail=$((fail+1)); fi
+run_ok_cmd "batch removes the bodies it added when the commit fails" "cd '${baseDir}/scripts' && TASK_TRACKING_ROOT='$ROOT' python3 -c \"
+import json, os, service
+def fail(ws):
+    raise OSError('disk full')
+service._commit = fail
+try:
+    service.batch('acme-s4', [json.dumps({'op': 'add', 'task_id': 'batch_lost', 'status': 'open', 'body': 'gone'})])
+except OSError:
+    pass
+else:
+    raise AssertionError('commit failure not raised')
+assert not os.path.exists('$ROOT/acme-s4/open/batch_lost.md')
+\""
+run_ok "integrity-check after batch" python3 "${baseDir}/scripts/task_tracking.py" integrity-check acme-s4
+
+log "== Task locator =="
+loc_of(){ python3 -c "import json,sys;print(json.load(open(sys.argv[1]))['tasks'].get(sys.argv[2]))" "$ROOT/acme-s4/.locator.json" "$1" 2>/dev/null; }
+python3 "${baseDir}/scripts/task_tracking.py" add acme-s4 --task-id loc_task >/dev/null 2>&1
+python3 "${baseDir}/scripts/task_tracking.py" move acme-s4 loc_task open >/dev/null 2>&1
+if [ "$(loc_of loc_task)" = "open" ]; then log "PASS: locator follows add/move"; pass=$((pass+1)); else log "FAIL: locator after move: $(loc_of loc_task)"; fail=$((fail+1)); fi
+echo '{}' > "$ROOT/acme-s4/.locator.json"
+run_ok "show with corrupt locator" python3 "${baseDir}/scripts/task_tracking.py" show acme-s4 loc_task
+if [ "$(loc_of loc_task)" = "open" ]; then log "PASS: locator rebuilt"; pass=$((pass+1)); else log "FAIL: locator not rebuilt"; fail=$((fail+1)); fi
+
+log "== Filter posting lists =="
+python3 "${baseDir}/scripts/task_tracking.py" meta-update acme-s4 loc_task --patch-json '{"set":{"tags":["postings"]}}' >/dev/null 2>&1
+out=$(python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --tag postings 2>&1)
+if echo "$out" | grep -q '"count_total": 1' && echo "$out" | grep -q '"loc_task"'; then log "PASS: tag filter uses updated postings"; pass=$((pass+1)); else log "FAIL: tag filter after meta-update out=$out"; fail=$((fail+1)); fi
+python3 - "$ROOT/acme-s4/open/index.json" <<'PY'
+import json, sys
+path = sys.argv[1]
+data = json.load(open(path))
+data["loc_task"]["tags"] = ["hand_edited"]
+json.dump(data, open(path, "w"))
+PY
+out=$(python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --tag hand_edited --priority P0 --filter-mode or 2>&1)
+if echo "$out" | grep -q '"loc_task"'; then log "PASS: postings rebuilt after external index edit"; pass=$((pass+1)); else log "FAIL: postings stale after external edit out=$out"; fail=$((fail+1)); fi
+
+log "== Presorted list orders =="
+python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --sort due_date --asc --limit 1 >/dev/null 2>&1
+python3 "${baseDir}/scripts/task_tracking.py" meta-update acme-s4 loc_task --patch-json '{"set":{"due_date":"2001-01-01"}}' >/dev/null 2>&1
+out=$(python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --sort due_date --asc --limit 1 2>&1)
+if echo "$out" | grep -q '"loc_task"'; then log "PASS: order file updated by mutation"; pass=$((pass+1)); else log "FAIL: stale order after meta-update out=$out"; fail=$((fail+1)); fi
+orders_ok=1
+for args in "--sort due_date --asc" "--sort priority" "--sort created_at --asc --offset 1" "--sort updated_at --offset 2"; do
+  with_orders=$(python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 $args 2>&1)
+  rm -f "$ROOT"/acme-s4/.order.*.json
+  rebuilt=$(python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 $args 2>&1)
+  [ "$with_orders" = "$rebuilt" ] || orders_ok=0
+done
+if [ $orders_ok -eq 1 ]; then log "PASS: presorted orders match rebuilt orders"; pass=$((pass+1)); else log "FAIL: presorted orders differ from rebuild"; fail=$((fail+1)); fi
+
+log "== Cursor pagination =="
+python3 - "$baseDir" <<'PY'
+import json, subprocess, sys
+cli = [sys.executable, sys.argv[1] + "/scripts/task_tracking.py", "list", "acme-s4"]
+def run(*args):
+    p = subprocess.run(cli + list(args), capture_output=True, text=True)
+    return p.returncode, json.loads(p.stdout)
+_, full = run("--limit", "1000", "--sort", "priority")
+walked, cursor = [], None
+while True:
+    _, page = run("--limit", "1", "--sort", "priority", *(["--cursor", cursor] if cursor else []))
+    walked += page["items"]
+    cursor = page["next_cursor"]
+    if not cursor:
+        break
+raise SystemExit(0 if walked == full["items"] and len(walked) == full["count_total"] else 1)
+PY
+if [ $? -eq 0 ]; then log "PASS: cursor walk equals full list"; pass=$((pass+1)); else log "FAIL: cursor walk differs from full list"; fail=$((fail+1)); fi
+cursor=$(python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --limit 1 | python3 -c "import json,sys;print(json.load(sys.stdin)['next_cursor'])")
+run_fail "cursor with offset" 2 python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --limit 1 --cursor "$cursor" --offset 1
+run_fail "cursor for a different sort" 2 python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --limit 1 --cursor "$cursor" --sort priority
+python3 "${baseDir}/scripts/task_tracking.py" meta-update acme-s4 loc_task --patch-json '{}' >/dev/null 2>&1
+run_fail "stale cursor after mutation" 4 python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --limit 1 --cursor "$cursor"
+
+log "== Streaming list =="
+python3 - "$baseDir" <<'PY'
+import json, subprocess, sys
+cli = [sys.executable, sys.argv[1] + "/scripts/task_tracking.py", "list", "acme-s4"]
+full = json.loads(subprocess.run(cli + ["--limit", "1000"], capture_output=True, text=True).stdout)
+lines = [json.loads(l) for l in subprocess.run(cli + ["--ndjson"], capture_output=True, text=True).stdout.splitlines()]
+summary = lines[-1]
+ok = lines[:-1] == full["items"] and summary["count"] == summary["count_total"] == full["count_total"] and summary["next_cursor"] is None
+raise SystemExit(0 if ok else 1)
+PY
+if [ $? -eq 0 ]; then log "PASS: ndjson stream equals list items plus summary"; pass=$((pass+1)); else log "FAIL: ndjson stream"; fail=$((fail+1)); fi
+run_fail "ndjson validation error" 2 python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --ndjson --sort bogus
+err=$(python3 "${baseDir}/scripts/task_tracking.py" list acme-s4 --ndjson 2>&1 >/dev/null | head -1)
+if [ -z "$err" ]; then log "PASS: ndjson writes nothing to stderr"; pass=$((pass+1)); else log "FAIL: ndjson stderr=$err"; fail=$((fail+1)); fi
+
+log "== Index delta log =="
+python3 "${baseDir}/scripts/task_tracking.py" init-project delta-s4 >/dev/null 2>&1
+python3 -c "
+import json
+for i in range(1500):
+    print(json.dumps({'op': 'add', 'task_id': 'd%d' % i, 'tags': ['tag-%03d-padding-padding' % (i % 97)] * 3, 'assignee': 'hannes'}))
+" | python3 "${baseDir}/scripts/task_tracking.py" batch delta-s4 >/dev/null 2>&1
+base_before=$(cksum < "$ROOT/delta-s4/backlog/index.json")
+python3 "${baseDir}/scripts/task_tracking.py" meta-update delta-s4 d7 --patch-json '{"set":{"priority":"P0"}}' >/dev/null 2>&1
+if [ -s "$ROOT/delta-s4/backlog/index.delta.jsonl" ] && [ "$base_before" = "$(cksum < "$ROOT/delta-s4/backlog/index.json")" ] \
+   && python3 "${baseDir}/scripts/task_tracking.py" show delta-s4 d7 | grep -q '"priority": "P0"'; then log "PASS: large status mutation appends to delta log"; pass=$((pass+1)); else log "FAIL: delta log append"; fail=$((fail+1)); fi
+printf '{"seq": 999, "set": {"d7"' >> "$ROOT/delta-s4/backlog/index.delta.jsonl"
+run_ok "show ignores torn delta append" python3 "${baseDir}/scripts/task_tracking.py" show delta-s4 d7
+run_ok "integrity-check --fix compacts delta log" python3 "${baseDir}/scripts/task_tracking.py" integrity-check delta-s4 --fix
+if [ ! -e "$ROOT/delta-s4/backlog/index.delta.jsonl" ] && grep -q '"P0"' "$ROOT/delta-s4/backlog/index.json"; then log "PASS: delta folded into index.json"; pass=$((pass+1)); else log "FAIL: delta compaction"; fail=$((fail+1)); fi
+
+log "== Sharded status indexes =="
+python3 "${baseDir}/scripts/task_tracking.py" init-project shard-s4 >/dev/null 2>&1
+python3 -c "
+import json
+for i in range(40):
+    print(json.dumps({'op': 'add', 'task_id': 's%d' % i, 'tags': ['t%d' % (i % 3)], 'priority': 'P%d' % (i % 4)}))
+" | python3 "${baseDir}/scripts/task_tracking.py" batch shard-s4 >/dev/null 2>&1
+list_before=$(python3 "${baseDir}/scripts/task_tracking.py" list shard-s4 --sort priority --fields task_id,priority --tag t1 | python3 -c "import json,sys; print(json.load(sys.stdin)['items'])")
+run_ok "migrate-index --shards 4" python3 "${baseDir}/scripts/task_tracking.py" migrate-index shard-s4 --shards 4
+list_after=$(python3 "${baseDir}/scripts/task_tracking.py" list shard-s4 --sort priority --fields task_id,priority --tag t1 | python3 -c "import json,sys; print(json.load(sys.stdin)['items'])")
+if grep -q '"\$shards": 4' "$ROOT/shard-s4/backlog/index.json" && [ -f "$ROOT/shard-s4/backlog/index.4.03.json" ] && [ "$list_before" = "$list_after" ]; then log "PASS: sharded layout lists identically"; pass=$((pass+1)); else log "FAIL: sharded layout"; fail=$((fail+1)); fi
+sums_before=$(cksum "$ROOT"/shard-s4/backlog/index.4.*.json)
+run_ok "meta-update on sharded status" python3 "${baseDir}/scripts/task_tracking.py" meta-update shard-s4 s5 --patch-json '{"set":{"assignee":"hannes"}}'
+changed=$(diff <(echo "$sums_before") <(cksum "$ROOT"/shard-s4/backlog/index.4.*.json) | grep -c '^>')
+if [ "$changed" = "1" ] && python3 "${baseDir}/scripts/task_tracking.py" show shard-s4 s5 | grep -q '"assignee": "hannes"'; then log "PASS: point write rewrites one shard"; pass=$((pass+1)); else log "FAIL: point write shards changed=$changed"; fail=$((fail+1)); fi
+run_ok "move out of sharded status" python3 "${baseDir}/scripts/task_tracking.py" move shard-s4 s5 done
+python3 - "$ROOT/shard-s4/backlog" <<'PY'
+import json, os, sys
+a, b = (os.path.join(sys.argv[1], "index.4.0%d.json" % n) for n in (0, 1))
+da, db = json.load(open(a)), json.load(open(b))
+task_id = next(iter(da))
+db[task_id] = da.pop(task_id)
+json.dump(da, open(a, "w")); json.dump(db, open(b, "w"))
+PY
+run_ok_cmd "integrity-check reports SHARD_MISPLACED" "python3 '${baseDir}/scripts/task_tracking.py' integrity-check shard-s4 | grep -q SHARD_MISPLACED"
+run_ok_cmd "integrity-check --fix rewrites shards" "python3 '${baseDir}/scripts/task_tracking.py' integrity-check shard-s4 --fix | grep -q SHARD_REWRITTEN"
+run_ok "integrity-check clean after shard fix" python3 "${baseDir}/scripts/task_tracking.py" integrity-check shard-s4
+run_ok "migrate-index back to one file" python3 "${baseDir}/scripts/task_tracking.py" migrate-index shard-s4 --shards 0
+if [ ! -e "$ROOT/shard-s4/backlog/index.4.00.json" ] && python3 "${baseDir}/scripts/task_tracking.py" show shard-s4 s7 >/dev/null 2>&1; then log "PASS: single-file layout restored"; pass=$((pass+1)); else log "FAIL: single-file layout restored"; fail=$((fail+1)); fi
+run_fail "migrate-index rejects 300 shards" 2 python3 "${baseDir}/scripts/task_tracking.py" migrate-index shard-s4 --shards 300
+
+log "== Durability modes =="
+python3 "${baseDir}/scripts/task_tracking.py" init-project dur-s4 --statuses open,done >/dev/null 2>&1
+for mode in strict batch none; do
+  TASK_TRACKING_DURABILITY=$mode python3 "${baseDir}/scripts/task_tracking.py" add dur-s4 --task-id "d_$mode" --status open >/dev/null 2>&1
+  run_ok "move with durability $mode" env TASK_TRACKING_DURABILITY=$mode python3 "${baseDir}/scripts/task_tracking.py" move dur-s4 "d_$mode" done
+  if [ ! -e "$ROOT/dur-s4/.tx_move.json" ] && [ -f "$ROOT/dur-s4/done/d_$mode.md" ]; then log "PASS: durability $mode leaves no journal"; pass=$((pass+1)); else log "FAIL: durability $mode journal/body"; fail=$((fail+1)); fi
+done
+echo '{"op":"move","task_id":"d_batch","from":"done","to":"open"}' > "$ROOT/dur-s4/.tx_move.json"
+mv "$ROOT/dur-s4/done/d_batch.md" "$ROOT/dur-s4/open/d_batch.md"
+run_ok_cmd "batch durability recovers interrupted move" "TASK_TRACKING_DURABILITY=batch python3 '${baseDir}/scripts/task_tracking.py' show dur-s4 d_batch | grep -q '\"status\": \"open\"'"
+run_fail "invalid durability mode" 2 env TASK_TRACKING_DURABILITY=sometimes python3 "${baseDir}/scripts/task_tracking.py" list dur-s4
+strict_fsyncs(){ TASK_TRACKING_DURABILITY=strict python3 "${baseDir}/scripts/task_tracking.py" "$@" --timings 2>/dev/null | python3 -c 'import json, sys; print(json.load(sys.stdin)["timings"]["counters"].get("fsyncs", 0))'; }
+# derived files (locator, postings, orders) are rebuildable: never fsynced, even in strict mode
+n=$(strict_fsyncs list dur-s4 --tag nothing)
+if [ "$n" = 0 ]; then log "PASS: strict list building derived files fsyncs nothing"; pass=$((pass+1)); else log "FAIL: strict list fsyncs=$n (expected 0)"; fail=$((fail+1)); fi
+n=$(strict_fsyncs meta-update dur-s4 d_strict --patch-json '{"set":{"tags":["x"]},"unset":[]}')
+if [ "$n" = 2 ]; then log "PASS: strict meta-update fsyncs index.json and its directory only"; pass=$((pass+1)); else log "FAIL: strict meta-update fsyncs=$n (expected 2)"; fail=$((fail+1)); fi
+# the search delta log is rebuildable too
+python3 "${baseDir}/scripts/task_tracking.py" search dur-s4 d_strict >/dev/null 2>&1
+n=$(strict_fsyncs meta-update dur-s4 d_strict --patch-json '{"set":{"tags":["y"]},"unset":[]}')
+if [ "$n" = 2 ] && [ -f "$ROOT/dur-s4/.search/meta.json" ]; then log "PASS: strict meta-update with a search index fsyncs index.json and its directory only"; pass=$((pass+1)); else log "FAIL: strict meta-update with a search index fsyncs=$n (expected 2)"; fail=$((fail+1)); fi
+n=$(strict_fsyncs move dur-s4 d_strict open)
+if [ "$n" = 6 ]; then log "PASS: strict move fsyncs journal and both indexes only"; pass=$((pass+1)); else log "FAIL: strict move fsyncs=$n (expected 6)"; fail=$((fail+1)); fi
+
+log "== Benchmark suite (smoke) =="
+bench_out=$(python3 "${baseDir}/references/benchmark.py" --scales 50 --repeat 2 --warmup 0 --check-repeat 1 --durability none 2>/dev/null); code=$?
+if [ $code -eq 0 ] && echo "$bench_out" | python3 -c "
+import json, sys
+r = json.load(sys.stdin)
+cmds = {x['command'] for x in r['results']}
+modes = {x['mode'] for x in r['results']}
+assert {'startup', 'init-project', 'add', 'list', 'show', 'move', 'meta-update', 'set-body', 'integrity-check'} <= cmds, cmds
+assert modes == {'inprocess', 'subprocess'}, modes
+assert all(x['n'] > 0 and x['errors'] == 0 and x['p50_ms'] <= x['p95_ms'] <= x['p99_ms'] for x in r['results'])
+"; then log "PASS: benchmark smoke run"; pass=$((pass+1)); else log "FAIL: benchmark smoke run (exit $code)"; fail=$((fail+1)); fi
+
+log "== Timings =="
+run_ok_cmd "list --timings phases and counters" "python3 '${baseDir}/scripts/task_tracking.py' list acme-s4 --timings | python3 -c \"import json,sys; t=json.load(sys.stdin)['timings']; assert t['total_ms'] > 0 and {'lock','preflight','query','serialize'} <= set(t['phases_ms']) and t['counters']['files_read'] > 0\""
+run_ok_cmd "list without --timings has no timings" "python3 '${baseDir}/scripts/task_tracking.py' list acme-s4 | python3 -c \"import json,sys; assert 'timings' not in json.load(sys.stdin)\""
+run_ok_cmd "TASK_TRACKING_TIMINGS on meta-update" "TASK_TRACKING_TIMINGS=1 python3 '${baseDir}/scripts/task_tracking.py' meta-update acme-s4 fix_posting_logic --patch-json '{\"set\":{\"priority\":\"P3\"}}' | python3 -c \"import json,sys; t=json.load(sys.stdin)['timings']; assert 'flush' in t['phases_ms'] and t['counters']['indexes_written'] == 1\""
+run_ok_cmd "batch --timings in summary" "echo '{\"op\":\"set-body\",\"task_id\":\"fix_posting_logic\",\"text\":\"t\"}' | python3 '${baseDir}/scripts/task_tracking.py' batch acme-s4 --timings | tail -n 1 | grep -q '\"timings\"'"
+run_ok_cmd "list --ndjson --timings in summary" "python3 '${baseDir}/scripts/task_tracking.py' list acme-s4 --ndjson --timings | tail -n 1 | grep -q '\"timings\"'"
+run_ok_cmd "error output carries timings" "python3 '${baseDir}/scripts/task_tracking.py' show acme-s4 no_such_task --timings | grep -q '\"timings\"'"
+
+log "== Cold start =="
+run_ok "import cli loads no heavy modules" python3 -c "
+import sys
+sys.path.insert(0, '${baseDir}/scripts')
+import client, cli
+heavy = {'service', 'daemon', 'socket', 'tempfile', 'hashlib', 'datetime'} & set(sys.modules)
+assert not heavy, heavy
+"
+run_ok "show does not load the daemon" python3 -c "
+import sys
+sys.path.insert(0, '${baseDir}/scripts')
+import cli
+payload, code = cli.execute(['show', 'acme-s4', 'fix_posting_logic'])
+assert code == 0 and payload['ok'], payload
+assert 'daemon' not in sys.modules
+"
+run_fail "unknown command still rejected" 2 python3 "${baseDir}/scripts/task_tracking.py" frobnicate acme-s4
+run_fail "missing --task-id still rejected" 2 python3 "${baseDir}/scripts/task_tracking.py" add acme-s4
+
+log "== SQLite backend =="
+run_ok_cmd "init-project --backend sqlite" "python3 '${baseDir}/scripts/task_tracking.py' init-project sql-s4 --backend sqlite | grep -q '\"backend\": \"sqlite\"'"
+if [ -f "$ROOT/sql-s4/tasks.sqlite" ] && [ ! -d "$ROOT/sql-s4/backlog" ]; then log "PASS: sqlite layout"; pass=$((pass+1)); else log "FAIL: sqlite layout"; fail=$((fail+1)); fi
+run_ok "sqlite add" python3 "${baseDir}/scripts/task_tracking.py" add sql-s4 --task-id q1 --tags "sap,fi" --priority P2 --body "Initial body"
+run_fail "sqlite add duplicate" 4 python3 "${baseDir}/scripts/task_tracking.py" add sql-s4 --task-id q1
+run_ok "sqlite move" python3 "${baseDir}/scripts/task_tracking.py" move sql-s4 q1 open
+run_ok "sqlite meta-update" python3 "${baseDir}/scripts/task_tracking.py" meta-update sql-s4 q1 --patch-json '{"set":{"assignee":"hannes"}}'
+run_ok "sqlite set-body" python3 "${baseDir}/scripts/task_tracking.py" set-body sql-s4 q1 --text "New body"
+run_ok_cmd "sqlite show body" "python3 '${baseDir}/scripts/task_tracking.py' show sql-s4 q1 --body | grep -q 'New body'"
+run_ok_cmd "sqlite batch" "printf '{\"op\":\"add\",\"task_id\":\"q2\",\"tags\":[\"sap\"]}\n{\"op\":\"move\",\"task_id\":\"q2\",\"to\":\"done\"}\n' | python3 '${baseDir}/scripts/task_tracking.py' batch sql-s4"
+run_ok_cmd "sqlite list tag filter" "python3 '${baseDir}/scripts/task_tracking.py' list sql-s4 --tag sap | grep -q '\"count_total\": 2'"
+run_fail "sqlite migrate-index rejected" 2 python3 "${baseDir}/scripts/task_tracking.py" migrate-index sql-s4 --shards 4
+list_fs=$(python3 "${baseDir}/scripts/task_tracking.py" list shard-s4 --sort priority --fields task_id,priority,status --limit 100 | python3 -c "import json,sys; print(json.load(sys.stdin)['items'])")
+run_ok "convert-backend to sqlite" python3 "${baseDir}/scripts/task_tracking.py" convert-backend shard-s4 --to sqlite
+list_sql=$(python3 "${baseDir}/scripts/task_tracking.py" list shard-s4 --sort priority --fields task_id,priority,status --limit 100 | python3 -c "import json,sys; print(json.load(sys.stdin)['items'])")
+if [ ! -d "$ROOT/shard-s4/backlog" ] && [ "$list_fs" = "$list_sql" ]; then log "PASS: converted project lists identically"; pass=$((pass+1)); else log "FAIL: converted project lists identically"; fail=$((fail+1)); fi
+run_ok_cmd "convert-backend unchanged" "python3 '${baseDir}/scripts/task_tracking.py' convert-backend shard-s4 --to sqlite | grep -q '\"changed\": false'"
+run_ok "convert-backend back to fs" python3 "${baseDir}/scripts/task_tracking.py" convert-backend shard-s4 --to fs
+list_back=$(python3 "${baseDir}/scripts/task_tracking.py" list shard-s4 --sort priority --fields task_id,priority,status --limit 100 | python3 -c "import json,sys; print(json.load(sys.stdin)['items'])")
+if [ ! -e "$ROOT/shard-s4/tasks.sqlite" ] && [ "$list_fs" = "$list_back" ]; then log "PASS: round trip lists identically"; pass=$((pass+1)); else log "FAIL: round trip lists identically"; fail=$((fail+1)); fi
+run_ok "integrity-check clean after round trip" python3 "${baseDir}/scripts/task_tracking.py" integrity-check shard-s4
+python3 -c "
+import sqlite3
+conn = sqlite3.connect('$ROOT/sql-s4/tasks.sqlite')
+conn.execute(\"UPDATE tasks SET priority = 'P9' WHERE task_id = 'q1'\")
+conn.commit()
+"
+run_ok_cmd "sqlite integrity-check reports stale columns" "python3 '${baseDir}/scripts/task_tracking.py' integrity-check sql-s4 | grep -q INDEX_COLUMNS_STALE"
+run_ok_cmd "sqlite integrity-check --fix rebuilds columns" "python3 '${baseDir}/scripts/task_tracking.py' integrity-check sql-s4 --fix | grep -q INDEX_COLUMNS_REBUILT"
+run_ok "sqlite integrity-check clean after fix" python3 "${baseDir}/scripts/task_tracking.py" integrity-check sql-s4
+python3 "${baseDir}/scripts/task_tracking.py" init-project sqlbad-s4 --backend sqlite >/dev/null 2>&1
+head -c 4096 /dev/urandom > "$ROOT/sqlbad-s4/tasks.sqlite"
+rm -f "$ROOT/sqlbad-s4/tasks.sqlite-wal" "$ROOT/sqlbad-s4/tasks.sqlite-shm"
+run_fail "corrupt database rejected" 5 python3 "${baseDir}/scripts/task_tracking.py" list sqlbad-s4
+run_ok_cmd "integrity-check reports DATABASE_CORRUPT" "python3 '${baseDir}/scripts/task_tracking.py' integrity-check sqlbad-s4 | grep -q DATABASE_CORRUPT"
+
+log "== Bounded body reads =="
+python3 -c "print('\\n'.join('log line %d ' % i + 'x' * 80 for i in range(50000)))" > /tmp/tt-bigbody.md
+for p in acme-s4 sql-s4; do
+  python3 "${baseDir}/scripts/task_tracking.py" add $p --task-id big_log >/dev/null 2>&1
+  python3 "${baseDir}/scripts/task_tracking.py" set-body $p big_log --file /tmp/tt-bigbody.md >/dev/null 2>&1
+  run_ok_cmd "show excerpt of large body reads one chunk ($p)" "python3 '${baseDir}/scripts/task_tracking.py' show $p big_log --body --max-body-lines 40 --timings | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert d['body']['truncated'] and d['body']['text'].count('\\\\n') == 40, d['body']
+assert d['timings']['counters']['body_chars_read'] <= 65536, d['timings']
+\""
+done
+run_ok_cmd "show without limits returns full body" "python3 '${baseDir}/scripts/task_tracking.py' show acme-s4 big_log --body | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert d['body']['text'] == open('/tmp/tt-bigbody.md').read() and not d['body']['truncated']
+\""
+run_ok "truncation matches cutting the whole body" python3 -c "
+import sys
+sys.path.insert(0, '${baseDir}/scripts')
+import service
+text = 'a\\r\\nbb\\x0bccc\\n\\ndddd'
+lines = text.splitlines(keepends=True)
+for ml in (None, 0, 1, len(lines), len(lines) + 1):
+    for mc in (None, 0, 1, len(text), len(text) + 1):
+        want, cut = text, False
+        if ml is not None and len(lines) > ml:
+            want, cut = ''.join(lines[:ml]), True
+        if mc is not None and len(want) > mc:
+            want, cut = want[:mc], True
+        for size in (1, 2, 3, 64):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            assert service._bounded_body(iter(chunks), mc, ml) == (want, cut), (ml, mc, size)
+"
+
+log "== Full-text search =="
+for p in acme-s4 sql-s4; do
+  python3 "${baseDir}/scripts/task_tracking.py" add $p --task-id srch_one --status open --tags "ledger" --body "Reconcile the quarterly ledger totals" >/dev/null 2>&1
+  python3 "${baseDir}/scripts/task_tracking.py" add $p --task-id srch_two --body "Quarterly report draft" >/dev/null 2>&1
+  run_ok_cmd "search and mode ($p)" "python3 '${baseDir}/scripts/task_tracking.py' search $p 'quarterly LEDGER' | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert [i['task_id'] for i in d['items']] == ['srch_one'], d
+assert d['items'][0]['status'] == 'open' and 'ledger' in d['items'][0]['snippet'].lower(), d
+\""
+  run_ok_cmd "search or mode ($p)" "python3 '${baseDir}/scripts/task_tracking.py' search $p 'quarterly ledger' --mode or | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert [i['task_id'] for i in d['items']] == ['srch_one', 'srch_two'], d
+\""
+  python3 "${baseDir}/scripts/task_tracking.py" set-body $p srch_two --text "Escalate vendor invoices" >/dev/null 2>&1
+  python3 "${baseDir}/scripts/task_tracking.py" move $p srch_one done >/dev/null 2>&1
+  run_ok_cmd "search follows set-body and move ($p)" "python3 '${baseDir}/scripts/task_tracking.py' search $p 'vendor' | grep -q srch_two && python3 '${baseDir}/scripts/task_tracking.py' search $p quarterly --status done | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert [(i['task_id'], i['status']) for i in d['items']] == [('srch_one', 'done')], d
+\""
+  run_fail "search without terms ($p)" 2 python3 "${baseDir}/scripts/task_tracking.py" search $p "- _"
+  run_fail "search unknown status ($p)" 3 python3 "${baseDir}/scripts/task_tracking.py" search $p ledger --status nope
+done
+for f in "$ROOT"/acme-s4/.search/terms.*.json; do printf 'garbage' > "$f"; done
+run_ok_cmd "search rebuilds a corrupt index" "python3 '${baseDir}/scripts/task_tracking.py' search acme-s4 vendor | grep -q srch_two"
+run_ok_cmd "integrity-check --fix keeps search working" "python3 '${baseDir}/scripts/task_tracking.py' integrity-check acme-s4 --fix >/dev/null && python3 '${baseDir}/scripts/task_tracking.py' search acme-s4 ledger | grep -q srch_one"
+run_ok_cmd "search results equal across backends" "python3 -c \"
+import json, subprocess, sys
+out = [json.loads(subprocess.run([sys.executable, '${baseDir}/scripts/task_tracking.py', 'search', p, 'quarterly ledger vendor', '--mode', 'or'], capture_output=True, text=True).stdout)['items'] for p in ('acme-s4', 'sql-s4')]
+key = lambda items: [(i['task_id'], i['status'], i['snippet']) for i in items if i['task_id'].startswith('srch_')]
+assert key(out[0]) == key(out[1]), out
+\""
+python3 "${baseDir}/scripts/task_tracking.py" set-body acme-s4 srch_two --text "Escalate freight claims" >/dev/null 2>&1
+: > "$ROOT/acme-s4/.search/delta.jsonl"
+run_ok_cmd "search rebuilds after losing a delta entry" "python3 '${baseDir}/scripts/task_tracking.py' search acme-s4 freight | grep -q srch_two"
+
+log "== Cross-project list =="
+AP_ROOT=/tmp/tt-allprojects
+rm -rf "$AP_ROOT"
+ap() { TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" "$@"; }
+ap init-project ap1 >/dev/null 2>&1
+ap init-project ap2 --statuses open,done >/dev/null 2>&1
+ap init-project ap3 --backend sqlite >/dev/null 2>&1
+for p in ap1 ap2 ap3; do
+  for i in 1 2 3 4 5; do ap add $p --task-id t$i --status open --priority P$((i % 3)) --tags "all,t$i" >/dev/null 2>&1; done
+done
+run_ok_cmd "list --all-projects merges projects" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' list --all-projects --sort priority --asc --limit 1000 | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+got = [(i['priority'], i['project_id'], i['task_id']) for i in d['items']]
+assert got == sorted(got) and len(got) == 15 and d['projects'] == {'ap1': 5, 'ap2': 5, 'ap3': 5}, d
+\""
+run_ok_cmd "list --all-projects cursor pages" "TASK_TRACKING_ROOT='$AP_ROOT' python3 -c \"
+import json, subprocess, sys
+def page(*extra):
+    out = subprocess.run([sys.executable, '${baseDir}/scripts/task_tracking.py', 'list', '--all-projects', '--sort', 'priority', '--desc'] + list(extra), capture_output=True, text=True).stdout
+    return json.loads(out)
+want = [(i['project_id'], i['task_id']) for i in page('--limit', '1000')['items']]
+got, cursor = [], None
+while True:
+    d = page('--limit', '4', *(['--cursor', cursor] if cursor else []))
+    got += [(i['project_id'], i['task_id']) for i in d['items']]
+    cursor = d['next_cursor']
+    if not cursor:
+        break
+assert got == want, (got, want)
+\""
+run_ok_cmd "list --all-projects filtered offset pages" "TASK_TRACKING_ROOT='$AP_ROOT' python3 -c \"
+import json, subprocess, sys
+def page(*extra):
+    out = subprocess.run([sys.executable, '${baseDir}/scripts/task_tracking.py', 'list', '--all-projects', '--tag', 'all', '--sort', 'priority'] + list(extra), capture_output=True, text=True).stdout
+    return json.loads(out)
+want = [(i['project_id'], i['task_id']) for i in page('--limit', '1000')['items']]
+got = []
+for offset in range(0, len(want), 2):
+    got += [(i['project_id'], i['task_id']) for i in page('--limit', '2', '--offset', str(offset))['items']]
+assert len(want) == 15 and got == want, (got, want)
+\""
+ap init-project ap4 --statuses review >/dev/null 2>&1
+run_ok_cmd "list --all-projects skips projects without the status" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' list --all-projects --status review | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert d['projects'] == {'ap4': 0} and d['count'] == 0, d
+\""
+run_fail "list --all-projects unknown status" 3 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" list --all-projects --status nope
+run_fail "list project_id with --all-projects" 2 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" list ap1 --all-projects
+run_fail "list without project_id" 2 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" list
+run_fail "list --all-projects --ndjson" 2 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" list --all-projects --ndjson
+cursor=$(ap list --all-projects --limit 2 | python3 -c "import json, sys; print(json.load(sys.stdin)['next_cursor'])")
+ap move ap3 t1 done >/dev/null 2>&1
+run_fail "list --all-projects stale cursor" 4 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" list --all-projects --limit 2 --cursor "$cursor"
+mkdir -p "$AP_ROOT/ap5" && printf 'not a database' > "$AP_ROOT/ap5/tasks.sqlite"
+run_fail_cmd "list --all-projects names the failing project" 5 "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' list --all-projects > /tmp/tt-allprojects.json; code=\$?; grep -q '\"project_id\": \"ap5\"' /tmp/tt-allprojects.json && exit \$code"
+
+log "== Parallel and resumable integrity-check =="
+ap add ap1 --task-id ic_body --body "x" >/dev/null 2>&1
+rm -f "$AP_ROOT/ap1/backlog/ic_body.md"
+printf 'orphan' > "$AP_ROOT/ap1/backlog/ic_orphan.md"
+run_ok_cmd "integrity-check --jobs finds the same issues" "TASK_TRACKING_ROOT='$AP_ROOT' python3 -c \"
+import json, subprocess, sys
+def check(jobs):
+    out = subprocess.run([sys.executable, '${baseDir}/scripts/task_tracking.py', 'integrity-check', 'ap1', '--jobs', jobs], capture_output=True, text=True).stdout
+    return json.loads(out)['found']
+one, four = check('1'), check('4')
+assert one == four and sorted(i['type'] for i in one) == ['MISSING_BODY', 'ORPHAN_BODY'], (one, four)
+\""
+run_ok_cmd "integrity-check --fix --jobs repairs" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' integrity-check ap1 --fix --jobs 4 >/dev/null && TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' integrity-check ap1 | grep -q '\"ok\": true'"
+run_fail "integrity-check --jobs 0" 2 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" integrity-check ap1 --jobs 0
+run_fail "integrity-check --budget-ms without --all-projects" 2 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" integrity-check ap1 --budget-ms 100
+run_ok_cmd "integrity-check --all-projects reports each project" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' integrity-check --all-projects | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert not d['ok'] and d['complete'] and d['failed_projects'] == ['ap5'], d
+assert [p['project_id'] for p in d['projects']] == ['ap1', 'ap2', 'ap3', 'ap4', 'ap5'], d
+\""
+run_ok_cmd "integrity-check --budget-ms resumes across runs" "TASK_TRACKING_ROOT='$AP_ROOT' python3 -c \"
+import json, os, subprocess, sys
+seen = []
+runs = 0
+for run in range(10):
+    runs += 1
+    out = subprocess.run([sys.executable, '${baseDir}/scripts/task_tracking.py', 'integrity-check', '--all-projects', '--budget-ms', '1'], capture_output=True, text=True).stdout
+    d = json.loads(out)
+    assert d['checked'] >= 1, d
+    seen += [p['project_id'] for p in d['projects']]
+    checkpoint = os.path.exists('$AP_ROOT/.integrity-scrub.json')
+    if d['complete']:
+        break
+    assert checkpoint, d
+assert runs > 1 and not checkpoint and seen == ['ap1', 'ap2', 'ap3', 'ap4', 'ap5'] and d['failed_projects'] == ['ap5'], (seen, d)
+\""
+printf '{"version": 1, "after": "ap5", "failed": ["ap2"]}' > "$AP_ROOT/.integrity-scrub.json"
+run_ok_cmd "integrity-check --budget-ms keeps failures of earlier runs" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' integrity-check --all-projects --budget-ms 1000 | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert d['complete'] and d['checked'] == 0 and d['failed_projects'] == ['ap2'] and not d['ok'], d
+\""
+
+log "== Library API (ProjectHandle) =="
+run_ok_cmd "ProjectHandle reads equal the CLI and see external writes" "cd '${baseDir}/scripts' && python3 -c \"
+import json, subprocess, sys
+import api
+def cli(*args):
+    out = subprocess.run([sys.executable, 'task_tracking.py', *args], capture_output=True, text=True, env={'TASK_TRACKING_ROOT': '$AP_ROOT', 'TASK_TRACKING_DAEMON': 'off', 'PATH': '/usr/bin:/bin'}).stdout
+    return json.loads(out)
+h = api.ProjectHandle.create('ap6', statuses=('open', 'done'), root='$AP_ROOT')
+for i in range(5):
+    h.add('lib_%d' % i, status='open', priority='P%d' % (i % 3), tags=['x', 'y%d' % i])
+for _ in range(3):
+    assert h.list(sort='created_at', desc=False) == cli('list', 'ap6', '--sort', 'created_at', '--asc')
+    assert h.show('lib_1', body=True) == cli('show', 'ap6', 'lib_1', '--body')
+h.show('lib_1')['meta']['tags'].append('mutated')
+h.list(fields='tags')['items'][0]['tags'].append('mutated')
+assert 'mutated' not in json.dumps([h.show('lib_1'), h.list(fields='tags')])
+cli('meta-update', 'ap6', 'lib_1', '--patch-json', '{\\\"set\\\":{\\\"priority\\\":\\\"P3\\\"}}')
+cli('move', 'ap6', 'lib_2', 'done')
+assert h.show('lib_1')['meta']['priority'] == 'P3'
+assert [i['task_id'] for i in h.list(priority='P3')['items']] == ['lib_1']
+assert h.show('lib_2')['status'] == 'done'
+h.move('lib_3', 'done')
+assert cli('show', 'ap6', 'lib_3')['status'] == 'done'
+try:
+    h.show('nope')
+except Exception as e:
+    assert e.exit_code == 3
+else:
+    raise AssertionError('missing task found')
+\""
+
+log "== Bounded index cache =="
+run_ok_cmd "IndexCache evicts least recently used entries within its budget" "cd '${baseDir}/scripts' && python3 -c \"
+import index_cache
+from errors import ValidationError
+c = index_cache.IndexCache(max_bytes=3000)
+c.put('a', [1, 100, 1], 'A'); c.put('b', [1, 100, 1], 'B')
+assert c.get('a', [1, 100, 1]) == 'A'
+c.put('c', [1, 500, 1], 'C')
+s = c.stats()
+assert c.get('b', [1, 100, 1]) is None and c.get('a', [1, 100, 1]) == 'A' and c.get('c', [1, 500, 1]) == 'C' and s['evictions'] == 1 and s['bytes'] <= 3000, s
+assert c.get('a', [2, 100, 1]) is None and c.get('a', [1, 100, 1]) is None
+c.put('big', [1, 10000, 1], 'X')
+assert c.get('big', [1, 10000, 1]) is None and c.stats()['bytes'] <= 3000
+try:
+    index_cache.IndexCache(max_bytes=-1)
+except ValidationError:
+    pass
+else:
+    raise AssertionError('negative budget accepted')
+\""
+run_ok_cmd "cache-stats without daemon" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' cache-stats | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+assert d['ok'] and not d['resident'] and d['cache']['entries'] == 0, d
+\""
+run_fail "cache-stats invalid TASK_TRACKING_CACHE_BYTES" 2 env TASK_TRACKING_ROOT="$AP_ROOT" TASK_TRACKING_CACHE_BYTES=x python3 "${baseDir}/scripts/task_tracking.py" cache-stats
+TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" serve --idle-timeout-s 30 --cache-bytes 20000 > /tmp/tt-cache-serve.json 2>&1 &
+cache_serve_pid=$!
+for i in $(seq 50); do [ -S "$AP_ROOT/.daemon.sock" ] && break; sleep 0.1; done
+run_ok_cmd "daemon serves reads from a bounded cache" "TASK_TRACKING_ROOT='$AP_ROOT' python3 -c \"
+import json, subprocess, sys, os
+def cli(*args, daemon=True):
+    env = dict(os.environ)
+    if not daemon:
+        env['TASK_TRACKING_DAEMON'] = 'off'
+    return json.loads(subprocess.run([sys.executable, '${baseDir}/scripts/task_tracking.py', *args], capture_output=True, text=True, env=env).stdout)
+for _ in range(3):
+    for p in ('ap1', 'ap2', 'ap3', 'ap4', 'ap6'):
+        assert cli('list', p, '--fields', 'tags,assignee') == cli('list', p, '--fields', 'tags,assignee', daemon=False), p
+assert cli('show', 'ap6', 'lib_1') == cli('show', 'ap6', 'lib_1', daemon=False)
+cli('meta-update', 'ap6', 'lib_1', '--patch-json', '{\\\"set\\\":{\\\"priority\\\":\\\"P0\\\"}}')
+assert cli('show', 'ap6', 'lib_1')['meta']['priority'] == 'P0'
+t = cli('list', 'ap6', '--timings')['timings']['counters']
+assert t.get('cache_hits', 0) > 0, t
+d = cli('cache-stats')
+c = d['cache']
+assert d['resident'] and c['hits'] > 0 and c['evictions'] > 0 and 0 < c['bytes'] <= c['max_bytes'] == 20000, d
+\""
+kill $cache_serve_pid; wait $cache_serve_pid 2>/dev/null
+if grep -q '"evictions"' /tmp/tt-cache-serve.json; then log "PASS: daemon reports cache counters on exit"; pass=$((pass+1)); else log "FAIL: daemon cache counters on exit"; fail=$((fail+1)); fi
+
+log "== Per-invocation project snapshot =="
+ap init-project snap1 --statuses open,done >/dev/null 2>&1
+ap add snap1 --task-id s1 --status open --body "one" >/dev/null 2>&1
+run_ok_cmd "mutations leave a manifest matching the files" "cd '${baseDir}/scripts' && TASK_TRACKING_ROOT='$AP_ROOT' python3 -c \"
+import json, subprocess, sys
+import service, storage
+root = storage.get_root()
+def cli(*args, stdin=None):
+    out = subprocess.run([sys.executable, 'task_tracking.py', *args], input=stdin, capture_output=True, text=True).stdout
+    return [json.loads(line) for line in out.splitlines()]
+steps = [
+    ('add', 'snap1', '--task-id', 's2', '--status', 'open', '--body', 'two'),
+    ('move', 'snap1', 's1', 'done'),
+    ('meta-update', 'snap1', 's2', '--patch-json', '{\\\"set\\\":{\\\"priority\\\":\\\"P1\\\"}}'),
+    ('set-body', 'snap1', 's2', '--text', 'changed'),
+    ('migrate-index', 'snap1', '--shards', '2'),
+    ('move', 'snap1', 's2', 'done'),
+]
+for step in steps:
+    assert cli(*step)[-1]['ok'], step
+    assert service._changed_statuses(root, 'snap1') == [], step
+ops = '\\n'.join(json.dumps(op) for op in [{'op': 'add', 'task_id': 's3', 'status': 'open'}, {'op': 'move', 'task_id': 's3', 'to': 'done'}])
+assert cli('batch', 'snap1', stdin=ops)[-1]['ok']
+assert service._changed_statuses(root, 'snap1') == []
+assert cli('integrity-check', 'snap1')[-1]['found'] == []
+\""
+run_ok_cmd "commands list the project once and resolve each path once" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' move snap1 s1 open --timings | python3 -c \"
+import json, sys
+c = json.load(sys.stdin)['timings']['counters']
+assert c['dirs_listed'] == 1 and 0 < c['paths_resolved'] <= 40 and c['files_stat'] <= 24, c
+\""
+snap_outside="$(mktemp -d)"
+ln -s "$snap_outside" "$AP_ROOT/snap1/link"
+run_fail "status symlinked out of the root is rejected" 2 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" show snap1 s1
+rm -f "$AP_ROOT/snap1/link"; rm -rf "$snap_outside"
+
+log "== Bulk import and export =="
+xfer="$(mktemp -d)"
+ap init-project imp1 --statuses open,done >/dev/null 2>&1
+ap add imp1 --task-id existing --status open >/dev/null 2>&1
+cat > "$xfer/good.ndjson" <<'EOF'
+{"task_id": "i1", "status": "open", "body": "first\nbody", "tags": ["mig", "a,b"], "priority": "P1", "created_at": "2024-01-02T03:04:05Z", "custom": {"k": 1}}
+{"task_id": "i2", "status": "done", "assignee": "kim", "due_date": "2024-05-01", "priority": null}
+
+{"task_id": "i3", "body": "third"}
+EOF
+run_ok_cmd "import ndjson writes each status index once" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' import imp1 --file '$xfer/good.ndjson' --timings | python3 -c \"
+import json, sys
+s = json.loads(sys.stdin.read().splitlines()[-1])
+assert s['ok'] and s['records'] == 3 and s['imported'] == 3 and s['failed'] == 0, s
+assert s['indexes_written'] == 2 and s['timings']['counters']['indexes_written'] == 2, s
+\""
+run_ok_cmd "imported tasks keep their metadata" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' show imp1 i1 --body | python3 -c \"
+import json, sys
+d = json.load(sys.stdin)
+m = d['meta']
+assert d['status'] == 'open' and d['body']['text'] == 'first\\\\nbody', d
+assert m['created_at'] == '2024-01-02T03:04:05+00:00' and m['tags'] == ['mig', 'a,b'] and m['custom'] == {'k': 1}, m
+\""
+run_ok_cmd "import leaves the project consistent" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' integrity-check imp1 | python3 -c \"
+import json, sys
+assert json.load(sys.stdin)['found'] == []
+\""
+printf '%s\n' '{"task_id": "j1"}' '{"task_id": "existing"}' 'not json' '{"task_id": "j1"}' '{"task_id": "j2", "status": "nope"}' > "$xfer/bad.ndjson"
+run_fail "import with failing records exits with the first failure's code" 4 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" import imp1 --file "$xfer/bad.ndjson"
+run_ok_cmd "failing import reports every record and writes nothing" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' import imp1 --stdin < '$xfer/bad.ndjson' | python3 -c \"
+import json, subprocess, sys
+lines = [json.loads(l) for l in sys.stdin.read().splitlines()]
+assert [l['line'] for l in lines[:-1]] == [2, 3, 4, 5], lines
+assert [l['error']['code'] for l in lines[:-1]] == ['CONFLICT', 'VALIDATION_ERROR', 'CONFLICT', 'VALIDATION_ERROR'], lines
+assert lines[-1]['imported'] == 0 and lines[-1]['failed'] == 4 and not lines[-1]['ok'], lines[-1]
+out = subprocess.run([sys.executable, '${baseDir}/scripts/task_tracking.py', 'show', 'imp1', 'j1'], capture_output=True, text=True).stdout
+assert json.loads(out)['error']['code'] == 'NOT_FOUND', out
+\""
+run_ok_cmd "malformed CSV row fails as its own record" "printf 'task_id,body\nc_ok,fine\nc_bad,\"x\"y\nc_dup,one\nc_dup,two\n' | TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' import imp1 --format csv --stdin | python3 -c \"
+import json, sys
+lines = [json.loads(l) for l in sys.stdin.read().splitlines()]
+assert [(l['line'], l['error']['message']) for l in lines[:-1]] == [(3, 'Invalid CSV'), (5, 'Duplicate task_id in import')], lines
+assert lines[-1]['records'] == 4 and lines[-1]['failed'] == 2 and lines[-1]['imported'] == 0, lines[-1]
+\""
+run_fail_cmd "unknown CSV column is rejected" 2 "printf 'task_id,prio\nx,1\n' | TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' import imp1 --format csv --stdin"
+run_fail "import of a missing file" 3 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" import imp1 --file "$xfer/missing.csv"
+run_ok "export csv" env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" export imp1 --format csv --output "$xfer/imp1.csv"
+ap init-project imp2 --statuses open,done --backend sqlite >/dev/null 2>&1
+run_ok "import csv into a sqlite project" env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" import imp2 --format csv --file "$xfer/imp1.csv"
+ap export imp1 --output "$xfer/imp1.ndjson" >/dev/null 2>&1
+ap export imp2 --output "$xfer/imp2.ndjson" >/dev/null 2>&1
+run_ok_cmd "export -> csv import -> export round-trips every task" "python3 -c \"
+import json
+key = lambda r: r['task_id']
+a = sorted((json.loads(l) for l in open('$xfer/imp1.ndjson')), key=key)
+b = sorted((json.loads(l) for l in open('$xfer/imp2.ndjson')), key=key)
+assert a == b and len(a) == 4, (a, b)
+\""
+run_ok_cmd "export --status exports one status" "TASK_TRACKING_ROOT='$AP_ROOT' python3 '${baseDir}/scripts/task_tracking.py' export imp1 --status done --output '$xfer/done.ndjson' >/dev/null && python3 -c \"
+import json
+rows = [json.loads(l) for l in open('$xfer/done.ndjson')]
+assert sorted(r['task_id'] for r in rows) == ['i2', 'i3'] and all(r['status'] == 'done' for r in rows), rows
+\""
+run_fail "export of an unknown status" 3 env TASK_TRACKING_ROOT="$AP_ROOT" python3 "${baseDir}/scripts/task_tracking.py" export imp1 --status nope --output "$xfer/x.ndjson"
+rm -rf "$xfer"
+
+log "== Move durability on the delta path =="
+durable="$(mktemp -d)"
+cat > "$durable/trace_move.py" <<'EOF'
+import json, os, sys
+sys.path.insert(0, sys.argv[1])
+import cli, storage
+root = os.environ["TASK_TRACKING_ROOT"]
+events = []
+fsync_dir = storage._fsync_dir
+storage._fsync_dir = lambda d: (events.append(("sync", os.path.relpath(d, root))), fsync_dir(d))
+remove = os.remove
+def traced_remove(path, *args, **kwargs):
+    if path.endswith(".tx_move.json"):
+        events.append(("journal_removed", None))
+    return remove(path, *args, **kwargs)
+os.remove = traced_remove
+# both statuses large enough (> 256 KiB) for index updates to be delta appends
+records = "\n".join(json.dumps({"task_id": f"t{i:05d}", "status": ("backlog", "open")[i % 2], "tags": ["a", "b"], "assignee": "kim"}) for i in range(6000))
+os.environ["TASK_TRACKING_DURABILITY"] = "none"
+assert cli.execute(["init-project", "dur", "--statuses", "backlog,open"])[1] == 0
+assert cli.execute(["import", "dur", "--stdin"], stdin=type("In", (), {"isatty": lambda self: False, "buffer": __import__("io").BytesIO(records.encode())})())[1] == 0
+# the first move creates both delta logs; later ones only append
+assert cli.execute(["move", "dur", "t00000", "open"])[1] == 0
+for status in ("backlog", "open"):
+    assert os.path.exists(os.path.join(root, "dur", status, "index.delta.jsonl")), status
+for n, mode in enumerate(("strict", "batch")):
+    os.environ["TASK_TRACKING_DURABILITY"] = mode
+    events.clear()
+    assert cli.execute(["move", "dur", f"t{2 * n + 2:05d}", "open"])[1] == 0
+    done = events.index(("journal_removed", None))
+    synced = {name for kind, name in events[:done] if kind == "sync"}
+    assert {"dur/backlog", "dur/open"} <= synced, (mode, events)
+EOF
+run_ok "move fsyncs both status directories before the journal goes (strict, batch)" env TASK_TRACKING_ROOT="$durable/root" python3 "$durable/trace_move.py" "${baseDir}/scripts"
+rm -rf "$durable"
+
+log "== Derived-file logs =="
+derived="$(mktemp -d)"
+cat > "$derived/derived_logs.py" <<'EOF'
+import io, json, os, sys
+sys.path.insert(0, sys.argv[1])
+import cli, service
+root = os.environ["TASK_TRACKING_ROOT"]
+project = os.path.join(root, "der")
+def run(*argv):
+    payload, code = cli.execute(list(argv))
+    assert code == 0, (argv, payload)
+    return payload
+def stdin(text):
+    return type("In", (), {"isatty": lambda self: False, "buffer": io.BytesIO(text.encode())})()
+def listing():
+    return [run("list", "der", "--status", "backlog", *q)["items"] for q in
+            (["--tag", "g7"], ["--tag", "a", "--assignee", "u3"], ["--sort", "priority", "--limit", "20"], ["--limit", "20"])]
+bases = (".locator.json", ".postings.backlog.json", ".order.backlog.priority.json", ".order.backlog.updated_at.json")
+def stats():
+    return {name: (lambda st: (st.st_ino, st.st_size, st.st_mtime_ns))(os.stat(os.path.join(project, name))) for name in bases}
+# every derived file above DELTA_MIN_INDEX_BYTES
+records = "\n".join(json.dumps({"task_id": f"t{i:05d}", "status": "backlog", "tags": ["a", f"g{i % 40}"], "assignee": f"u{i % 9}", "priority": f"P{i % 4}"}) for i in range(15000))
+os.environ["TASK_TRACKING_DURABILITY"] = "none"
+assert cli.execute(["init-project", "der", "--statuses", "backlog,open"])[1] == 0
+assert cli.execute(["import", "der", "--stdin"], stdin=stdin(records))[1] == 0
+listing()
+before = stats()
+assert all(os.path.getsize(os.path.join(project, name)) >= service.DELTA_MIN_INDEX_BYTES for name in bases), before
+run("meta-update", "der", "t00007", "--patch-json", '{"set":{"tags":["g7","new"],"priority":"P0"},"unset":["assignee"]}')
+run("move", "der", "t00008", "open")
+run("add", "der", "--task-id", "fresh", "--tags", "g7", "--priority", "P0")
+assert stats() == before, "derived base files were rewritten"
+for name in bases:
+    assert os.path.exists(os.path.join(project, name[:-len(".json")] + ".delta.jsonl")), name
+# a torn, never acknowledged append is ignored
+with open(os.path.join(project, ".postings.backlog.delta.jsonl"), "a") as f:
+    f.write('{"from": ')
+logged = listing()
+assert stats() == before, "the logs were not replayed"
+assert any(item["task_id"] == "t00007" for item in logged[0]) and any(item["task_id"] == "fresh" for item in logged[0])
+assert not any(item["task_id"] == "t00008" for item in logged[1] + logged[3])
+for name in os.listdir(project):
+    if name.startswith((".locator", ".postings", ".order")):
+        os.remove(os.path.join(project, name))
+assert listing() == logged, "logged derived files disagree with a rebuild"
+# a log past its share of the base is compacted into it
+service.DELTA_COMPACT_RATIO = 0
+run("meta-update", "der", "t00009", "--patch-json", '{"set":{"priority":"P0"},"unset":[]}')
+for name in bases:
+    assert not os.path.exists(os.path.join(project, name[:-len(".json")] + ".delta.jsonl")), name
+assert stats() != before
+EOF
+run_ok "derived files take appended logs, replayed and compacted like the index" env TASK_TRACKING_ROOT="$derived/root" python3 "$derived/derived_logs.py" "${baseDir}/scripts"
+rm -rf "$derived"
+
+log "== Streamed payloads keep the invocation environment =="
+streamed="$(mktemp -d)"
+cat > "$streamed/stream_env.py" <<'EOF'
+import io, os, sys
+sys.path.insert(0, sys.argv[1])
+import cli, service, storage
+env = {"TASK_TRACKING_DURABILITY": "none"}
+for project, backend in (("sp", "fs"), ("sq", "sqlite")):
+    assert cli.execute(["init-project", project, "--statuses", "open,done", "--backend", backend], env=env)[1] == 0
+    for i in range(3):
+        assert cli.execute(["add", project, "--task-id", f"s{i}", "--status", ("open", "done")[i % 2]], env=env)[1] == 0
+# items are produced while the caller writes the payload, after execute() returned
+seen = []
+project_item = service._project_item
+service._project_item = lambda meta, fields: (seen.append(storage.get_durability()), project_item(meta, fields))[1]
+os.environ["TASK_TRACKING_DURABILITY"] = "batch"
+for argv in (["list", "sp", "--ndjson"], ["list", "sp", "--ndjson", "--limit", "1"], ["list", "sq", "--ndjson"]):
+    seen.clear()
+    out = io.StringIO()
+    payload, code = cli.execute(argv, env=env)
+    assert cli.write_payload(payload, code, out.write) == 0, out.getvalue()
+    assert seen and set(seen) == {"none"}, (argv, seen)
+    assert storage.get_durability() == "batch", "overrides outlived the stream"
+# a stream closed early (reader went away) resets them too
+payload, code = cli.execute(["list", "sp", "--ndjson"], env=env)
+next(payload)
+payload.close()
+assert storage.get_durability() == "batch"
+EOF
+run_ok "list --ndjson is produced with the forwarded TASK_TRACKING_* values (fs, sqlite)" env TASK_TRACKING_ROOT="$streamed/root" python3 "$streamed/stream_env.py" "${baseDir}/scripts"
+rm -rf "$streamed"
+
+log "== Concurrent search index rebuilds =="
+racing="$(mktemp -d)"
+cat > "$racing/search_race.py" <<'EOF'
+import json, os, subprocess, sys
+scripts = sys.argv[1]
+root = os.environ["TASK_TRACKING_ROOT"]
+cli = [sys.executable, os.path.join(scripts, "task_tracking.py")]
+env = dict(os.environ, TASK_TRACKING_DURABILITY="none", TASK_TRACKING_LOCK_TIMEOUT_MS="60000")
+def run(*argv, **kwargs):
+    return subprocess.run(cli + list(argv), env=env, capture_output=True, text=True, **kwargs)
+assert run("init-project", "race").returncode == 0
+records = "\n".join(json.dumps({"task_id": f"r{i:04d}", "body": f"ledger vendor quarter {i} " * 20}) for i in range(1500))
+assert run("import", "race", "--stdin", input=records).returncode == 0
+failures = []
+for round_ in range(int(sys.argv[2])):
+    # every round starts without a readable search index, so each concurrent search wants to build it
+    meta = os.path.join(root, "race", ".search", "meta.json")
+    if os.path.exists(meta):
+        os.remove(meta)
+    procs = [subprocess.Popen(cli + ["search", "race", "ledger vendor"], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) for _ in range(8)]
+    for p in procs:
+        out, err = p.communicate()
+        if p.returncode != 0 or not json.loads(out)["ok"]:
+            failures.append((round_, p.returncode, out[-300:], err[-300:]))
+assert not failures, failures[:3]
+EOF
+run_ok "concurrent first searches rebuild the index without failing each other" env TASK_TRACKING_ROOT="$racing/root" python3 "$racing/search_race.py" "${baseDir}/scripts" 15
+rm -rf "$racing"
+
 log "RESULTS pass=$pass fail=$fail"
 log "LOGFILE: $LOG"
 exit 0
@@ -0,0 +1,153 @@
+import contextlib
+import json
+import os
+import service
+import storage
+from index_cache import IndexCache
+from validators import validate_id
+
+# In-process library API for hosts that embed the tracker:
+#
+#   handle = ProjectHandle("acme-s4", root="/work/.task-tracking")
+#   handle.add("fix_login", priority="P1", tags=["auth"])
+#   handle.list(status="open")["items"]
+#
+# Methods mirror the CLI commands and return the same result dicts; errors
+# raise the `errors` exceptions (their `exit_code` is the CLI's). Read
+# methods keep parsed indexes and derived files in memory between calls and
+# check them against the files' fingerprints (mtime, size, inode) before
+# each use, so writes by other processes and handles are always seen.
+
+
+class ProjectHandle:
+    """One project of a root, with parsed data cached across calls.
+
+    `root` defaults to `TASK_TRACKING_ROOT` (or the cwd default) at creation.
+    `lock_timeout_ms` applies to every call (None: the environment's value).
+    `cache` defaults to a new `IndexCache` with the `TASK_TRACKING_CACHE_BYTES`
+    budget; handles of many projects can share one to bound their memory
+    together. A handle may be shared by threads.
+    """
+
+    def __init__(self, project_id: str, root: str | None = None, lock_timeout_ms: int | None = None, cache: IndexCache | None = None):
+        validate_id(project_id, "project_id")
+        self.project_id = project_id
+        self.root = os.path.abspath(root) if root is not None else storage.get_root()
+        self.lock_timeout_ms = lock_timeout_ms
+        self.cache = cache if cache is not None else IndexCache()
+
+    @classmethod
+    def create(cls, project_id: str, statuses=("backlog", "open", "done"), backend: str = "fs", root: str | None = None, **kwargs):
+        """`init-project`, then a handle of the new project."""
+        handle = cls(project_id, root=root, **kwargs)
+        with handle._invocation():
+            service.init_project(project_id, list(statuses), backend=backend)
+        return handle
+
+    @contextlib.contextmanager
+    def _invocation(self, cached=False):
+        previous = storage.thread_context()
+        storage.set_root(self.root)
+        storage.set_lock_timeout_ms(self.lock_timeout_ms)
+        try:
+            if cached:
+                with service.using_cache(self.cache):
+                    yield
+            else:
+                yield
+        finally:
+            storage.sync_barrier()
+            storage.set_root(previous["root"])
+            storage.set_lock_timeout_ms(previous["lock_timeout_ms"])
+
+    def add(self, task_id: str, status: str | None = None, body: str | None = None, tags=None, assignee: str | None = None,
+            priority: str | None = None, due_date: str | None = None) -> dict:
+        if tags is not None and not isinstance(tags, str):
+            tags = ",".join(tags)
+        with self._invocation():
+            return service.add_task(self.project_id, task_id, status=status, body=body, tags=tags,
+                                    assignee=assignee, priority=priority, due_date=due_date)
+
+    def list(self, status: str | None = None, tag: str | None = None, assignee: str | None = None, priority: str | None = None,
+             filter_mode: str = "and", fields: str | None = None, limit: int = 100, offset: int = 0,
+             sort: str = "updated_at", desc: bool = True, cursor: str | None = None) -> dict:
+        with self._invocation(cached=True):
+            return service.list_tasks(self.project_id, status=status, tag=tag, assignee=assignee, priority=priority,
+                                      filter_mode=filter_mode, fields=fields, limit=limit, offset=offset,
+                                      sort=sort, desc=desc, cursor=cursor)
+
+    def iter(self, status: str | None = None, tag: str | None = None, assignee: str | None = None, priority: str | None = None,
+             filter_mode: str = "and", fields: str | None = None, limit: int | None = None, offset: int = 0,
+             sort: str = "updated_at", desc: bool = True, cursor: str | None = None):
+        """`list --ndjson`: yields the items, then the summary; holds the shared lock until exhausted or closed."""
+        with self._invocation(cached=True):
+            stream = service.stream_tasks(self.project_id, status=status, tag=tag, assignee=assignee,
+                                          priority=priority, filter_mode=filter_mode, fields=fields, limit=limit,
+                                          offset=offset, sort=sort, desc=desc, cursor=cursor)
+        return self._iterate(stream)
+
+    def _iterate(self, stream):
+        with contextlib.closing(stream):
+            while True:
+                with self._invocation(cached=True):
+                    try:
+                        obj = next(stream)
+                    except StopIteration:
+                        return
+                yield obj
+
+    def show(self, task_id: str, body: bool = False, max_body_chars: int | None = None, max_body_lines: int | None = None) -> dict:
+        with self._invocation(cached=True):
+            return service.show_task(self.project_id, task_id, include_body=body,
+                                     max_body_chars=max_body_chars, max_body_lines=max_body_lines)
+
+    def search(self, query: str, mode: str = "and", status: str | None = None, limit: int = 20) -> dict:
+        with self._invocation(cached=True):
+            return service.search_tasks(self.project_id, query, mode=mode, status=status, limit=limit)
+
+    def move(self, task_id: str, new_status: str) -> dict:
+        with self._invocation():
+            return service.move_task(self.project_id, task_id, new_status)
+
+    def meta_update(self, task_id: str, patch: dict) -> dict:
+        """`patch` is the CLI's `{"set": {...}, "unset": [...]}` object."""
+        with self._invocation():
+            return service.meta_update(self.project_id, task_id, patch)
+
+    def set_body(self, task_id: str, text: str) -> dict:
+        with self._invocation():
+            return service.set_body(self.project_id, task_id, text=text)
+
+    def batch(self, ops) -> dict:
+        """Apply operation dicts (the `batch` line format) under one lock; returns `{results, summary}`."""
+        lines = [json.dumps(op, ensure_ascii=False) for op in ops]
+        with self._invocation():
+            return service.batch(self.project_id, lines)
+
+    def import_tasks(self, records=None, file_path: str | None = None, fmt: str = "ndjson") -> dict:
+        """`import` of record dicts (the NDJSON shape) or of a file; returns `{results, summary}`."""
+        text = None
+        if records is not None:
+            text = "\n".join(json.dumps(record, ensure_ascii=False) for record in records)
+        with self._invocation():
+            return service.import_tasks(self.project_id, fmt=fmt, text=text, file_path=file_path)
+
+    def export_tasks(self, output_path: str, fmt: str = "ndjson", status: str | None = None) -> dict:
+        with self._invocation():
+            return service.export_tasks(self.project_id, output_path, fmt=fmt, status=status)
+
+    def integrity_check(self, fix: bool = False, jobs: int = 1) -> dict:
+        with self._invocation():
+            return service.integrity_check(self.project_id, fix=fix, jobs=jobs)
+
+    def migrate_index(self, shards: int, status: str | None = None) -> dict:
+        with self._invocation():
+            return service.migrate_index(self.project_id, shards, status=status)
+
+    def cache_stats(self) -> dict:
+        """`cache-stats` of the handle's cache."""
+        return {"ok": True, "resident": True, "cache": self.cache.stats()}
+
+    def convert_backend(self, backend: str) -> dict:
+        with self._invocation():
+            return service.convert_backend(self.project_id, backend)
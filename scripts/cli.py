@@ -1,8 +1,11 @@
 import argparse
 import json
+import os
 import sys
+import time
 from errors import TaskTrackingError, ValidationError
-import service
+import metrics
+import storage
 
 
 class JsonArgumentParser(argparse.ArgumentParser):
@@ -10,181 +13,506 @@ class JsonArgumentParser(argparse.ArgumentParser):
         raise ValidationError(message)
 
 
-def _print(obj):
-    sys.stdout.write(json.dumps(obj, ensure_ascii=False))
-    sys.stdout.write("\n")
+def _error_payload(e):
+    return {"ok": False, "error": {"code": e.code, "message": e.message, "details": e.details}}
 
 
-def main(argv=None):
-    parser = JsonArgumentParser(prog="task-tracking")
-    sub = parser.add_subparsers(dest="command", required=True)
+def _unexpected_payload():
+    return {"ok": False, "error": {"code": "UNEXPECTED_ERROR", "message": "Unexpected error", "details": {}}}
+
+
+def render(payload):
+    # a list payload (batch) is written as one JSON object per line
+    if isinstance(payload, list):
+        return "\n".join(json.dumps(obj, ensure_ascii=False) for obj in payload)
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def is_streamed(payload):
+    return not isinstance(payload, (dict, list))
+
+
+def write_payload(payload, exit_code, write):
+    """Write a payload with `write(text)` and return the final exit code.
+
+    Streamed payloads (iterators) are written one line per object as they
+    are produced; an error raised mid-stream becomes the last line.
+    """
+    if not is_streamed(payload):
+        write(render(payload) + "\n")
+        return exit_code
+    try:
+        for obj in payload:
+            write(json.dumps(obj, ensure_ascii=False) + "\n")
+    except TaskTrackingError as e:
+        write(json.dumps(_error_payload(e), ensure_ascii=False) + "\n")
+        return e.exit_code
+    except OSError:
+        # the reader went away (e.g. `| head`): stop producing and release the lock
+        payload.close()
+        raise
+    except Exception:
+        write(json.dumps(_unexpected_payload()) + "\n")
+        return 10
+    return exit_code
+
+
+def _with_lock_wait(stream, lock_wait_ms):
+    for obj in stream:
+        if "count_total" in obj:
+            obj["lock_wait_ms"] = lock_wait_ms
+        yield obj
+
+
+def _with_invocation_env(stream, env):
+    # a stream is produced after execute() returns: the overrides stay in place until it is drained or closed
+    storage.set_env_overrides(env)
+    try:
+        yield from stream
+    finally:
+        storage.sync_barrier()
+        storage.set_env_overrides(None)
+
+
+def _with_timings(payload, target=None):
+    """Attach the `timings` object (--timings) to `target` (default: the payload itself)."""
+    if not metrics.enabled():
+        return payload
+    with metrics.phase("serialize"):
+        render(payload)
+    timings = metrics.snapshot()
+    timings["lock_wait_ms"] = round(storage.get_lock_wait_ms(), 3)
+    (payload if target is None else target)["timings"] = timings
+    return payload
+
+
+def _with_stream_timings(stream):
+    for obj in stream:
+        if "count_total" in obj:
+            obj["timings"] = metrics.snapshot()
+            obj["timings"]["lock_wait_ms"] = round(storage.get_lock_wait_ms(), 3)
+        yield obj
+
+
+def _read_stdin_text(stdin):
+    if stdin.isatty():
+        raise ValidationError("stdin required")
+    data = stdin.buffer.read()
+    try:
+        return data.decode("utf-8", errors="strict")
+    except UnicodeDecodeError:
+        raise ValidationError("stdin must be valid UTF-8")
+
+
+def _args_init(p):
+    p.add_argument("project_id")
+    p.add_argument("--timings", action="store_true")
+    p.add_argument("--statuses", default="backlog,open,done")
+    p.add_argument("--backend", choices=["fs", "sqlite"], default="fs")
+
 
-    p_init = sub.add_parser("init-project")
-    p_init.add_argument("project_id")
-    p_init.add_argument("--statuses", default="backlog,open,done")
-
-    p_add = sub.add_parser("add")
-    p_add.add_argument("project_id")
-    p_add.add_argument("--task-id", required=True)
-    p_add.add_argument("--status")
-    p_add.add_argument("--body")
-    p_add.add_argument("--tags")
-    p_add.add_argument("--assignee")
-    p_add.add_argument("--priority")
-    p_add.add_argument("--due-date")
-
-    p_list = sub.add_parser("list")
-    p_list.add_argument("project_id")
-    p_list.add_argument("--status")
-    p_list.add_argument("--tag")
-    p_list.add_argument("--assignee")
-    p_list.add_argument("--priority")
-    p_list.add_argument("--filter-mode", choices=["and", "or"], default="and")
-    p_list.add_argument("--fields")
-    p_list.add_argument("--limit", type=int, default=100)
-    p_list.add_argument("--offset", type=int, default=0)
-    p_list.add_argument("--sort", default="updated_at")
-    order = p_list.add_mutually_exclusive_group()
+def _args_add(p):
+    p.add_argument("project_id")
+    p.add_argument("--task-id", required=True)
+    p.add_argument("--status")
+    p.add_argument("--body")
+    p.add_argument("--tags")
+    p.add_argument("--assignee")
+    p.add_argument("--priority")
+    p.add_argument("--due-date")
+
+
+def _args_list(p):
+    p.add_argument("project_id", nargs="?")
+    p.add_argument("--all-projects", action="store_true")
+    p.add_argument("--status")
+    p.add_argument("--tag")
+    p.add_argument("--assignee")
+    p.add_argument("--priority")
+    p.add_argument("--filter-mode", choices=["and", "or"], default="and")
+    p.add_argument("--fields")
+    p.add_argument("--limit", type=int)
+    p.add_argument("--offset", type=int, default=0)
+    p.add_argument("--cursor")
+    p.add_argument("--sort", default="updated_at")
+    p.add_argument("--ndjson", action="store_true")
+    order = p.add_mutually_exclusive_group()
     order.add_argument("--desc", action="store_true")
     order.add_argument("--asc", action="store_true")
 
-    p_show = sub.add_parser("show")
-    p_show.add_argument("project_id")
-    p_show.add_argument("task_id")
-    p_show.add_argument("--body", action="store_true")
-    p_show.add_argument("--max-body-chars", type=int)
-    p_show.add_argument("--max-body-lines", type=int)
-
-    p_move = sub.add_parser("move")
-    p_move.add_argument("project_id")
-    p_move.add_argument("task_id")
-    p_move.add_argument("new_status")
-
-    p_meta = sub.add_parser("meta-update")
-    p_meta.add_argument("project_id")
-    p_meta.add_argument("task_id")
-    p_meta.add_argument("--patch-json")
-    p_meta.add_argument("--stdin", action="store_true")
-
-    p_body = sub.add_parser("set-body")
-    p_body.add_argument("project_id")
-    p_body.add_argument("task_id")
-    p_body.add_argument("--text")
-    p_body.add_argument("--file")
-    p_body.add_argument("--stdin", action="store_true")
-
-    p_check = sub.add_parser("integrity-check")
-    p_check.add_argument("project_id")
-    p_check.add_argument("--fix", action="store_true")
+
+def _args_show(p):
+    p.add_argument("project_id")
+    p.add_argument("task_id")
+    p.add_argument("--body", action="store_true")
+    p.add_argument("--max-body-chars", type=int)
+    p.add_argument("--max-body-lines", type=int)
+
+
+def _args_search(p):
+    p.add_argument("project_id")
+    p.add_argument("query")
+    p.add_argument("--mode", choices=["and", "or"], default="and")
+    p.add_argument("--status")
+    p.add_argument("--limit", type=int, default=20)
+
+
+def _args_move(p):
+    p.add_argument("project_id")
+    p.add_argument("task_id")
+    p.add_argument("new_status")
+
+
+def _args_meta(p):
+    p.add_argument("project_id")
+    p.add_argument("task_id")
+    p.add_argument("--patch-json")
+    p.add_argument("--stdin", action="store_true")
+
+
+def _args_body(p):
+    p.add_argument("project_id")
+    p.add_argument("task_id")
+    p.add_argument("--text")
+    p.add_argument("--file")
+    p.add_argument("--stdin", action="store_true")
+
+
+def _args_check(p):
+    p.add_argument("project_id", nargs="?")
+    p.add_argument("--all-projects", action="store_true")
+    p.add_argument("--fix", action="store_true")
+    p.add_argument("--jobs", type=int, default=1)
+    p.add_argument("--budget-ms", type=int)
+
+
+def _args_batch(p):
+    p.add_argument("project_id")
+
+
+def _args_import(p):
+    p.add_argument("project_id")
+    p.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    p.add_argument("--file")
+    p.add_argument("--stdin", action="store_true")
+
+
+def _args_export(p):
+    p.add_argument("project_id")
+    p.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    p.add_argument("--output", required=True)
+    p.add_argument("--status")
+
+
+def _args_migrate(p):
+    p.add_argument("project_id")
+    p.add_argument("--shards", type=int, required=True)
+    p.add_argument("--status")
+
+
+def _args_convert(p):
+    p.add_argument("project_id")
+    p.add_argument("--to", dest="backend", choices=["fs", "sqlite"], required=True)
+
+
+def _args_serve(p):
+    p.add_argument("--socket")
+    p.add_argument("--idle-timeout-s", type=float, default=0)
+    p.add_argument("--cache-bytes", type=int)
+
+
+def _args_cache_stats(p):
+    pass
+
+
+# Command handlers return a result dict, or a final `(payload, exit_code)` for
+# output shapes of their own (streams, NDJSON batches). Each one imports the
+# modules it needs so that startup only pays for the selected command.
+
+def _cmd_init(args, stdin, cwd):
+    import service
+    statuses = [s.strip() for s in args.statuses.split(",") if s.strip()]
+    return service.init_project(args.project_id, statuses, backend=args.backend)
+
+
+def _cmd_add(args, stdin, cwd):
+    import service
+    return service.add_task(
+        args.project_id,
+        task_id=args.task_id,
+        status=args.status,
+        body=args.body,
+        tags=args.tags,
+        assignee=args.assignee,
+        priority=args.priority,
+        due_date=args.due_date,
+    )
+
+
+def _cmd_list(args, stdin, cwd):
+    import service
+    desc = True
+    if args.asc:
+        desc = False
+    elif args.desc:
+        desc = True
+    list_args = dict(
+        status=args.status,
+        tag=args.tag,
+        assignee=args.assignee,
+        priority=args.priority,
+        filter_mode=args.filter_mode,
+        fields=args.fields,
+        offset=args.offset,
+        sort=args.sort,
+        desc=desc,
+        cursor=args.cursor,
+    )
+    if args.all_projects:
+        if args.project_id is not None:
+            raise ValidationError("Use either project_id or --all-projects")
+        if args.ndjson:
+            raise ValidationError("--ndjson is not supported with --all-projects")
+        limit = args.limit if args.limit is not None else 100
+        return service.list_all_projects(limit=limit, **list_args)
+    if args.project_id is None:
+        raise ValidationError("project_id or --all-projects required")
+    if args.ndjson:
+        stream = service.stream_tasks(args.project_id, limit=args.limit, **list_args)
+        if storage.get_lock_timeout_ms() > 0:
+            stream = _with_lock_wait(stream, round(storage.get_lock_wait_ms(), 3))
+        if metrics.enabled():
+            stream = _with_stream_timings(stream)
+        return stream, 0
+    limit = args.limit if args.limit is not None else 100
+    return service.list_tasks(args.project_id, limit=limit, **list_args)
+
+
+def _cmd_show(args, stdin, cwd):
+    import service
+    return service.show_task(
+        args.project_id,
+        args.task_id,
+        include_body=args.body,
+        max_body_chars=args.max_body_chars,
+        max_body_lines=args.max_body_lines,
+    )
+
+
+def _cmd_search(args, stdin, cwd):
+    import service
+    return service.search_tasks(args.project_id, args.query, mode=args.mode, status=args.status, limit=args.limit)
+
+
+def _cmd_move(args, stdin, cwd):
+    import service
+    return service.move_task(args.project_id, args.task_id, args.new_status)
+
+
+def _cmd_meta(args, stdin, cwd):
+    import service
+    patch_json_provided = args.patch_json is not None
+    stdin_provided = bool(args.stdin)
+    if patch_json_provided == stdin_provided:
+        raise ValidationError("Provide exactly one of --patch-json or --stdin")
+
+    if stdin_provided:
+        patch_raw = _read_stdin_text(stdin)
+    else:
+        patch_raw = args.patch_json
+    try:
+        patch = json.loads(patch_raw)
+    except json.JSONDecodeError:
+        raise ValidationError("Invalid JSON patch")
+    return service.meta_update(args.project_id, args.task_id, patch)
+
+
+def _cmd_body(args, stdin, cwd):
+    import service
+    sources = int(args.text is not None) + int(args.file is not None) + int(args.stdin)
+    if sources != 1:
+        raise ValidationError("Provide exactly one of --text, --file or --stdin")
+
+    text = args.text
+    file_path = args.file
+    if file_path is not None and cwd is not None:
+        file_path = os.path.join(cwd, file_path)
+    if args.stdin:
+        text = _read_stdin_text(stdin)
+        file_path = None
+
+    return service.set_body(args.project_id, args.task_id, text=text, file_path=file_path)
+
+
+def _cmd_check(args, stdin, cwd):
+    import service
+    if args.all_projects:
+        if args.project_id is not None:
+            raise ValidationError("Use either project_id or --all-projects")
+        return service.integrity_check_all(fix=args.fix, jobs=args.jobs, budget_ms=args.budget_ms)
+    if args.project_id is None:
+        raise ValidationError("project_id or --all-projects required")
+    if args.budget_ms is not None:
+        raise ValidationError("--budget-ms requires --all-projects")
+    return service.integrity_check(args.project_id, fix=args.fix, jobs=args.jobs)
+
+
+def _line_results(outcome):
+    """NDJSON payload of per-line results and their summary; the exit code is the first failing line's."""
+    exit_code = 0
+    for line in outcome["results"]:
+        line_exit = line.pop("exit_code", 0)
+        if line_exit and not exit_code:
+            exit_code = line_exit
+    summary = outcome["summary"]
+    if storage.get_lock_timeout_ms() > 0:
+        summary["lock_wait_ms"] = round(storage.get_lock_wait_ms(), 3)
+    return _with_timings(outcome["results"] + [summary], target=summary), exit_code
+
+
+def _cmd_batch(args, stdin, cwd):
+    import service
+    text = _read_stdin_text(stdin)
+    outcome = service.batch(args.project_id, text.splitlines())
+    return _line_results(outcome)
+
+
+def _cmd_import(args, stdin, cwd):
+    import service
+    if (args.file is not None) == bool(args.stdin):
+        raise ValidationError("Provide exactly one of --file or --stdin")
+    text = _read_stdin_text(stdin) if args.stdin else None
+    file_path = args.file
+    if file_path is not None and cwd is not None:
+        file_path = os.path.join(cwd, file_path)
+    outcome = service.import_tasks(args.project_id, fmt=args.format, text=text, file_path=file_path)
+    return _line_results(outcome)
+
+
+def _cmd_export(args, stdin, cwd):
+    import service
+    output = args.output
+    if cwd is not None:
+        output = os.path.join(cwd, output)
+    return service.export_tasks(args.project_id, output, fmt=args.format, status=args.status)
+
+
+def _cmd_migrate(args, stdin, cwd):
+    import service
+    return service.migrate_index(args.project_id, args.shards, status=args.status)
+
+
+def _cmd_convert(args, stdin, cwd):
+    import service
+    return service.convert_backend(args.project_id, args.backend)
+
+
+def _cmd_serve(args, stdin, cwd):
+    import daemon
+    return daemon.serve(socket_path=args.socket, idle_timeout_s=args.idle_timeout_s, cache_bytes=args.cache_bytes)
+
+
+def _cmd_cache_stats(args, stdin, cwd):
+    import service
+    return service.cache_stats()
+
+
+# name -> (argument builder, handler, takes the project lock)
+COMMANDS = {
+    "init-project": (_args_init, _cmd_init, False),
+    "add": (_args_add, _cmd_add, True),
+    "list": (_args_list, _cmd_list, True),
+    "show": (_args_show, _cmd_show, True),
+    "search": (_args_search, _cmd_search, True),
+    "move": (_args_move, _cmd_move, True),
+    "meta-update": (_args_meta, _cmd_meta, True),
+    "set-body": (_args_body, _cmd_body, True),
+    "integrity-check": (_args_check, _cmd_check, True),
+    "batch": (_args_batch, _cmd_batch, True),
+    "import": (_args_import, _cmd_import, True),
+    "export": (_args_export, _cmd_export, True),
+    "migrate-index": (_args_migrate, _cmd_migrate, True),
+    "convert-backend": (_args_convert, _cmd_convert, True),
+    "serve": (_args_serve, _cmd_serve, False),
+    "cache-stats": (_args_cache_stats, _cmd_cache_stats, False),
+}
+
+# read-only commands the daemon serves from its cache of parsed indexes
+CACHED_COMMANDS = ("list", "show", "search", "cache-stats")
+
+
+def build_parser(command=None):
+    """Argument parser with the subparser of `command` only (None: all commands)."""
+    parser = JsonArgumentParser(prog="task-tracking")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    lock_opts = JsonArgumentParser(add_help=False)
+    lock_opts.add_argument("--lock-timeout-ms", type=int)
+    lock_opts.add_argument("--timings", action="store_true")
+
+    for name, (add_arguments, _, locks) in COMMANDS.items():
+        if command is None or name == command:
+            add_arguments(sub.add_parser(name, parents=[lock_opts] if locks else []))
+    return parser
+
+
+def execute(argv=None, stdin=None, cwd=None, env=None):
+    """Run one command and return `(payload, exit_code)` without printing.
+
+    `stdin`, `cwd` and `env` (TASK_TRACKING_* overrides) default to the
+    current process; the daemon passes the forwarding client's values.
+    """
+    t0 = time.perf_counter()
+    if argv is None:
+        argv = sys.argv[1:]
+    if stdin is None:
+        stdin = sys.stdin
+    metrics.disable()
+    storage.set_env_overrides(env)
+    streamed = False
 
     try:
-        args = parser.parse_args(argv)
+        # unknown commands and top-level options get the full parser (and its messages)
+        command = argv[0] if argv and argv[0] in COMMANDS else None
+        args = build_parser(command).parse_args(argv)
         cmd = args.command
+        storage.set_lock_timeout_ms(getattr(args, "lock_timeout_ms", None))
+        storage.reset_lock_wait()
+        storage.get_durability()
+        if getattr(args, "timings", False) or storage.timings_requested():
+            metrics.start(t0)
+
+        _, handler, locks = COMMANDS[cmd]
+        result = handler(args, stdin, cwd)
+        if isinstance(result, tuple):
+            if is_streamed(result[0]):
+                streamed = True
+                return _with_invocation_env(result[0], env), result[1]
+            return result
 
-        if cmd == "init-project":
-            statuses = [s.strip() for s in args.statuses.split(",") if s.strip()]
-            result = service.init_project(args.project_id, statuses)
-
-        elif cmd == "add":
-            result = service.add_task(
-                args.project_id,
-                task_id=args.task_id,
-                status=args.status,
-                body=args.body,
-                tags=args.tags,
-                assignee=args.assignee,
-                priority=args.priority,
-                due_date=args.due_date,
-            )
-
-        elif cmd == "list":
-            desc = True
-            if args.asc:
-                desc = False
-            elif args.desc:
-                desc = True
-            result = service.list_tasks(
-                args.project_id,
-                status=args.status,
-                tag=args.tag,
-                assignee=args.assignee,
-                priority=args.priority,
-                filter_mode=args.filter_mode,
-                fields=args.fields,
-                limit=args.limit,
-                offset=args.offset,
-                sort=args.sort,
-                desc=desc,
-            )
-
-        elif cmd == "show":
-            result = service.show_task(
-                args.project_id,
-                args.task_id,
-                include_body=args.body,
-                max_body_chars=args.max_body_chars,
-                max_body_lines=args.max_body_lines,
-            )
-
-        elif cmd == "move":
-            result = service.move_task(args.project_id, args.task_id, args.new_status)
-
-        elif cmd == "meta-update":
-            patch_json_provided = args.patch_json is not None
-            stdin_provided = bool(args.stdin)
-            if patch_json_provided == stdin_provided:
-                raise ValidationError("Provide exactly one of --patch-json or --stdin")
-
-            if stdin_provided:
-                if sys.stdin.isatty():
-                    raise ValidationError("stdin required")
-                patch_bytes = sys.stdin.buffer.read()
-                try:
-                    patch_raw = patch_bytes.decode("utf-8", errors="strict")
-                except UnicodeDecodeError:
-                    raise ValidationError("stdin must be valid UTF-8")
-            else:
-                patch_raw = args.patch_json
-            try:
-                patch = json.loads(patch_raw)
-            except json.JSONDecodeError:
-                raise ValidationError("Invalid JSON patch")
-            result = service.meta_update(args.project_id, args.task_id, patch)
-
-        elif cmd == "set-body":
-            sources = int(args.text is not None) + int(args.file is not None) + int(args.stdin)
-            if sources != 1:
-                raise ValidationError("Provide exactly one of --text, --file or --stdin")
-
-            text = args.text
-            file_path = args.file
-            if args.stdin:
-                if sys.stdin.isatty():
-                    raise ValidationError("stdin required")
-                stdin_bytes = sys.stdin.buffer.read()
-                try:
-                    text = stdin_bytes.decode("utf-8", errors="strict")
-                except UnicodeDecodeError:
-                    raise ValidationError("stdin must be valid UTF-8")
-                file_path = None
-
-            result = service.set_body(args.project_id, args.task_id, text=text, file_path=file_path)
-
-        elif cmd == "integrity-check":
-            result = service.integrity_check(args.project_id, fix=args.fix)
-
-        else:
-            raise ValidationError("Unknown command")
-
-        _print(result)
-        return 0
+        if locks and storage.get_lock_timeout_ms() > 0:
+            result["lock_wait_ms"] = round(storage.get_lock_wait_ms(), 3)
+        return _with_timings(result), 0
 
     except TaskTrackingError as e:
-        _print({"ok": False, "error": {"code": e.code, "message": e.message, "details": e.details}})
-        return e.exit_code
+        return _with_timings(_error_payload(e)), e.exit_code
     except Exception:
-        _print({"ok": False, "error": {"code": "UNEXPECTED_ERROR", "message": "Unexpected error", "details": {}}})
-        return 10
+        return _with_timings(_unexpected_payload()), 10
+    finally:
+        if not streamed:
+            storage.sync_barrier()
+            storage.set_env_overrides(None)
+
+
+def main(argv=None, stdin=None):
+    result, exit_code = execute(argv, stdin=stdin)
+    try:
+        exit_code = write_payload(result, exit_code, sys.stdout.write)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # keep the interpreter from failing again while flushing at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return exit_code
 
 
 if __name__ == "__main__":
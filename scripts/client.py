@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+
+# Kept import-light on purpose: this module runs before the CLI is loaded, so
+# socket and base64 are only imported once a daemon socket exists.
+
+ROOT_ENV = "TASK_TRACKING_ROOT"
+DEFAULT_DIR = ".task_tracking"
+DAEMON_ENV = "TASK_TRACKING_DAEMON"
+SOCKET_ENV = "TASK_TRACKING_SOCKET"
+SOCKET_NAME = ".daemon.sock"
+CONNECT_TIMEOUT_S = 1.0
+
+
+def _resolve_root():
+    root = os.getenv(ROOT_ENV)
+    if not root:
+        return os.path.abspath(os.path.join(os.getcwd(), DEFAULT_DIR))
+    if ".." in root.replace("\\", "/").split("/"):
+        # let the in-process CLI report the validation error
+        return None
+    return os.path.abspath(root)
+
+
+def socket_path(root):
+    return os.getenv(SOCKET_ENV) or os.path.join(root, SOCKET_NAME)
+
+
+def _stdin_is_tty():
+    return sys.stdin is None or sys.stdin.isatty()
+
+
+def _read_stdin_b64():
+    import base64
+    return base64.b64encode(sys.stdin.buffer.read()).decode("ascii")
+
+
+def forward(argv):
+    """Run one CLI invocation through a running daemon.
+
+    Returns the exit code after writing the daemon's stdout JSON, or None
+    when no daemon serves this root (the caller then runs in-process).
+    """
+    if os.getenv(DAEMON_ENV, "").lower() in ("0", "off", "false", "no"):
+        return None
+    if not argv or argv[0] == "serve":
+        return None
+    root = _resolve_root()
+    if root is None:
+        return None
+    path = socket_path(root)
+    if not os.path.exists(path):
+        return None
+    import socket
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    request = {
+        "argv": list(argv),
+        "root": root,
+        "cwd": os.getcwd(),
+        "env": {k: v for k, v in os.environ.items() if k.startswith("TASK_TRACKING_") and k != ROOT_ENV},
+        "stdin_tty": _stdin_is_tty(),
+    }
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.settimeout(CONNECT_TIMEOUT_S)
+            sock.connect(path)
+            sock.settimeout(None)
+        except OSError:
+            # stale socket file or daemon not accepting: run in-process
+            return None
+        try:
+            stream = sock.makefile("rwb")
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            while True:
+                response = json.loads(stream.readline())
+                if isinstance(response, dict) and isinstance(response.get("stdout_chunk"), str):
+                    # streamed output (list --ndjson) is relayed as it arrives
+                    sys.stdout.write(response["stdout_chunk"])
+                    continue
+                if not (isinstance(response, dict) and response.get("stdin_request")):
+                    break
+                # the command reads stdin: read it only now, exactly like in-process
+                stream.write(json.dumps({"stdin": _read_stdin_b64()}).encode("utf-8") + b"\n")
+                stream.flush()
+            stream.close()
+        except (OSError, ValueError):
+            response = None
+    finally:
+        sock.close()
+
+    if isinstance(response, dict) and response.get("fallback"):
+        return None
+    if isinstance(response, dict) and response.get("streamed"):
+        return int(response.get("exit_code", 10))
+    if not isinstance(response, dict) or not isinstance(response.get("stdout"), str):
+        # the request may already have been applied; never replay it in-process
+        response = {
+            "exit_code": 10,
+            "stdout": json.dumps({
+                "ok": False,
+                "error": {"code": "UNEXPECTED_ERROR", "message": "Daemon request failed", "details": {"socket": path}},
+            }),
+        }
+
+    sys.stdout.write(response["stdout"])
+    sys.stdout.write("\n")
+    return int(response.get("exit_code", 10))
@@ -0,0 +1,190 @@
+import base64
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from errors import ConflictError, ValidationError
+from index_cache import IndexCache
+import client
+import cli
+import service
+import storage
+
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class _RemoteStdin:
+    """stdin of the forwarding client; the bytes are requested only when read."""
+
+    def __init__(self, handler, tty):
+        self._handler = handler
+        self._tty = tty
+        self.buffer = self
+
+    def isatty(self):
+        return self._tty
+
+    def read(self):
+        self._handler.wfile.write(json.dumps({"stdin_request": True}).encode("utf-8") + b"\n")
+        self._handler.wfile.flush()
+        reply = json.loads(self._handler.rfile.readline(MAX_REQUEST_BYTES))
+        return base64.b64decode(reply["stdin"])
+
+
+def _same_root(a, b):
+    return os.path.realpath(a) == os.path.realpath(b)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        server.touch()
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get("argv"), list):
+                raise ValueError("invalid request")
+        except ValueError:
+            return
+        if not _same_root(request.get("root") or "", server.root):
+            response = {"fallback": True}
+        else:
+            response = self._execute(request)
+        server.touch(served=True)
+        self._send(response)
+
+    def _execute(self, request):
+        argv = [str(a) for a in request["argv"]]
+        if argv and argv[0] == "serve":
+            err = ValidationError("serve cannot be forwarded to a daemon")
+            payload = {"ok": False, "error": {"code": err.code, "message": err.message, "details": err.details}}
+            return {"exit_code": err.exit_code, "stdout": json.dumps(payload, ensure_ascii=False)}
+        cache = self.server.cache if argv and argv[0] in cli.CACHED_COMMANDS else None
+        with service.using_cache(cache):
+            return self._run(argv, request)
+
+    def _run(self, argv, request):
+        stdin = _RemoteStdin(self, bool(request.get("stdin_tty", True)))
+        env = request.get("env") if isinstance(request.get("env"), dict) else None
+        payload, exit_code = cli.execute(argv, stdin=stdin, cwd=request.get("cwd"), env=env)
+        if not cli.is_streamed(payload):
+            return {"exit_code": exit_code, "stdout": cli.render(payload)}
+        # streamed output is relayed in chunks instead of one final stdout string
+        pending = []
+        pending_bytes = 0
+
+        def _flush():
+            nonlocal pending_bytes
+            if pending:
+                self._send({"stdout_chunk": "".join(pending)})
+                pending.clear()
+                pending_bytes = 0
+
+        def _write(text):
+            nonlocal pending_bytes
+            pending.append(text)
+            pending_bytes += len(text)
+            if pending_bytes >= STREAM_CHUNK_BYTES:
+                _flush()
+
+        exit_code = cli.write_payload(payload, exit_code, _write)
+        _flush()
+        return {"exit_code": exit_code, "streamed": True}
+
+    def _send(self, message):
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, root, cache):
+        self.root = root
+        self.cache = cache
+        self.requests_served = 0
+        self.last_activity = time.monotonic()
+        self._stats_lock = threading.Lock()
+        super().__init__(path, _Handler)
+
+    def touch(self, served=False):
+        with self._stats_lock:
+            self.last_activity = time.monotonic()
+            if served:
+                self.requests_served += 1
+
+
+def _claim_socket(path):
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.settimeout(client.CONNECT_TIMEOUT_S)
+        probe.connect(path)
+    except OSError:
+        # stale socket of a dead daemon
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise ConflictError("Daemon already running", {"socket": path, "reason": "DAEMON_RUNNING"})
+
+
+def serve(socket_path=None, idle_timeout_s=0, cache_bytes=None):
+    """Serve the CLI contract on a Unix socket until SIGTERM/SIGINT or idle timeout.
+
+    Read commands share one `IndexCache` of `cache_bytes` (default
+    `TASK_TRACKING_CACHE_BYTES`).
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise ValidationError("serve requires Unix domain sockets")
+    if idle_timeout_s is None or idle_timeout_s < 0:
+        raise ValidationError("idle_timeout_s must be >= 0")
+    cache = IndexCache(cache_bytes)
+    root = storage.get_root()
+    os.makedirs(root, exist_ok=True)
+    path = os.path.abspath(socket_path) if socket_path else client.socket_path(root)
+    _claim_socket(path)
+    try:
+        server = _Server(path, root, cache)
+    except OSError as e:
+        raise ValidationError("Cannot bind daemon socket", {"socket": path, "error": str(e)})
+    os.chmod(path, 0o600)
+    sock_ino = os.stat(path).st_ino
+
+    stopping = threading.Event()
+
+    def _stop(*_):
+        if not stopping.is_set():
+            stopping.set()
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    previous = {}
+    if threading.current_thread() is threading.main_thread():
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous[sig] = signal.signal(sig, _stop)
+
+    if idle_timeout_s:
+        def _watch_idle():
+            while not stopping.wait(min(idle_timeout_s, 1.0)):
+                if time.monotonic() - server.last_activity >= idle_timeout_s:
+                    _stop()
+        threading.Thread(target=_watch_idle, daemon=True).start()
+
+    try:
+        server.serve_forever(poll_interval=0.5)
+    finally:
+        stopping.set()
+        server.server_close()
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        try:
+            if os.stat(path).st_ino == sock_ino:
+                os.remove(path)
+        except OSError:
+            pass
+
+    return {"ok": True, "socket": path, "requests": server.requests_served, "cache": cache.stats()}
@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from errors import ValidationError
+import storage
+
+# Parsed project data kept in memory between commands of one process
+# (api.ProjectHandle, the `serve` daemon). Every entry is tagged with the
+# fingerprint of the files it was built from; a lookup with another
+# fingerprint is a miss, so files changed by other processes are read again.
+#
+# The cache holds at most `max_bytes` (approximate): an entry is charged
+# PARSED_BYTES_FACTOR times the size of its source files, and the least
+# recently used entries are evicted to make room.
+
+PARSED_BYTES_FACTOR = 4
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def approx_bytes(source):
+    """Approximate memory of a value parsed from the files fingerprinted in `source`."""
+    if isinstance(source, dict):
+        return sum(approx_bytes(v) for v in source.values())
+    if isinstance(source, (list, tuple)):
+        if len(source) == 3 and all(isinstance(v, int) for v in source):
+            # a `[mtime_ns, size, inode]` file fingerprint
+            return source[1] * PARSED_BYTES_FACTOR
+        return sum(approx_bytes(v) for v in source)
+    return 0
+
+
+class IndexCache:
+    """Parsed status indexes and derived files, keyed by `(root, project_id, kind, ...)`.
+
+    `max_bytes` defaults to `TASK_TRACKING_CACHE_BYTES`; 0 keeps nothing.
+    Cached values are shared by every reader and must not be modified.
+    A cache may be shared by threads and by handles of different roots.
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        if max_bytes is None:
+            max_bytes = storage.get_cache_max_bytes()
+        if not isinstance(max_bytes, int) or isinstance(max_bytes, bool) or max_bytes < 0:
+            raise ValidationError("Cache size must be >= 0", {"max_bytes": max_bytes})
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, source):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry[0] != source:
+                # the files changed: the entry can never be used again
+                self._misses += 1
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key, source, value, size=None):
+        """Store `value`; `size` defaults to the estimate from `source`."""
+        size = (approx_bytes(source) if size is None else size) + ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (source, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """The `cache` object of `cache-stats`."""
+        with self._lock:
+            projects = {key[:2] for key in self._entries}
+            lookups = self._hits + self._misses
+            return {
+                "max_bytes": self.max_bytes,
+                "bytes": self._bytes,
+                "entries": len(self._entries),
+                "projects": len(projects),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+                "evictions": self._evictions,
+            }
@@ -0,0 +1,94 @@
+import threading
+import time
+
+# Opt-in per-invocation timings and counters (`--timings`). The hooks stay in
+# the hot paths; while disabled each one costs a single thread-local lookup.
+
+_local = threading.local()
+
+
+def start(t0=None):
+    """Enable collection for the current thread (and invocation)."""
+    _local.data = {"t0": time.perf_counter() if t0 is None else t0, "phases": {}, "counters": {}}
+
+
+def disable():
+    _local.data = None
+
+
+def enabled():
+    return getattr(_local, "data", None) is not None
+
+
+def count(name, n=1):
+    data = getattr(_local, "data", None)
+    if data is not None:
+        counters = data["counters"]
+        counters[name] = counters.get(name, 0) + n
+
+
+class _Phase:
+    __slots__ = ("_phases", "_name", "_start")
+
+    def __init__(self, phases, name):
+        self._phases = phases
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._phases[self._name] = self._phases.get(self._name, 0.0) + time.perf_counter() - self._start
+        return False
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name):
+    """Context manager adding its wall time to phase `name` (phases may nest)."""
+    data = getattr(_local, "data", None)
+    if data is None:
+        return _NO_PHASE
+    return _Phase(data["phases"], name)
+
+
+def detach():
+    """Stop collecting in the current thread and return what was collected (or None)."""
+    data = getattr(_local, "data", None)
+    _local.data = None
+    return data
+
+
+def merge(data):
+    """Add phases and counters of a detached worker thread to the current thread."""
+    own = getattr(_local, "data", None)
+    if own is None or data is None:
+        return
+    for name, sec in data["phases"].items():
+        own["phases"][name] = own["phases"].get(name, 0.0) + sec
+    for name, n in data["counters"].items():
+        own["counters"][name] = own["counters"].get(name, 0) + n
+
+
+def snapshot():
+    """The `timings` object: total and per-phase milliseconds plus counters."""
+    data = getattr(_local, "data", None)
+    if data is None:
+        return None
+    return {
+        "total_ms": round((time.perf_counter() - data["t0"]) * 1000, 3),
+        "phases_ms": {name: round(sec * 1000, 3) for name, sec in sorted(data["phases"].items())},
+        "counters": dict(sorted(data["counters"].items())),
+    }
@@ -0,0 +1,286 @@
+import json
+import math
+import os
+import re
+import zlib
+import metrics
+from errors import IntegrityError
+from storage import safe_join, read_json, write_json_atomic, append_line_durable, read_appended_lines, remove_durable
+
+# Full-text index of one project (`search`). Documents are the indexed texts of
+# a task (body and string metadata, chosen by service.py); this module holds
+# the tokenizer, the ranking and the persisted layout of filesystem projects:
+#
+#   .search/meta.json            header: shard count, statistics, sources of the base
+#   .search/docs.json            task_id -> document length of the base
+#   .search/terms.<S>.<NN>.json  term -> {task_id: frequency}, hash-sharded by term
+#   .search/delta.jsonl          documents changed since the base was written
+#
+# SQLite projects keep the same postings in tables (sqlite_backend.py).
+
+SEARCH_DIR = ".search"
+FORMAT_VERSION = 1
+MIN_TERM_CHARS = 2
+MAX_TERM_CHARS = 64
+SHARD_POSTINGS = 65536
+MAX_SHARDS = 256
+DELTA_COMPACT_RATIO = 0.25
+DELTA_MAX_BYTES = 4 * 1024 * 1024
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Lower-cased runs of letters and digits (`_` and punctuation separate)."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if MIN_TERM_CHARS <= len(t) <= MAX_TERM_CHARS]
+
+
+def document(texts):
+    """`(length, {term: frequency})` of a task's indexed texts."""
+    tf = {}
+    length = 0
+    for text in texts:
+        for term in tokenize(text):
+            tf[term] = tf.get(term, 0) + 1
+            length += 1
+    return length, tf
+
+
+def rank(postings, lengths, docs, total_length, mode):
+    """BM25 scores `{task_id: score}` of the matching tasks.
+
+    `postings` holds one `{task_id: frequency}` per query term; `and` mode
+    keeps tasks containing every term, `or` mode tasks containing any.
+    `lengths` maps task_id to document length.
+    """
+    if not postings:
+        return {}
+    if mode == "and":
+        ordered = sorted(postings, key=len)
+        matches = set(ordered[0]).intersection(*ordered[1:])
+    else:
+        matches = set().union(*postings)
+    # BM25 length normalisation: k1 * (1 - b + b * length / average length)
+    fixed = BM25_K1 * (1 - BM25_B)
+    per_char = BM25_K1 * BM25_B * docs / total_length if total_length else 0.0
+    norms = {task_id: fixed + per_char * lengths.get(task_id, 0) for task_id in matches}
+    scores = dict.fromkeys(matches, 0.0)
+    for p in postings:
+        weight = math.log(1 + (docs - len(p) + 0.5) / (len(p) + 0.5)) * (BM25_K1 + 1)
+        for task_id, tf in p.items():
+            norm = norms.get(task_id)
+            if norm is not None:
+                scores[task_id] += weight * tf / (tf + norm)
+    return scores
+
+
+def _dir(root, project_id):
+    return safe_join(root, project_id, SEARCH_DIR)
+
+
+def _meta_path(root, project_id):
+    return safe_join(root, project_id, SEARCH_DIR, "meta.json")
+
+
+def _docs_path(root, project_id):
+    return safe_join(root, project_id, SEARCH_DIR, "docs.json")
+
+
+def _delta_path(root, project_id):
+    return safe_join(root, project_id, SEARCH_DIR, "delta.jsonl")
+
+
+def _shard_path(root, project_id, shards, shard):
+    return safe_join(root, project_id, SEARCH_DIR, f"terms.{shards}.{shard:02x}.json")
+
+
+def _shard_of(term, shards):
+    return zlib.crc32(term.encode("utf-8")) % shards
+
+
+def exists(root, project_id):
+    return os.path.exists(_meta_path(root, project_id))
+
+
+def read_meta(root, project_id):
+    """Header of the persisted index; None if there is none or it is unusable."""
+    try:
+        data = read_json(_meta_path(root, project_id))
+    except IntegrityError:
+        return None
+    if not isinstance(data, dict) or data.get("version") != FORMAT_VERSION:
+        return None
+    shards = data.get("shards")
+    if not isinstance(shards, int) or not 1 <= shards <= MAX_SHARDS:
+        return None
+    if not all(isinstance(data.get(field), int) for field in ("docs", "length", "bytes")):
+        return None
+    if not isinstance(data.get("sources"), dict):
+        return None
+    return data
+
+
+def drop(root, project_id):
+    """Remove the persisted index; the next search rebuilds it."""
+    directory = _dir(root, project_id)
+    if not os.path.isdir(directory):
+        return
+    # the header goes first, so a partly removed index is never used
+    if os.path.exists(_meta_path(root, project_id)):
+        remove_durable(_meta_path(root, project_id))
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+def build(root, project_id, docs, sources):
+    """Write a new index of `docs` (`{task_id: (length, tf)}`).
+
+    `sources` maps each status to the index fingerprint the documents were
+    read from; searches rebuild the index once they no longer match.
+    """
+    postings = {}
+    lengths = {}
+    for task_id, (length, tf) in docs.items():
+        lengths[task_id] = length
+        for term, n in tf.items():
+            postings.setdefault(term, {})[task_id] = n
+    _write_base(root, project_id, postings, lengths, sources)
+
+
+def _write_base(root, project_id, postings, lengths, sources):
+    metrics.count("derived_rebuilds")
+    directory = _dir(root, project_id)
+    os.makedirs(directory, exist_ok=True)
+    remove_durable(_meta_path(root, project_id), rebuildable=True)
+    count = sum(len(ids) for ids in postings.values())
+    shards = 1
+    while shards < MAX_SHARDS and count > shards * SHARD_POSTINGS:
+        shards *= 2
+    parts = [{} for _ in range(shards)]
+    for term, ids in postings.items():
+        parts[_shard_of(term, shards)][term] = ids
+    size = 0
+    for shard, part in enumerate(parts):
+        path = _shard_path(root, project_id, shards, shard)
+        write_json_atomic(path, part, rebuildable=True)
+        size += os.path.getsize(path)
+    write_json_atomic(_docs_path(root, project_id), lengths, rebuildable=True)
+    size += os.path.getsize(_docs_path(root, project_id))
+    keep = {"docs.json"} | {os.path.basename(_shard_path(root, project_id, shards, s)) for s in range(shards)}
+    for name in os.listdir(directory):
+        if name not in keep and not name.startswith(".tmp"):
+            os.remove(os.path.join(directory, name))
+    write_json_atomic(_meta_path(root, project_id), {
+        "version": FORMAT_VERSION,
+        "shards": shards,
+        "docs": len(lengths),
+        "length": sum(lengths.values()),
+        "bytes": size,
+        "sources": sources,
+    }, rebuildable=True)
+
+
+def _read_delta(root, project_id, sources):
+    """Documents changed since the base, `{task_id: (length, tf) or None}`; None if the log is unusable.
+
+    Entries are applied while each one's `from` matches the `sources` reached
+    so far, which are updated in place.
+    """
+    changed = {}
+    for line in read_appended_lines(_delta_path(root, project_id)):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or not all(isinstance(entry.get(k), dict) for k in ("from", "sources", "docs")):
+            return None
+        if any(sources.get(st) != source for st, source in entry["from"].items()):
+            break
+        for task_id, doc in entry["docs"].items():
+            changed[task_id] = None if doc is None else (doc[0], doc[1])
+        sources.update(entry["sources"])
+    return changed
+
+
+class Reader:
+    """Postings of a persisted index: the base shards with the delta log applied.
+
+    Raises IntegrityError if a file of the index is unreadable.
+    """
+
+    def __init__(self, root, project_id, meta):
+        self.root = root
+        self.project_id = project_id
+        self.shards = meta["shards"]
+        # index fingerprints the postings are derived from, delta applied
+        self.sources = dict(meta["sources"])
+        # document lengths of the current tasks, delta applied
+        self.lengths = read_json(_docs_path(root, project_id))
+        self.changed = _read_delta(root, project_id, self.sources)
+        if not isinstance(self.lengths, dict) or self.changed is None:
+            raise IntegrityError("Search index unreadable", {"project_id": project_id})
+        self.total_length = meta["length"]
+        for task_id, doc in self.changed.items():
+            self.total_length -= self.lengths.pop(task_id, 0)
+            if doc is not None:
+                self.lengths[task_id] = doc[0]
+                self.total_length += doc[0]
+        self.docs = len(self.lengths)
+        self._parts = {}
+
+    def _part(self, shard):
+        if shard not in self._parts:
+            part = read_json(_shard_path(self.root, self.project_id, self.shards, shard))
+            if not isinstance(part, dict):
+                raise IntegrityError("Search index unreadable", {"project_id": self.project_id})
+            self._parts[shard] = part
+        return self._parts[shard]
+
+    def postings(self, term):
+        base = self._part(_shard_of(term, self.shards)).get(term, {})
+        if not isinstance(base, dict):
+            raise IntegrityError("Search index unreadable", {"project_id": self.project_id})
+        if not self.changed:
+            return base
+        ids = {task_id: n for task_id, n in base.items() if task_id not in self.changed}
+        for task_id, doc in self.changed.items():
+            if doc is not None and term in doc[1]:
+                ids[task_id] = doc[1][term]
+        return ids
+
+
+def update(root, project_id, meta, docs, sources_before, sources):
+    """Record changed documents (`{task_id: (length, tf) or None}`) after a mutation.
+
+    `sources_before` and `sources` hold the index fingerprints of the written
+    statuses before and after it; an entry that does not follow on from the
+    log ends it, and the next search rebuilds the index. The delta log is
+    folded into the base once it outgrows its share of it.
+    """
+    line = json.dumps({
+        "from": sources_before,
+        "sources": sources,
+        "docs": {tid: None if doc is None else [doc[0], doc[1]] for tid, doc in docs.items()},
+    }, ensure_ascii=False, sort_keys=True)
+    append_line_durable(_delta_path(root, project_id), line, rebuildable=True)
+    delta_size = os.path.getsize(_delta_path(root, project_id))
+    if delta_size >= DELTA_MAX_BYTES or delta_size > meta["bytes"] * DELTA_COMPACT_RATIO:
+        _compact(root, project_id, meta)
+
+
+def _compact(root, project_id, meta):
+    reader = Reader(root, project_id, meta)
+    postings = {}
+    for shard in range(reader.shards):
+        for term, ids in reader._part(shard).items():
+            kept = {task_id: n for task_id, n in ids.items() if task_id not in reader.changed}
+            if kept:
+                postings[term] = kept
+    for task_id, doc in reader.changed.items():
+        if doc is not None:
+            for term, n in doc[1].items():
+                postings.setdefault(term, {})[task_id] = n
+    _write_base(root, project_id, postings, reader.lengths, reader.sources)
@@ -1,10 +1,24 @@
 import os
-import datetime
-from errors import ValidationError, NotFoundError, ConflictError, IntegrityError
-from storage import get_root, safe_join, read_json, write_json_atomic, write_text_atomic, ProjectLock
-from validators import validate_id, validate_status, validate_statuses, validate_tags, validate_priority, validate_due_date, parse_due_date
+import re
+import json
+import bisect
+import copy
+import heapq
+import contextlib
+import functools
+import itertools
+import threading
+import zlib
+import metrics
+from errors import TaskTrackingError, ValidationError, NotFoundError, ConflictError, IntegrityError
+from storage import get_root, safe_join, read_json, write_json_atomic, write_text_atomic, append_line_durable, read_appended_lines, remove_durable, sync_barrier, sync_dir, ProjectLock
+from storage import thread_context, use_thread_context, get_lock_wait_ms, add_lock_wait, resolved_paths, deferred_sync, atomic_output
+from validators import validate_id, validate_status, validate_statuses, validate_tags, validate_priority, validate_due_date, parse_due_date, normalize_timestamp
 from utils import now_utc_iso
 
+BACKENDS = ("fs", "sqlite")
+DB_NAME = "tasks.sqlite"
+
 
 def _project_dir(root, project_id):
     return safe_join(root, project_id)
@@ -20,6 +34,20 @@ def _index_path(root, project_id, status):
     return safe_join(root, project_id, status, "index.json")
 
 
+def _delta_path(root, project_id, status):
+    return safe_join(root, project_id, status, "index.delta.jsonl")
+
+
+MIN_SHARDS = 2
+MAX_SHARDS = 256
+INDEX_HEADER_MAX_BYTES = 4096
+
+
+def _shard_path(root, project_id, status, shards, shard):
+    # the shard count is part of the name, so layouts of different sizes never collide
+    return safe_join(root, project_id, status, f"index.{shards}.{shard:02x}.json")
+
+
 def _body_path(root, project_id, status, task_id):
     return safe_join(root, project_id, status, f"{task_id}.md")
 
@@ -28,6 +56,26 @@ def _tx_path(root, project_id):
     return safe_join(root, project_id, ".tx_move.json")
 
 
+def _manifest_path(root, project_id):
+    return safe_join(root, project_id, ".integrity.json")
+
+
+def _locator_path(root, project_id):
+    return safe_join(root, project_id, ".locator.json")
+
+
+def _postings_path(root, project_id, status):
+    return safe_join(root, project_id, f".postings.{status}.json")
+
+
+def _db_path(root, project_id):
+    return safe_join(root, project_id, DB_NAME)
+
+
+def _is_sqlite(root, project_id):
+    return os.path.exists(_db_path(root, project_id))
+
+
 def _meta_for_storage(meta):
     return dict(meta or {})
 
@@ -37,9 +85,25 @@ def _recover_move(root, project_id):
     if not os.path.exists(tx_path):
         return
     tx = read_json(tx_path)
-    if not isinstance(tx, dict) or tx.get("op") != "move":
+    if not isinstance(tx, dict) or tx.get("op") not in ("move", "move_batch"):
         raise IntegrityError("Invalid transaction file", {"path": tx_path})
+    if tx.get("op") == "move_batch":
+        moves = tx.get("moves")
+        if not isinstance(moves, list) or not all(isinstance(m, dict) for m in moves):
+            raise IntegrityError("Invalid transaction data", {"path": tx_path})
+    else:
+        moves = [tx]
+
+    # ensure statuses are part of the project definition
+    statuses = load_project_statuses(root, project_id)
+    for move in moves:
+        _recover_one_move(root, project_id, tx_path, move, statuses)
+    _load_locator(root, project_id, statuses)
+    sync_barrier()
+    os.remove(tx_path)
 
+
+def _recover_one_move(root, project_id, tx_path, tx, statuses):
     task_id = tx.get("task_id")
     from_status = tx.get("from")
     to_status = tx.get("to")
@@ -50,8 +114,6 @@ def _recover_move(root, project_id):
     validate_status(from_status)
     validate_status(to_status)
 
-    # ensure statuses are part of the project definition
-    statuses = load_project_statuses(root, project_id)
     if from_status not in statuses or to_status not in statuses:
         raise IntegrityError("Invalid transaction status", {"from": from_status, "to": to_status})
 
@@ -68,14 +130,14 @@ def _recover_move(root, project_id):
 
     # Consistent states
     if src_body_exists and in_src and not dst_body_exists and not in_dst:
-        os.remove(tx_path)
         return
     if dst_body_exists and in_dst and not src_body_exists and not in_src:
-        os.remove(tx_path)
         return
     if src_body_exists and dst_body_exists:
         raise IntegrityError("Task body exists in both statuses", {"task_id": task_id})
-    if in_src and in_dst:
+    # both indexes hold the task (a batch flush may write the destination index
+    # first): resolvable only when the body already reached the destination
+    if in_src and in_dst and not dst_body_exists:
         raise IntegrityError("Task exists in multiple indexes", {"task_id": task_id})
 
     updated_meta = tx.get("updated_meta")
@@ -92,7 +154,6 @@ def _recover_move(root, project_id):
         dst_index[task_id] = updated_meta
         write_index(root, project_id, from_status, src_index)
         write_index(root, project_id, to_status, dst_index)
-        os.remove(tx_path)
         return
 
     if src_body_exists:
@@ -101,7 +162,6 @@ def _recover_move(root, project_id):
         dst_index[task_id] = updated_meta
         write_index(root, project_id, from_status, src_index)
         write_index(root, project_id, to_status, dst_index)
-        os.remove(tx_path)
         return
 
     raise IntegrityError("Cannot recover move", {"task_id": task_id})
@@ -114,9 +174,662 @@ def _recover_if_needed(root, project_id):
             _recover_move(root, project_id)
 
 
+def _fingerprint(path):
+    metrics.count("files_stat")
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+class _ProjectSnapshot:
+    """Status list and fingerprints of a project, read once per locked invocation; `_touched` statuses are re-read."""
+
+    def __init__(self, root, project_id):
+        self.root = root
+        self.project_id = project_id
+        self.statuses = None
+        self.sources = {}
+        self.dirs = {}
+
+    def invalidate(self, status=None):
+        if status is None:
+            self.statuses = None
+            self.sources.clear()
+            self.dirs.clear()
+        else:
+            self.sources.pop(status, None)
+            self.dirs.pop(status, None)
+
+
+_snapshot_local = threading.local()
+
+
+@contextlib.contextmanager
+def _project_snapshot(root, project_id):
+    """Share one `_ProjectSnapshot` (and resolved paths) in this thread; the caller holds the lock."""
+    previous = getattr(_snapshot_local, "snapshot", None)
+    if previous is not None and previous.root == root and previous.project_id == project_id:
+        yield previous
+        return
+    snapshot = _ProjectSnapshot(root, project_id)
+    _snapshot_local.snapshot = snapshot
+    try:
+        with resolved_paths():
+            yield snapshot
+    finally:
+        _snapshot_local.snapshot = previous
+
+
+@contextlib.contextmanager
+def _without_snapshot():
+    # repairs change files behind the snapshot's back; they read everything themselves
+    previous = getattr(_snapshot_local, "snapshot", None)
+    _snapshot_local.snapshot = None
+    try:
+        yield
+    finally:
+        if previous is not None:
+            previous.invalidate()
+        _snapshot_local.snapshot = previous
+
+
+def _snapshot(root, project_id):
+    snapshot = getattr(_snapshot_local, "snapshot", None)
+    if snapshot is not None and snapshot.root == root and snapshot.project_id == project_id:
+        return snapshot
+    return None
+
+
+def _touched(root, project_id, status):
+    """Forget the fingerprints of a status whose files were just written."""
+    snapshot = _snapshot(root, project_id)
+    if snapshot is not None:
+        snapshot.invalidate(status)
+
+
+def _status_fingerprint(root, project_id, status):
+    snapshot = _snapshot(root, project_id)
+    if snapshot is not None and status in snapshot.dirs:
+        directory = snapshot.dirs[status]
+    else:
+        directory = _fingerprint(_status_dir(root, project_id, status))
+        if snapshot is not None:
+            snapshot.dirs[status] = directory
+    return {"dir": directory, "index": _index_source(root, project_id, status)}
+
+
+def _index_source(root, project_id, status):
+    """Fingerprint of the stored index state: index.json, its delta log and any shards."""
+    snapshot = _snapshot(root, project_id)
+    if snapshot is not None and status in snapshot.sources:
+        return snapshot.sources[status]
+    source = [
+        _fingerprint(_index_path(root, project_id, status)),
+        _fingerprint(_delta_path(root, project_id, status)),
+    ]
+    shards = _index_shards(root, project_id, status)
+    for shard in range(shards):
+        source.append(_fingerprint(_shard_path(root, project_id, status, shards, shard)))
+    if snapshot is not None:
+        snapshot.sources[status] = source
+    return source
+
+
+def _read_manifest(root, project_id):
+    try:
+        data = read_json(_manifest_path(root, project_id))
+    except IntegrityError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("statuses"), dict):
+        return None
+    if not isinstance(data.get("generation"), int):
+        return None
+    return data
+
+
+def _record_manifest(root, project_id, bump=True):
+    """Remember the fingerprints of a verified-clean project (caller holds the lock)."""
+    previous = _read_manifest(root, project_id)
+    generation = previous["generation"] if previous else 0
+    if bump:
+        generation += 1
+    statuses = load_project_statuses(root, project_id)
+    manifest = {
+        "generation": generation,
+        "statuses": {st: _status_fingerprint(root, project_id, st) for st in statuses},
+    }
+    write_json_atomic(_manifest_path(root, project_id), manifest, rebuildable=True)
+    return manifest
+
+
+def _drop_manifest(root, project_id):
+    try:
+        os.remove(_manifest_path(root, project_id))
+    except FileNotFoundError:
+        pass
+
+
+def _index_sources(root, project_id, statuses):
+    return {st: _index_source(root, project_id, st) for st in statuses}
+
+
+_cache_local = threading.local()
+
+
+@contextlib.contextmanager
+def using_cache(cache):
+    """Serve parsed indexes and derived files of read-only commands in this thread from `cache` (an `IndexCache`)."""
+    previous = getattr(_cache_local, "cache", None)
+    _cache_local.cache = cache
+    try:
+        yield
+    finally:
+        _cache_local.cache = previous
+
+
+def _active_cache():
+    return getattr(_cache_local, "cache", None)
+
+
+def _cache_get(key, source):
+    cache = _active_cache()
+    if cache is None:
+        return None
+    value = cache.get(key, source)
+    metrics.count("cache_misses" if value is None else "cache_hits")
+    return value
+
+
+def _cache_put(key, source, value, size=None):
+    cache = _active_cache()
+    if cache is not None:
+        cache.put(key, source, value, size)
+
+
+def cache_stats():
+    """`cache-stats`: counters of the cache serving this invocation (`resident=false` outside the daemon)."""
+    from index_cache import IndexCache
+    cache = _active_cache()
+    return {"ok": True, "resident": cache is not None, "cache": (cache or IndexCache()).stats()}
+
+
+def _derived_delta_path(path):
+    return path[:-len(".json")] + ".delta.jsonl"
+
+
+def _append_derived(path, entry):
+    """Log `entry` for the derived file at `path` like an index delta; False if the file must be rewritten instead."""
+    base = _fingerprint(path)
+    if base is None or base[1] < DELTA_MIN_INDEX_BYTES:
+        return False
+    line = json.dumps(entry, ensure_ascii=False, sort_keys=True)
+    delta = _fingerprint(_derived_delta_path(path))
+    if (delta[1] if delta else 0) + len(line) > base[1] * DELTA_COMPACT_RATIO:
+        return False
+    append_line_durable(_derived_delta_path(path), line, rebuildable=True)
+    return True
+
+
+def _apply_derived_delta(path, data, replay):
+    """Replay the log of a derived file onto `data` until an entry does not follow on; False if it is malformed."""
+    for line in read_appended_lines(_derived_delta_path(path)):
+        try:
+            if not replay(data, json.loads(line)):
+                break
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return False
+    return True
+
+
+def _rewrite_derived(path, data):
+    # the log only follows on from the base it was appended to
+    _remove_if_exists(_derived_delta_path(path))
+    write_json_atomic(path, data, rebuildable=True)
+
+
+def _drop_derived(path):
+    _remove_if_exists(_derived_delta_path(path))
+    _remove_if_exists(path)
+
+
+def _locator_add(tasks, task_id, status):
+    current = tasks.get(task_id)
+    if current is None or current == status:
+        tasks[task_id] = status
+    elif isinstance(current, list):
+        if status not in current:
+            current.append(status)
+    else:
+        tasks[task_id] = [current, status]
+
+
+def _locator_remove(tasks, task_id, status):
+    current = tasks.get(task_id)
+    if current == status:
+        del tasks[task_id]
+    elif isinstance(current, list) and status in current:
+        current.remove(status)
+        if len(current) == 1:
+            tasks[task_id] = current[0]
+
+
+def _replay_locator(data, entry):
+    if any(data["sources"].get(st) != source for st, source in entry["from"].items()):
+        return False
+    for task_id, located in entry["tasks"].items():
+        if located is None:
+            data["tasks"].pop(task_id, None)
+        else:
+            data["tasks"][task_id] = located
+    data["sources"].update(entry["sources"])
+    return True
+
+
+def _write_locator(root, project_id, statuses, tasks):
+    _rewrite_derived(_locator_path(root, project_id), {
+        "sources": _index_sources(root, project_id, statuses),
+        "tasks": tasks,
+    })
+
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _drop_locator(root, project_id):
+    _drop_derived(_locator_path(root, project_id))
+
+
+def _load_locator(root, project_id, statuses, read=None):
+    """Map task_id -> status (a list if in several indexes), re-reading only statuses whose index changed."""
+    with metrics.phase("locator"):
+        return _refresh_locator(root, project_id, statuses, read)
+
+
+def _refresh_locator(root, project_id, statuses, read):
+    if read is None:
+        def read(st):
+            return read_index(root, project_id, st)
+    path = _locator_path(root, project_id)
+    sources = _index_sources(root, project_id, statuses)
+    try:
+        data = read_json(path)
+    except IntegrityError:
+        data = None
+    if (
+        not isinstance(data, dict)
+        or not isinstance(data.get("sources"), dict)
+        or not isinstance(data.get("tasks"), dict)
+        or not _apply_derived_delta(path, data, _replay_locator)
+        or sorted(data["sources"].keys()) != statuses
+    ):
+        stale = statuses
+        tasks = {}
+    else:
+        known = data["sources"]
+        tasks = data["tasks"]
+        stale = [st for st in statuses if known.get(st) != sources[st]]
+        if not stale:
+            return tasks
+        for task_id, located in list(tasks.items()):
+            for st in (list(located) if isinstance(located, list) else [located]):
+                if st in stale:
+                    _locator_remove(tasks, task_id, st)
+    for st in stale:
+        for task_id in read(st):
+            _locator_add(tasks, task_id, st)
+    _rewrite_derived(path, {"sources": sources, "tasks": tasks})
+    return tasks
+
+
+POSTING_FIELDS = ("tags", "assignee", "priority")
+# posting lists are sorted since version 2; older files are rebuilt
+POSTINGS_VERSION = 2
+
+
+def _posting_values(meta, field):
+    if not isinstance(meta, dict):
+        return ()
+    value = meta.get(field)
+    if field == "tags":
+        if not isinstance(value, list):
+            return ()
+        return {t for t in value if isinstance(t, str)}
+    return (value,) if isinstance(value, str) else ()
+
+
+def _posting_insert(postings, field, value, task_id):
+    ids = postings[field].setdefault(value, [])
+    pos = bisect.bisect_left(ids, task_id)
+    if pos == len(ids) or ids[pos] != task_id:
+        ids.insert(pos, task_id)
+
+
+def _posting_discard(postings, field, value, task_id):
+    ids = postings[field].get(value)
+    if ids:
+        pos = bisect.bisect_left(ids, task_id)
+        if pos < len(ids) and ids[pos] == task_id:
+            del ids[pos]
+            if not ids:
+                del postings[field][value]
+
+
+def _build_postings(index):
+    postings = {field: {} for field in POSTING_FIELDS}
+    for task_id, meta in index.items():
+        for field in POSTING_FIELDS:
+            for value in _posting_values(meta, field):
+                postings[field].setdefault(value, []).append(task_id)
+    for field in POSTING_FIELDS:
+        for ids in postings[field].values():
+            ids.sort()
+    postings["version"] = POSTINGS_VERSION
+    return postings
+
+
+def _postings_delta(index, changes):
+    """Posting entries `(removed, added)` (field -> value -> task_ids) of the changed tasks."""
+    removed = {field: {} for field in POSTING_FIELDS}
+    added = {field: {} for field in POSTING_FIELDS}
+    for task_id, old_meta in changes.items():
+        for field in POSTING_FIELDS:
+            old = set(_posting_values(old_meta, field))
+            new = set(_posting_values(index.get(task_id), field))
+            for value in sorted(old - new):
+                removed[field].setdefault(value, []).append(task_id)
+            for value in sorted(new - old):
+                added[field].setdefault(value, []).append(task_id)
+    return removed, added
+
+
+def _replay_postings(postings, entry):
+    if entry["from"] != postings["source"]:
+        return False
+    for field in POSTING_FIELDS:
+        for value, ids in entry["del"][field].items():
+            for task_id in ids:
+                _posting_discard(postings, field, value, task_id)
+        for value, ids in entry["add"][field].items():
+            for task_id in ids:
+                _posting_insert(postings, field, value, task_id)
+    postings["source"] = entry["source"]
+    return True
+
+
+def _read_derived(path, source, fields, kind, replay, version=None):
+    """Derived file at `path` with its log replayed, if that brings it to index fingerprint `source`."""
+    try:
+        data = read_json(path)
+    except IntegrityError:
+        return None
+    if not isinstance(data, dict) or data.get("version") != version:
+        return None
+    if not all(isinstance(data.get(field), kind) for field in fields):
+        return None
+    if not _apply_derived_delta(path, data, replay) or data.get("source") != source:
+        return None
+    return data
+
+
+def _read_postings(root, project_id, status, source):
+    path = _postings_path(root, project_id, status)
+    return _read_derived(path, source, POSTING_FIELDS, dict, _replay_postings, POSTINGS_VERSION)
+
+
+def _load_postings(root, project_id, status):
+    """Posting lists (field -> value -> task_ids) of one status as `(postings, index)`; `index` is set after a rebuild."""
+    source = _index_source(root, project_id, status)
+    key = (root, project_id, "postings", status)
+    postings = _cache_get(key, source)
+    if postings is not None:
+        return postings, None
+    postings = _read_postings(root, project_id, status, source)
+    if postings is not None:
+        _cache_put(key, source, postings)
+        return postings, None
+    metrics.count("derived_rebuilds")
+    index = read_index(root, project_id, status)
+    postings = _build_postings(index)
+    postings["source"] = source
+    _rewrite_derived(_postings_path(root, project_id, status), postings)
+    _cache_put(key, source, postings)
+    return postings, index
+
+
+def _update_postings(root, project_id, status, index, changes, source_before, complete=True):
+    """Apply `changes` (task_id -> meta before the write) after the index write (dropped unless `complete`)."""
+    path = _postings_path(root, project_id, status)
+    removed, added = _postings_delta(index, changes)
+    entry = {"from": source_before, "source": _index_source(root, project_id, status), "del": removed, "add": added}
+    if _append_derived(path, entry):
+        return
+    postings = _read_postings(root, project_id, status, source_before)
+    if postings is None:
+        if not complete:
+            _drop_derived(path)
+            return
+        postings = _build_postings(index)
+        postings["source"] = entry["source"]
+    else:
+        _replay_postings(postings, entry)
+    _rewrite_derived(path, postings)
+
+
+SEARCH_SKIP_FIELDS = ("created_at", "updated_at", "due_date")
+
+
+def _search_texts(meta):
+    """String metadata indexed for `search`: every string value and string list item except timestamps."""
+    if not isinstance(meta, dict):
+        return []
+    texts = []
+    for field in sorted(meta):
+        if field in SEARCH_SKIP_FIELDS:
+            continue
+        value = meta[field]
+        if isinstance(value, str):
+            texts.append(value)
+        elif isinstance(value, list):
+            texts.extend(v for v in value if isinstance(v, str))
+    return texts
+
+
+def _search_document(meta, body):
+    import search_index
+    return search_index.document(_search_texts(meta) + [body or ""])
+
+
+SORT_FIELDS = ("created_at", "updated_at", "priority", "due_date")
+ORDER_REBUILD_RATIO = 0.25
+
+
+def _order_path(root, project_id, status, field):
+    return safe_join(root, project_id, f".order.{status}.{field}.json")
+
+
+def _sort_key(meta, field):
+    """Comparable sort key of one field (due_date as epoch microseconds), or None when the value sorts as missing."""
+    if not isinstance(meta, dict):
+        return None
+    value = meta.get(field)
+    if field == "due_date":
+        if not isinstance(value, str):
+            return None
+        import datetime
+        try:
+            epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+            return (parse_due_date(value) - epoch) // datetime.timedelta(microseconds=1)
+        except Exception:
+            return None
+    return value if isinstance(value, str) else None
+
+
+def _build_order(index, field):
+    keys = []
+    missing = []
+    for task_id, meta in index.items():
+        key = _sort_key(meta, field)
+        if key is None:
+            missing.append(task_id)
+        else:
+            keys.append([key, task_id])
+    keys.sort()
+    missing.sort()
+    return {"keys": keys, "missing": missing}
+
+
+def _order_discard(order, task_id, key):
+    if key is None:
+        entries, probe = order["missing"], task_id
+    else:
+        entries, probe = order["keys"], [key, task_id]
+    pos = bisect.bisect_left(entries, probe)
+    if pos < len(entries) and entries[pos] == probe:
+        del entries[pos]
+
+
+def _order_insert(order, task_id, key):
+    if key is None:
+        bisect.insort(order["missing"], task_id)
+    else:
+        bisect.insort(order["keys"], [key, task_id])
+
+
+def _order_delta(index, changes, field):
+    """Order entries `(removed, added)` as `[key, task_id]` of the changed tasks whose key moved."""
+    removed, added = [], []
+    for task_id, old_meta in changes.items():
+        old_key = _sort_key(old_meta, field)
+        if task_id in index:
+            new_key = _sort_key(index[task_id], field)
+            if old_meta is not None and new_key == old_key:
+                continue
+            added.append([new_key, task_id])
+        removed.append([old_key, task_id])
+    return removed, added
+
+
+def _replay_order(order, entry):
+    if entry["from"] != order["source"]:
+        return False
+    for key, task_id in entry["del"]:
+        _order_discard(order, task_id, key)
+    for key, task_id in entry["add"]:
+        _order_insert(order, task_id, key)
+    order["source"] = entry["source"]
+    return True
+
+
+def _load_order(root, project_id, status, field):
+    """Presorted `(key, task_id)` entries of one status and sort field; `(order, index)` like `_load_postings`."""
+    source = _index_source(root, project_id, status)
+    key = (root, project_id, "order", status, field)
+    order = _cache_get(key, source)
+    if order is not None:
+        return order, None
+    path = _order_path(root, project_id, status, field)
+    order = _read_derived(path, source, ("keys", "missing"), list, _replay_order)
+    if order is not None:
+        _cache_put(key, source, order)
+        return order, None
+    metrics.count("derived_rebuilds")
+    index = read_index(root, project_id, status)
+    order = _build_order(index, field)
+    order["source"] = source
+    _rewrite_derived(path, order)
+    _cache_put(key, source, order)
+    return order, index
+
+
+def _update_orders(root, project_id, status, index, changes, source_before, complete=True):
+    """Keep existing order files of a status current; missing ones are built on demand."""
+    source = None
+    for field in SORT_FIELDS:
+        path = _order_path(root, project_id, status, field)
+        if not os.path.exists(path):
+            continue
+        if source is None:
+            source = _index_source(root, project_id, status)
+        order = None
+        # re-sorting beats inserting this many entries one by one (bulk import)
+        if not (complete and len(changes) > len(index) * ORDER_REBUILD_RATIO):
+            removed, added = _order_delta(index, changes, field)
+            entry = {"from": source_before, "source": source, "del": removed, "add": added}
+            if _append_derived(path, entry):
+                continue
+            order = _read_derived(path, source_before, ("keys", "missing"), list, _replay_order)
+        if order is None:
+            if not complete:
+                _drop_derived(path)
+                continue
+            order = _build_order(index, field)
+            order["source"] = source
+        else:
+            _replay_order(order, entry)
+        _rewrite_derived(path, order)
+
+
+def _merge_orders(orders, desc, after=None):
+    """Yield `(key, task_id, status)` across statuses in list order (missing keys last), after position `after`."""
+    def _present(status, keys):
+        if after is None:
+            start, stop = 0, len(keys)
+        elif after[0] is None:
+            return
+        elif desc:
+            start, stop = 0, bisect.bisect_left(keys, list(after))
+        else:
+            start, stop = bisect.bisect_right(keys, list(after)), len(keys)
+        positions = range(stop - 1, start - 1, -1) if desc else range(start, stop)
+        for pos in positions:
+            key, task_id = keys[pos]
+            yield key, task_id, status
+
+    def _missing(status, task_ids):
+        start = 0
+        if after is not None and after[0] is None:
+            start = bisect.bisect_right(task_ids, after[1])
+        for pos in range(start, len(task_ids)):
+            yield task_ids[pos], status
+
+    runs = [_present(st, o["keys"]) for st, o in orders.items()]
+    yield from heapq.merge(*runs, reverse=desc)
+    runs = [_missing(st, o["missing"]) for st, o in orders.items()]
+    for task_id, status in heapq.merge(*runs):
+        yield None, task_id, status
+
+
+def _changed_statuses(root, project_id):
+    """Statuses whose index or directory changed since the last clean check; None if a full check is required."""
+    if os.path.exists(_tx_path(root, project_id)):
+        return None
+    manifest = _read_manifest(root, project_id)
+    if manifest is None:
+        return None
+    statuses = load_project_statuses(root, project_id)
+    known = manifest["statuses"]
+    if sorted(known.keys()) != statuses:
+        return None
+    return [st for st in statuses if known.get(st) != _status_fingerprint(root, project_id, st)]
+
+
 def _ensure_integrity(project_id, locked=False):
-    """Run integrity-check --fix before operations; abort if issues remain."""
-    result = integrity_check(project_id, fix=True, locked=locked)
+    """Run integrity-check --fix on the statuses changed since the last clean check; abort if issues remain."""
+    root = get_root()
+    if _is_sqlite(root, project_id):
+        return
+    with metrics.phase("preflight"):
+        changed = _changed_statuses(root, project_id)
+        if changed == []:
+            return
+        with _without_snapshot():
+            result = integrity_check(project_id, fix=True, locked=locked, only_statuses=changed)
     if result.get("ok"):
         return
 
@@ -132,77 +845,866 @@ def _ensure_integrity(project_id, locked=False):
     )
 
 
+@contextlib.contextmanager
+def _read_locked(root, project_id, exclusive=False):
+    """Shared lock for read-only commands (exclusive if asked or the preflight may repair); yields the SQLite connection or None."""
+    project_dir = _project_dir(root, project_id)
+    if not exclusive:
+        with ProjectLock(project_dir, shared=True), _project_snapshot(root, project_id):
+            if _is_sqlite(root, project_id):
+                with _sqlite_reading(root, project_id) as conn:
+                    yield conn
+                return
+            with metrics.phase("preflight"):
+                unchanged = _changed_statuses(root, project_id) == []
+            if unchanged:
+                yield None
+                return
+    with ProjectLock(project_dir), _project_snapshot(root, project_id):
+        if _is_sqlite(root, project_id):
+            with _sqlite_reading(root, project_id) as conn:
+                yield conn
+            return
+        _ensure_integrity(project_id, locked=True)
+        yield None
+
+
+@contextlib.contextmanager
+def _sqlite_reading(root, project_id):
+    import sqlite_backend
+    conn = sqlite_backend.connect(_db_path(root, project_id))
+    try:
+        conn.execute("BEGIN")
+        yield conn
+    finally:
+        conn.close()
+
+
 def load_project_statuses(root, project_id):
+    snapshot = _snapshot(root, project_id)
+    if snapshot is not None and snapshot.statuses is not None:
+        return list(snapshot.statuses)
     project_dir = _project_dir(root, project_id)
-    if not os.path.isdir(project_dir):
-        raise NotFoundError("Project not found", {"project_id": project_id})
+    # the directory's fingerprint changes whenever a status dir is added or removed
+    source = _fingerprint(project_dir) if _active_cache() is not None else None
+    if source is not None:
+        cached = _cache_get((root, project_id, "statuses"), source)
+        if cached is not None:
+            if snapshot is not None:
+                snapshot.statuses = cached
+            return list(cached)
     # Always discover status dirs (include dirs even if index.json is missing)
     statuses = []
-    for entry in os.listdir(project_dir):
-        path = os.path.join(project_dir, entry)
-        if not os.path.isdir(path):
-            continue
-        try:
-            validate_status(entry)
-        except ValidationError:
-            continue
-        statuses.append(entry)
+    try:
+        entries = os.scandir(project_dir)
+    except (FileNotFoundError, NotADirectoryError):
+        raise NotFoundError("Project not found", {"project_id": project_id})
+    metrics.count("dirs_listed")
+    with entries:
+        for entry in entries:
+            # the entry type comes with the listing, so this needs no stat per entry
+            if not entry.is_dir():
+                continue
+            try:
+                validate_status(entry.name)
+            except ValidationError:
+                continue
+            statuses.append(entry.name)
     statuses = sorted(statuses)
     if not statuses:
         raise IntegrityError("No statuses found", {"project_id": project_id})
     validate_statuses(statuses)
+    if source is not None:
+        _cache_put((root, project_id, "statuses"), source, tuple(statuses), size=sum(len(st) + 64 for st in statuses))
+    if snapshot is not None:
+        snapshot.statuses = tuple(statuses)
     return statuses
 
 
-def read_index(root, project_id, status):
+def _replay_delta(path, index, seq):
+    """Apply delta entries newer than `seq` to `index`; returns the last seq."""
+    base_seq = seq
+    for line in read_appended_lines(path):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            raise IntegrityError("Invalid delta log", {"path": path})
+        if (
+            not isinstance(entry, dict)
+            or not isinstance(entry.get("seq"), int)
+            or not isinstance(entry.get("set", {}), dict)
+            or not isinstance(entry.get("del", []), list)
+        ):
+            raise IntegrityError("Invalid delta log", {"path": path})
+        if entry["seq"] <= base_seq:
+            # already folded into index.json by an interrupted compaction
+            continue
+        for task_id in entry.get("del", []):
+            index.pop(task_id, None)
+        index.update(entry.get("set", {}))
+        seq = max(seq, entry["seq"])
+    return seq
+
+
+def _valid_shards(shards):
+    return isinstance(shards, int) and not isinstance(shards, bool) and MIN_SHARDS <= shards <= MAX_SHARDS
+
+
+def _index_shards(root, project_id, status):
+    """Shard count from the index.json header; 0 for a single-file index."""
     index_path = _index_path(root, project_id, status)
-    data = read_json(index_path)
+    try:
+        # a sharded index.json holds only its header, so large files are never parsed here
+        if os.path.getsize(index_path) > INDEX_HEADER_MAX_BYTES:
+            return 0
+        data = read_json(index_path)
+    except (OSError, IntegrityError):
+        return 0
+    shards = data.get("$shards") if isinstance(data, dict) else None
+    return shards if _valid_shards(shards) else 0
+
+
+def _shard_of(task_id, shards):
+    return zlib.crc32(task_id.encode("utf-8")) % shards
+
+
+def _read_shard(root, project_id, status, shards, shard):
+    metrics.count("shards_read")
+    with metrics.phase("index_read"):
+        data = read_json(_shard_path(root, project_id, status, shards, shard))
     if not isinstance(data, dict):
-        raise IntegrityError("Index must be a JSON object", {"status": status})
+        raise IntegrityError("Index shard must be a JSON object", {"status": status, "shard": shard})
     return data
 
 
-def write_index(root, project_id, status, data):
+def _open_index(root, project_id, status):
+    """Parse index.json; returns `(shards, index, seq)`, with `index` None for a sharded status."""
     index_path = _index_path(root, project_id, status)
-    write_json_atomic(index_path, data)
+    metrics.count("indexes_read")
+    with metrics.phase("index_read"):
+        data = read_json(index_path)
+    if not isinstance(data, dict):
+        raise IntegrityError("Index must be a JSON object", {"status": status})
+    if "$shards" in data:
+        shards = data.pop("$shards")
+        if not _valid_shards(shards):
+            raise IntegrityError("Invalid index header", {"status": status, "field": "$shards"})
+        if any(not key.startswith("$") for key in data):
+            raise IntegrityError("Sharded index.json must only hold headers", {"status": status})
+        return shards, None, 0
+    seq = data.pop("$seq", 0)
+    if not isinstance(seq, int):
+        raise IntegrityError("Invalid index header", {"status": status, "field": "$seq"})
+    with metrics.phase("index_read"):
+        seq = _replay_delta(_delta_path(root, project_id, status), data, seq)
+    return 0, data, seq
+
+
+def _load_index(root, project_id, status):
+    """The full index of a status (all shards, delta log replayed); returns `(index, seq)`."""
+    shards, index, seq = _open_index(root, project_id, status)
+    if shards:
+        index = {}
+        for shard in range(shards):
+            index.update(_read_shard(root, project_id, status, shards, shard))
+    return index, seq
+
+
+def read_index(root, project_id, status, task_ids=None):
+    """Index of a status; with `task_ids` only their shards are read (look them up with `.get()`)."""
+    if task_ids is None:
+        return _load_index(root, project_id, status)[0]
+    shards, index, _ = _open_index(root, project_id, status)
+    if not shards:
+        return index
+    index = {}
+    for shard in sorted({_shard_of(task_id, shards) for task_id in task_ids}):
+        index.update(_read_shard(root, project_id, status, shards, shard))
+    return index
+
+
+def _write_shards(root, project_id, status, shards, index, only=None):
+    """Write the shard files of `index` (or just the shard numbers in `only`) whose content changed."""
+    parts = {shard: {} for shard in (range(shards) if only is None else only)}
+    for task_id, meta in index.items():
+        part = parts.get(_shard_of(task_id, shards))
+        if part is not None:
+            part[task_id] = meta
+    for shard, part in sorted(parts.items()):
+        path = _shard_path(root, project_id, status, shards, shard)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if f.read() == json.dumps(part, ensure_ascii=False, sort_keys=True):
+                    continue
+        except (OSError, UnicodeDecodeError):
+            pass
+        write_json_atomic(path, part)
+    _touched(root, project_id, status)
 
 
-def find_task(root, project_id, task_id):
-    statuses = load_project_statuses(root, project_id)
-    found = []
-    for status in statuses:
+def write_index(root, project_id, status, data, seq=None):
+    """Write the full index and fold away its delta log; a sharded status rewrites only changed shards."""
+    index_path = _index_path(root, project_id, status)
+    delta_path = _delta_path(root, project_id, status)
+    shards = _index_shards(root, project_id, status)
+    if shards:
+        _write_shards(root, project_id, status, shards, data)
+    else:
+        if seq is None:
+            seq = _replay_delta(delta_path, {}, 0)
+        if seq:
+            # entries up to `seq` are contained in the new index.json, so a delta
+            # log left behind by a crash before its removal is skipped on replay
+            data = dict(data)
+            data["$seq"] = seq
+        write_json_atomic(index_path, data)
+    if os.path.exists(delta_path):
+        remove_durable(delta_path)
+    _touched(root, project_id, status)
+
+
+def _cached_index(root, project_id, status, task_ids=None):
+    """`read_index` for read-only callers: the full index from the active cache, if any."""
+    if _active_cache() is None:
+        return read_index(root, project_id, status, task_ids)
+    key = (root, project_id, "index", status)
+    source = _index_source(root, project_id, status)
+    index = _cache_get(key, source)
+    if index is None:
         index = read_index(root, project_id, status)
+        _cache_put(key, source, index)
+    return index
+
+
+def _cached_locator(root, project_id, statuses):
+    if _active_cache() is None:
+        return _load_locator(root, project_id, statuses)
+    key = (root, project_id, "locator")
+    sources = _index_sources(root, project_id, statuses)
+    tasks = _cache_get(key, sources)
+    if tasks is None:
+        tasks = _load_locator(root, project_id, statuses)
+        _cache_put(key, sources, tasks)
+    return tasks
+
+
+def _index_reader(root, project_id):
+    """`get(status, task_id)` reading each index, or each needed shard of it, once."""
+    opened = {}
+    if _active_cache() is not None:
+        def get_cached(status, task_id):
+            if status not in opened:
+                opened[status] = _cached_index(root, project_id, status)
+            return opened[status].get(task_id)
+
+        return get_cached
+
+    def get(status, task_id):
+        if status not in opened:
+            shards, index, _ = _open_index(root, project_id, status)
+            opened[status] = (shards, index if index is not None else {}, set())
+        shards, index, loaded = opened[status]
+        if shards:
+            shard = _shard_of(task_id, shards)
+            if shard not in loaded:
+                index.update(_read_shard(root, project_id, status, shards, shard))
+                loaded.add(shard)
+        return index.get(task_id)
+
+    return get
+
+
+def _append_index_delta(root, project_id, status, seq, index, changed_ids):
+    entry = {"seq": seq, "set": {}, "del": []}
+    for task_id in changed_ids:
         if task_id in index:
-            found.append((status, index[task_id]))
-    if not found:
+            entry["set"][task_id] = index[task_id]
+        else:
+            entry["del"].append(task_id)
+    append_line_durable(_delta_path(root, project_id, status), json.dumps(entry, ensure_ascii=False, sort_keys=True))
+    _touched(root, project_id, status)
+
+
+def find_task(root, project_id, task_id):
+    statuses = load_project_statuses(root, project_id)
+    located = _cached_locator(root, project_id, statuses).get(task_id)
+    if located is None:
         raise NotFoundError("Task not found", {"project_id": project_id, "task_id": task_id})
-    if len(found) > 1:
+    if isinstance(located, list):
         raise IntegrityError("Task exists in multiple statuses", {"project_id": project_id, "task_id": task_id})
-    return found[0]
+    index = _cached_index(root, project_id, located, [task_id])
+    if task_id not in index:
+        raise IntegrityError("Task missing from index", {"task_id": task_id, "status": located})
+    return located, index[task_id]
+
+
+def _sqlite_find(db, project_id, task_id):
+    import sqlite_backend
+    row = sqlite_backend.get(db, task_id)
+    if row is None:
+        raise NotFoundError("Task not found", {"project_id": project_id, "task_id": task_id})
+    return row[0], _load_meta(task_id, row[1])
 
 
 def task_exists_anywhere(root, project_id, task_id):
     statuses = load_project_statuses(root, project_id)
-    for status in statuses:
-        index = read_index(root, project_id, status)
-        if task_id in index:
+    return task_id in _load_locator(root, project_id, statuses)
+
+
+DELTA_MIN_INDEX_BYTES = 256 * 1024
+DELTA_COMPACT_RATIO = 0.25
+
+
+class _Workspace:
+    """Indexes of one locked project, read on demand and written, with the deferred body moves, once by flush()."""
+
+    def __init__(self, root, project_id):
+        self.root = root
+        self.project_id = project_id
+        self.statuses = load_project_statuses(root, project_id)
+        self._indexes = {}
+        self._dirty = set()
+        self._locations = None
+        self._moves = {}
+        self._sources = {}
+        self._changes = {}
+        self._seqs = {}
+        self._shards = {}
+        self._loaded = {}
+        self._bodies = {}
+
+    def _open(self, status):
+        if status not in self._indexes:
+            self._sources[status] = _index_source(self.root, self.project_id, status)
+            shards, index, seq = _open_index(self.root, self.project_id, status)
+            self._shards[status] = shards
+            self._indexes[status] = index if index is not None else {}
+            self._seqs[status] = seq
+            # shard numbers read so far; None once the whole index is in memory
+            self._loaded[status] = set() if shards else None
+        return self._indexes[status]
+
+    def index(self, status):
+        """The full index of a status."""
+        index = self._open(status)
+        loaded = self._loaded[status]
+        if loaded is not None:
+            shards = self._shards[status]
+            for shard in range(shards):
+                if shard not in loaded:
+                    index.update(_read_shard(self.root, self.project_id, status, shards, shard))
+            self._loaded[status] = None
+        return index
+
+    def _index_for(self, status, task_id):
+        """The in-memory index of a status, holding at least `task_id`'s shard."""
+        index = self._open(status)
+        loaded = self._loaded[status]
+        if loaded is not None:
+            shards = self._shards[status]
+            shard = _shard_of(task_id, shards)
+            if shard not in loaded:
+                index.update(_read_shard(self.root, self.project_id, status, shards, shard))
+                loaded.add(shard)
+        return index
+
+    def _write(self, status, changed_ids):
+        """Write a changed index; True if it was a delta append, which syncs no directory."""
+        shards = self._shards[status]
+        if shards:
+            only = {_shard_of(task_id, shards) for task_id in changed_ids}
+            _write_shards(self.root, self.project_id, status, shards, self._indexes[status], only)
+            return False
+        # large indexes take an appended delta until the log outgrows its share
+        # of index.json; everything else (and compaction) rewrites the index
+        index_fp, delta_fp = self._sources[status][:2]
+        base_size = index_fp[1] if index_fp else 0
+        delta_size = delta_fp[1] if delta_fp else 0
+        if (changed_ids and base_size >= DELTA_MIN_INDEX_BYTES and delta_size < base_size * DELTA_COMPACT_RATIO
+                and len(changed_ids) <= len(self._indexes[status]) * DELTA_COMPACT_RATIO):
+            self._seqs[status] += 1
+            _append_index_delta(self.root, self.project_id, status, self._seqs[status], self._indexes[status], changed_ids)
             return True
-    return False
+        write_index(self.root, self.project_id, status, self._indexes[status], seq=self._seqs[status])
+        return False
+
+    def _remember(self, status, task_id):
+        changes = self._changes.setdefault(status, {})
+        if task_id not in changes:
+            changes[task_id] = self._index_for(status, task_id).get(task_id)
+
+    def _locate(self):
+        if self._locations is None:
+            self._locations = _load_locator(self.root, self.project_id, self.statuses, read=self.index)
+        return self._locations
+
+    def exists(self, task_id):
+        return task_id in self._locate()
+
+    def find(self, task_id):
+        status = self._locate().get(task_id)
+        if status is None:
+            raise NotFoundError("Task not found", {"project_id": self.project_id, "task_id": task_id})
+        if isinstance(status, list):
+            raise IntegrityError("Task exists in multiple statuses", {"project_id": self.project_id, "task_id": task_id})
+        index = self._index_for(status, task_id)
+        if task_id not in index:
+            raise IntegrityError("Task missing from index", {"task_id": task_id, "status": status})
+        return status, index[task_id]
+
+    def body_path(self, status, task_id):
+        # a task moved in this unit of work keeps its body file until flush()
+        move = self._moves.get(task_id)
+        if move is not None and move["to"] == status:
+            status = move["from"]
+        return _body_path(self.root, self.project_id, status, task_id)
+
+    def has_body(self, status, task_id):
+        return os.path.exists(self.body_path(status, task_id))
+
+    def write_body(self, status, task_id, text):
+        write_text_atomic(self.body_path(status, task_id), text)
+        _touched(self.root, self.project_id, status)
+        self._bodies[task_id] = text
+
+    def discard_body(self, status, task_id):
+        """Remove the body written for a task whose add was not committed."""
+        try:
+            _remove_if_exists(self.body_path(status, task_id))
+        except OSError:
+            pass
+
+    def close(self):
+        pass
+
+    def put(self, status, task_id, meta):
+        self._remember(status, task_id)
+        self._index_for(status, task_id)[task_id] = meta
+        self._dirty.add(status)
+        _locator_add(self._locate(), task_id, status)
+
+    def delete(self, status, task_id):
+        self._remember(status, task_id)
+        self._index_for(status, task_id).pop(task_id, None)
+        self._dirty.add(status)
+        _locator_remove(self._locate(), task_id, status)
+
+    def move(self, task_id, from_status, to_status, meta):
+        self.delete(from_status, task_id)
+        self.put(to_status, task_id, meta)
+        pending = self._moves.get(task_id)
+        origin = pending["from"] if pending else from_status
+        if origin == to_status:
+            self._moves.pop(task_id, None)
+        else:
+            self._moves[task_id] = {"task_id": task_id, "from": origin, "to": to_status}
+
+    def _write_locations(self, sources_before, written):
+        changed = sorted(set().union(*(self._changes.get(st, {}) for st in written)))
+        entry = {
+            "from": {st: sources_before[st] for st in written},
+            "sources": _index_sources(self.root, self.project_id, written),
+            "tasks": {task_id: self._locations.get(task_id) for task_id in changed},
+        }
+        if not _append_derived(_locator_path(self.root, self.project_id), entry):
+            _write_locator(self.root, self.project_id, self.statuses, self._locations)
+
+    def flush(self):
+        """Apply pending body moves and write every changed index once; returns the written statuses."""
+        sources_before = dict(self._sources)
+        moves = []
+        for move in self._moves.values():
+            move = dict(move)
+            move["updated_meta"] = self._index_for(move["to"], move["task_id"])[move["task_id"]]
+            moves.append(move)
+        sources = {m["from"] for m in moves}
+        written = sorted(self._dirty, key=lambda st: (st not in sources, st))
+
+        tx_path = _tx_path(self.root, self.project_id)
+        # the journal is synced before any body moves, whatever the durability mode
+        if len(moves) == 1:
+            write_json_atomic(tx_path, dict(moves[0], op="move"), critical=True)
+        elif moves:
+            write_json_atomic(tx_path, {"op": "move_batch", "moves": moves}, critical=True)
+
+        try:
+            for move in moves:
+                os.replace(
+                    _body_path(self.root, self.project_id, move["from"], move["task_id"]),
+                    _body_path(self.root, self.project_id, move["to"], move["task_id"]),
+                )
+                _touched(self.root, self.project_id, move["from"])
+                _touched(self.root, self.project_id, move["to"])
+            appended = set()
+            for status in written:
+                changes = self._changes.get(status, {})
+                if self._write(status, changes):
+                    appended.add(status)
+                index = self._indexes[status]
+                complete = self._loaded[status] is None
+                _update_postings(self.root, self.project_id, status, index, changes, self._sources.get(status), complete)
+                _update_orders(self.root, self.project_id, status, index, changes, self._sources.get(status), complete)
+            if written and self._locations is not None:
+                self._write_locations(sources_before, written)
+            # a rewritten index syncs its directory; an appended one does not, so the renames are synced here
+            for status in sorted(appended & ({m["from"] for m in moves} | {m["to"] for m in moves})):
+                sync_dir(_status_dir(self.root, self.project_id, status))
+        except Exception as e:
+            if not moves:
+                raise
+            # the journal stays in place; the next preflight rolls the moves forward
+            raise IntegrityError("Atomic move failed", {"error": str(e)})
+        if moves:
+            # everything the journal protects must be durable before it goes away
+            sync_barrier()
+            try:
+                os.remove(tx_path)
+            except OSError:
+                pass
+
+        for status in written:
+            self._sources[status] = _index_source(self.root, self.project_id, status)
+        if written:
+            self._update_search(written, sources_before)
+        self._dirty.clear()
+        self._moves.clear()
+        self._changes.clear()
+        self._bodies.clear()
+        if written:
+            _record_manifest(self.root, self.project_id)
+        return written
+
+    def _update_search(self, written, sources_before):
+        """Re-index the tasks whose body or indexed metadata changed (once a search index exists)."""
+        import search_index
+        if not search_index.exists(self.root, self.project_id):
+            return
+        meta = search_index.read_meta(self.root, self.project_id)
+        if meta is None:
+            # unusable already: the next search rebuilds it
+            return
+        before = {}
+        after = {}
+        for status, changes in self._changes.items():
+            for task_id, old_meta in changes.items():
+                if old_meta is not None:
+                    before.setdefault(task_id, old_meta)
+                new_meta = self._indexes[status].get(task_id)
+                if new_meta is not None:
+                    after[task_id] = (status, new_meta)
+        docs = {}
+        for task_id in sorted(set(before) | set(after)):
+            if task_id not in after:
+                docs[task_id] = None
+                continue
+            status, new_meta = after[task_id]
+            body = self._bodies.get(task_id)
+            if body is None:
+                if _search_texts(before.get(task_id)) == _search_texts(new_meta):
+                    continue
+                try:
+                    body = _read_body_file(self.root, self.project_id, status, task_id)
+                except IntegrityError:
+                    body = ""
+            docs[task_id] = _search_document(new_meta, body)
+        search_index.update(self.root, self.project_id, meta, docs, {st: sources_before[st] for st in written},
+                            {st: self._sources[st] for st in written})
+
+
+def _sqlite_columns(meta):
+    """Indexed column values and tags of a task: the keys the filesystem layout keeps in its order and postings files."""
+    columns = {field: _sort_key(meta, field) for field in SORT_FIELDS}
+    assignee = _posting_values(meta, "assignee")
+    columns["assignee"] = assignee[0] if assignee else None
+    return columns, sorted(_posting_values(meta, "tags"))
+
+
+def _load_meta(task_id, meta_json):
+    try:
+        return json.loads(meta_json)
+    except ValueError:
+        raise IntegrityError("Invalid task metadata in database", {"task_id": task_id})
+
+
+class _SqliteWorkspace:
+    """A SQLite project opened for writing, with the `_Workspace` interface; flush() commits one transaction."""
+
+    def __init__(self, root, project_id):
+        import sqlite_backend
+        self._db = sqlite_backend
+        self.root = root
+        self.project_id = project_id
+        self.conn = sqlite_backend.connect(_db_path(root, project_id))
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.statuses = sqlite_backend.statuses(self.conn)
+        self._dirty = set()
+        self._bodies = {}
+        self._search = sqlite_backend.has_search(self.conn)
+        self._reindex = set()
+
+    def exists(self, task_id):
+        return self._db.get(self.conn, task_id) is not None
+
+    def find(self, task_id):
+        return _sqlite_find(self.conn, self.project_id, task_id)
+
+    def has_body(self, status, task_id):
+        row = self._db.get(self.conn, task_id)
+        return row is not None and row[0] == status
+
+    def write_body(self, status, task_id, text):
+        if self._search:
+            self._reindex.add(task_id)
+        if self._db.set_body(self.conn, task_id, text):
+            self._dirty.add(status)
+        else:
+            self._bodies[task_id] = text
+
+    def discard_body(self, status, task_id):
+        self._bodies.pop(task_id, None)
+
+    def close(self):
+        # anything not committed by flush() is rolled back
+        self.conn.close()
+
+    def put(self, status, task_id, meta):
+        if self._search and task_id not in self._reindex:
+            row = self._db.get(self.conn, task_id)
+            if row is None or _search_texts(_load_meta(task_id, row[1])) != _search_texts(meta):
+                self._reindex.add(task_id)
+        columns, tags = _sqlite_columns(meta)
+        self._db.put(self.conn, task_id, status, meta, columns, tags, self._bodies.pop(task_id, None))
+        self._dirty.add(status)
+
+    def move(self, task_id, from_status, to_status, meta):
+        self.put(to_status, task_id, meta)
+        self._dirty.add(from_status)
+
+    def flush(self):
+        written = sorted(self._dirty)
+        for task_id in sorted(self._reindex):
+            row = self._db.get(self.conn, task_id)
+            if row is None:
+                self._db.put_search_doc(self.conn, task_id, 0, None)
+            else:
+                length, tf = _search_document(_load_meta(task_id, row[1]), self._db.read_body(self.conn, task_id))
+                self._db.put_search_doc(self.conn, task_id, length, tf)
+        self._reindex.clear()
+        if written:
+            self._db.bump_generation(self.conn)
+        self.conn.execute("COMMIT")
+        self._dirty.clear()
+        return written
+
+
+@contextlib.contextmanager
+def _locked_workspace(root, project_id):
+    """Exclusive project lock, preflight and a workspace for the project's backend."""
+    with ProjectLock(_project_dir(root, project_id)), _project_snapshot(root, project_id):
+        _ensure_integrity(project_id, locked=True)
+        ws = _SqliteWorkspace(root, project_id) if _is_sqlite(root, project_id) else _Workspace(root, project_id)
+        try:
+            yield ws
+        finally:
+            ws.close()
+
+
+def _parse_tags_csv(tags):
+    if tags is None:
+        return None
+    tags_list = [t.strip() for t in tags.split(",") if t.strip()]
+    validate_tags(tags_list)
+    return tags_list
+
+
+def _validate_add_fields(assignee, priority, due_date):
+    if assignee is not None and not isinstance(assignee, str):
+        raise ValidationError("Assignee must be a string")
+    validate_priority(priority)
+    validate_due_date(due_date)
+
+
+def _parse_patch(patch):
+    if not isinstance(patch, dict):
+        raise ValidationError("Patch must be a JSON object")
+    if "set" in patch:
+        set_obj = patch.get("set")
+        if not isinstance(set_obj, dict):
+            raise ValidationError("Invalid patch format", {"field": "set"})
+    else:
+        set_obj = {}
+    if "unset" in patch:
+        unset_list = patch.get("unset")
+        if not isinstance(unset_list, list):
+            raise ValidationError("Invalid patch format", {"field": "unset"})
+    else:
+        unset_list = []
+
+    forbidden = {"task_id", "created_at", "updated_at", "status", "title"}
+    for k in set_obj.keys():
+        if k in forbidden:
+            raise ValidationError("Forbidden field in set", {"field": k})
+    for k in unset_list:
+        if not isinstance(k, str) or not k:
+            raise ValidationError("Invalid patch format", {"field": "unset"})
+        if k in forbidden:
+            raise ValidationError("Forbidden field in unset", {"field": k})
+
+    if "tags" in set_obj:
+        if set_obj.get("tags") is None:
+            raise ValidationError("Tags must be a list")
+        validate_tags(set_obj.get("tags"))
+    if "assignee" in set_obj:
+        if not isinstance(set_obj.get("assignee"), str):
+            raise ValidationError("Assignee must be a string")
+    if "priority" in set_obj:
+        if set_obj.get("priority") is None:
+            raise ValidationError("Invalid priority", {"priority": None})
+        validate_priority(set_obj.get("priority"))
+    if "due_date" in set_obj:
+        if set_obj.get("due_date") is None or not isinstance(set_obj.get("due_date"), str):
+            raise ValidationError("Invalid ISO 8601 date/datetime", {"due_date": set_obj.get("due_date")})
+        validate_due_date(set_obj.get("due_date"))
+    return set_obj, unset_list
+
+
+def _add_target(ws, task_id, status):
+    """The status a new task goes to (None: the first one); raises if the task cannot be added."""
+    if status is None:
+        status = ws.statuses[0]
+    validate_status(status)
+    if status not in ws.statuses:
+        raise ValidationError("Invalid status", {"status": status})
+    if ws.exists(task_id):
+        raise ConflictError("Task ID already exists", {"task_id": task_id})
+
+    if ws.has_body(status, task_id):
+        raise IntegrityError("Body file exists without index", {"task_id": task_id, "status": status})
+    return status
+
 
+def _op_add(ws, task_id, status, body, tags_list, assignee, priority, due_date):
+    status = _add_target(ws, task_id, status)
 
-def init_project(project_id, statuses):
+    now = now_utc_iso()
+    meta = {
+        "task_id": task_id,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if tags_list is not None:
+        meta["tags"] = tags_list
+    if assignee is not None:
+        meta["assignee"] = assignee
+    if priority is not None:
+        meta["priority"] = priority
+    if due_date is not None:
+        meta["due_date"] = due_date
+
+    ws.write_body(status, task_id, body or "")
+    ws.put(status, task_id, meta)
+    return {
+        "ok": True,
+        "project_id": ws.project_id,
+        "task_id": task_id,
+        "status": status,
+    }
+
+
+def _op_move(ws, task_id, new_status):
+    if new_status not in ws.statuses:
+        raise ValidationError("Invalid status", {"status": new_status})
+    current_status, meta = ws.find(task_id)
+    if current_status == new_status:
+        raise ValidationError("Task already in target status", {"status": new_status})
+    if not ws.has_body(current_status, task_id):
+        raise IntegrityError("Body file missing", {"task_id": task_id})
+
+    updated = _meta_for_storage(meta)
+    updated["updated_at"] = now_utc_iso()
+    ws.move(task_id, current_status, new_status, updated)
+    return {
+        "ok": True,
+        "project_id": ws.project_id,
+        "task_id": task_id,
+        "from": current_status,
+        "to": new_status,
+        "updated_at": updated["updated_at"],
+    }
+
+
+def _op_meta_update(ws, task_id, set_obj, unset_list):
+    status, meta = ws.find(task_id)
+    updated = _meta_for_storage(meta)
+    for k, v in set_obj.items():
+        updated[k] = v
+    for k in unset_list:
+        if k in updated:
+            updated.pop(k, None)
+
+    updated["updated_at"] = now_utc_iso()
+    ws.put(status, task_id, updated)
+    return {
+        "ok": True,
+        "project_id": ws.project_id,
+        "task_id": task_id,
+        "updated_at": updated["updated_at"],
+        "changed": {"set": sorted(set_obj.keys()), "unset": sorted(unset_list)},
+    }
+
+
+def _op_set_body(ws, task_id, text):
+    status, meta = ws.find(task_id)
+    ws.write_body(status, task_id, text or "")
+    meta_updated = _meta_for_storage(meta)
+    meta_updated["updated_at"] = now_utc_iso()
+    ws.put(status, task_id, meta_updated)
+    return {
+        "ok": True,
+        "project_id": ws.project_id,
+        "task_id": task_id,
+        "updated_at": meta_updated["updated_at"],
+    }
+
+
+def _commit(ws):
+    with metrics.phase("flush"):
+        written = ws.flush()
+    metrics.count("indexes_written", len(written))
+    return written
+
+
+def init_project(project_id, statuses, backend="fs"):
     validate_id(project_id, "project_id")
     validate_statuses(statuses)
+    _validate_backend(backend)
     root = get_root()
     project_dir = _project_dir(root, project_id)
     if os.path.exists(project_dir):
         raise ConflictError("Project already exists", {"project_id": project_id})
     os.makedirs(project_dir, exist_ok=False)
+    if backend == "sqlite":
+        import sqlite_backend
+        conn = sqlite_backend.create(_db_path(root, project_id), statuses)
+        try:
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return {"ok": True, "project_id": project_id, "statuses": statuses, "backend": backend}
     for status in statuses:
         status_dir = _status_dir(root, project_id, status)
         os.makedirs(status_dir, exist_ok=True)
         write_json_atomic(_index_path(root, project_id, status), {})
-    return {"ok": True, "project_id": project_id, "statuses": statuses}
+    _write_locator(root, project_id, sorted(statuses), {})
+    _record_manifest(root, project_id)
+    return {"ok": True, "project_id": project_id, "statuses": statuses, "backend": backend}
+
+
+def _validate_backend(backend):
+    if backend not in BACKENDS:
+        raise ValidationError("Invalid backend", {"backend": backend, "allowed": list(BACKENDS)})
 
 
 def add_task(project_id, task_id, status=None, body=None, tags=None, assignee=None, priority=None, due_date=None):
@@ -210,154 +1712,283 @@ def add_task(project_id, task_id, status=None, body=None, tags=None, assignee=No
     validate_id(task_id, "task_id")
     root = get_root()
 
-    tags_list = None
-    if tags is not None:
-        tags_list = [t.strip() for t in tags.split(",") if t.strip()]
-        validate_tags(tags_list)
-
-    if assignee is not None and not isinstance(assignee, str):
-        raise ValidationError("Assignee must be a string")
-
-    validate_priority(priority)
-    validate_due_date(due_date)
-
-    with ProjectLock(_project_dir(root, project_id)):
-        _ensure_integrity(project_id, locked=True)
-
-        statuses = load_project_statuses(root, project_id)
-        if status is None:
-            status = statuses[0]
-        validate_status(status)
-        if status not in statuses:
-            raise ValidationError("Invalid status", {"status": status})
-
-        indexes = {}
-        all_ids = set()
-        for st in statuses:
-            idx = read_index(root, project_id, st)
-            indexes[st] = idx
-            all_ids.update(idx.keys())
-
-        if task_id in all_ids:
-            raise ConflictError("Task ID already exists", {"task_id": task_id})
-
-        index = indexes[status]
-        if task_id in index:
-            raise ConflictError("Task ID already exists", {"task_id": task_id})
-
-        body_path = _body_path(root, project_id, status, task_id)
-        if os.path.exists(body_path):
-            raise IntegrityError("Body file exists without index", {"task_id": task_id, "status": status})
-
-        now = now_utc_iso()
-        meta = {
-            "task_id": task_id,
-            "created_at": now,
-            "updated_at": now,
-        }
-        if tags_list is not None:
-            meta["tags"] = tags_list
-        if assignee is not None:
-            meta["assignee"] = assignee
-        if priority is not None:
-            meta["priority"] = priority
-        if due_date is not None:
-            meta["due_date"] = due_date
+    tags_list = _parse_tags_csv(tags)
+    _validate_add_fields(assignee, priority, due_date)
 
+    with _locked_workspace(root, project_id) as ws:
+        result = _op_add(ws, task_id, status, body, tags_list, assignee, priority, due_date)
         try:
-            write_text_atomic(body_path, body or "")
-            index_new = dict(index)
-            index_new[task_id] = meta
-            write_index(root, project_id, status, index_new)
+            _commit(ws)
         except Exception:
-            try:
-                if os.path.exists(body_path):
-                    os.remove(body_path)
-            except Exception:
-                pass
+            ws.discard_body(result["status"], task_id)
             raise
 
+    return result
+
+def list_tasks(project_id, status=None, tag=None, assignee=None, priority=None, filter_mode="and", fields=None, limit=100, offset=0, sort="updated_at", desc=True, cursor=None):
+    validate_id(project_id, "project_id")
+    root = get_root()
+    with _read_locked(root, project_id) as db:
+        with metrics.phase("query"):
+            plan, total_count, rows = _open_list(
+                root, db, project_id, status, tag, assignee, priority, filter_mode, fields, limit, offset, sort, desc, cursor,
+                max_limit=1000,
+            )
+            # one row more than requested tells whether a next page exists
+            rows = list(itertools.islice(rows, limit + 1))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        key, task_id, _ = rows[-1]
+        next_cursor = _encode_cursor(plan["query"], plan["generation"], key, task_id)
+
+    out_items = [_project_item(m, plan["fields"]) for _, _, m in rows]
+
     return {
         "ok": True,
         "project_id": project_id,
-        "task_id": task_id,
-        "status": status,
+        "count": len(out_items),
+        "count_total": total_count,
+        "items": out_items,
+        "next_cursor": next_cursor,
     }
 
-def list_tasks(project_id, status=None, tag=None, assignee=None, priority=None, filter_mode="and", fields=None, limit=100, offset=0, sort="updated_at", desc=True):
+
+def stream_tasks(project_id, status=None, tag=None, assignee=None, priority=None, filter_mode="and", fields=None, limit=None, offset=0, sort="updated_at", desc=True, cursor=None):
+    """Streaming `list_tasks`: yields the items, then a summary; holds the lock until exhausted or closed."""
     validate_id(project_id, "project_id")
     root = get_root()
-    with ProjectLock(_project_dir(root, project_id)):
-        _ensure_integrity(project_id, locked=True)
-        statuses = load_project_statuses(root, project_id)
-        if status:
-            validate_status(status)
-            if status not in statuses:
-                raise NotFoundError("Status not found", {"status": status})
-            statuses = [status]
-
-        if filter_mode not in {"and", "or"}:
-            raise ValidationError("Invalid filter mode", {"filter_mode": filter_mode})
+    stack = contextlib.ExitStack()
+    try:
+        db = stack.enter_context(_read_locked(root, project_id))
+        plan, total_count, rows = _open_list(
+            root, db, project_id, status, tag, assignee, priority, filter_mode, fields, limit, offset, sort, desc, cursor,
+            max_limit=None,
+        )
+    except BaseException:
+        stack.close()
+        raise
+    return _stream_rows(stack, project_id, plan, total_count, rows)
+
+
+def _stream_rows(stack, project_id, plan, total_count, rows):
+    count = 0
+    next_cursor = None
+    with stack:
+        last = None
+        for row in rows:
+            if plan["limit"] is not None and count == plan["limit"]:
+                next_cursor = _encode_cursor(plan["query"], plan["generation"], last[0], last[1])
+                break
+            yield _project_item(row[2], plan["fields"])
+            count += 1
+            last = row
+    yield {"ok": True, "project_id": project_id, "count": count, "count_total": total_count, "next_cursor": next_cursor}
+
+
+def _project_item(meta, fields_set):
+    item = {}
+    for f in fields_set:
+        value = meta.get(f)
+        # lists are copied: `meta` may be a shared cached index entry
+        item[f] = list(value) if isinstance(value, list) else value
+    return item
+
+
+ALL_PROJECTS_WORKERS = 8
+_LAST_TASK_ID = "\U0010ffff"  # sorts after every task id
+
+
+def list_all_projects(status=None, tag=None, assignee=None, priority=None, filter_mode="and", fields=None, limit=100, offset=0, sort="updated_at", desc=True, cursor=None):
+    """`list --all-projects`: projects scanned on a thread pool, merged in list order with ties by project_id."""
+    if limit is None or limit <= 0:
+        raise ValidationError("Limit must be > 0")
+    if limit > 1000:
+        raise ValidationError("Limit must be <= 1000")
+    if offset is None or offset < 0:
+        raise ValidationError("Offset must be >= 0")
+    if cursor is not None and offset:
+        raise ValidationError("Use either cursor or offset")
+    if sort not in SORT_FIELDS:
+        raise ValidationError("Invalid sort field", {"sort": sort})
+    query = _cursor_query(status, tag, assignee, priority, filter_mode, sort, desc, all_projects=True)
+    token = None
+    if cursor is not None:
+        token = _read_cursor(cursor, query, sort)
+        if not isinstance(token.get("p"), str):
+            raise ValidationError("Invalid cursor")
+    root = get_root()
+    projects = _discover_projects(root)
+    need = offset + limit + 1
+    # every project may supply the whole page, including the rows the offset skips
+    list_args = dict(
+        status=status, tag=tag, assignee=assignee, priority=priority, filter_mode=filter_mode, fields=fields,
+        limit=need - 1, offset=0, sort=sort, desc=desc, cursor=None, max_limit=None,
+    )
 
-        if limit is None or limit <= 0:
-            raise ValidationError("Limit must be > 0")
-        if limit > 1000:
-            raise ValidationError("Limit must be <= 1000")
-        if offset is None or offset < 0:
-            raise ValidationError("Offset must be >= 0")
+    def _scan(project_id):
+        after = None if token is None else _project_after((token.get("k"), token["t"], token["p"]), project_id, desc)
+        return _scan_project(root, project_id, list_args, after, need)
 
-        allowed_sort = {"created_at", "updated_at", "priority", "due_date"}
-        if sort not in allowed_sort:
-            raise ValidationError("Invalid sort field", {"sort": sort})
+    with metrics.phase("scan"):
+        scans = _map_threads(_scan, projects, ALL_PROJECTS_WORKERS)
 
-        items = []
-        for st in statuses:
-            index = read_index(root, project_id, st)
-            for _, meta in index.items():
-                if not isinstance(meta, dict):
-                    continue
-                meta_out = dict(meta)
-                meta_out["status"] = st
-                checks = []
-                if tag:
-                    tags_val = meta_out.get("tags", [])
-                    checks.append(isinstance(tags_val, list) and tag in tags_val)
-                if assignee:
-                    checks.append(meta_out.get("assignee") == assignee)
-                if priority:
-                    checks.append(meta_out.get("priority") == priority)
-
-                if checks:
-                    matches = all(checks) if filter_mode == "and" else any(checks)
-                    if not matches:
-                        continue
+    counts = {}
+    generations = {}
+    rows = []
+    fields_set = None
+    for project_id, scan in zip(projects, scans):
+        if scan is None:
+            continue
+        plan, total_count, project_rows = scan
+        fields_set = plan["fields"]
+        counts[project_id] = total_count
+        generations[project_id] = plan["generation"]
+        rows.extend((key, task_id, project_id, meta) for key, task_id, meta in project_rows)
+    metrics.count("projects_scanned", len(counts))
+    if status and not counts and projects:
+        raise NotFoundError("Status not found", {"status": status})
+    generation = _projects_generation(generations)
+    if token is not None:
+        _check_cursor_generation(token, generation)
+
+    present = sorted((r for r in rows if r[0] is not None), key=lambda r: (r[0], r[2], r[1]), reverse=bool(desc))
+    missing = sorted((r for r in rows if r[0] is None), key=lambda r: (r[2], r[1]))
+    page = (present + missing)[offset:need]
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        key, task_id, project_id, _ = page[-1]
+        next_cursor = _encode_cursor(query, generation, key, task_id, project_id=project_id)
+
+    items = [{"project_id": project_id, **_project_item(meta, fields_set)} for _, _, project_id, meta in page]
+    return {
+        "ok": True,
+        "projects": counts,
+        "count": len(items),
+        "count_total": sum(counts.values()),
+        "items": items,
+        "next_cursor": next_cursor,
+    }
 
-                items.append(meta_out)
 
-    def sort_val(m):
-        val = m.get(sort)
-        if sort == "due_date":
-            if val is None:
-                return None
-            try:
-                return parse_due_date(val)
-            except Exception:
-                return None
-        return val
-
-    # sort with missing values last (missing sorted by task_id for stability)
-    present = [m for m in items if sort_val(m) is not None]
-    missing = [m for m in items if sort_val(m) is None]
+def _discover_projects(root):
+    """Project ids under `root`: directories whose name is a valid id."""
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return []
+    projects = []
+    for name in sorted(names):
+        try:
+            validate_id(name, "project_id")
+        except ValidationError:
+            continue
+        if os.path.isdir(os.path.join(root, name)):
+            projects.append(name)
+    return projects
+
+
+def _scan_project(root, project_id, list_args, after, need):
+    """`(plan, count_total, rows)` of one project with at most `need` rows; None if it or the status does not exist."""
+    try:
+        with _read_locked(root, project_id) as db:
+            with metrics.phase("query"):
+                plan, total_count, rows = _open_list(root, db, project_id, after=after, **list_args)
+                rows = list(itertools.islice(rows, need))
+    except NotFoundError:
+        return None
+    except TaskTrackingError as e:
+        if not isinstance(e, ValidationError):
+            e.details.setdefault("project_id", project_id)
+        raise
+    return plan, total_count, rows
+
+
+def _map_threads(fn, items, workers):
+    """`[fn(item) for item in items]` on up to `workers` threads sharing the invocation's context; raises the first error."""
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    context = thread_context()
+    cache = _active_cache()
+    timed = metrics.enabled()
+
+    def _run(item):
+        use_thread_context(context)
+        if timed:
+            metrics.start()
+        result = error = None
+        try:
+            with using_cache(cache):
+                result = fn(item)
+        except BaseException as e:
+            error = e
+        finally:
+            sync_barrier()
+        return result, error, metrics.detach(), get_lock_wait_ms()
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        outcomes = list(pool.map(_run, items))
+    for _, _, timings, lock_wait in outcomes:
+        metrics.merge(timings)
+        add_lock_wait(lock_wait)
+    for _, error, _, _ in outcomes:
+        if error is not None:
+            raise error
+    return [result for result, _, _, _ in outcomes]
+
+
+def _project_after(position, project_id, desc):
+    """Position `(key, task_id)` in one project for a cursor `(key, task_id, project_id)` of the merged list."""
+    key, task_id, cursor_project = position
+    if project_id == cursor_project:
+        return key, task_id
+    if key is None:
+        earlier = project_id < cursor_project
+        return key, _LAST_TASK_ID if earlier else ""
+    earlier = project_id > cursor_project if desc else project_id < cursor_project
+    if desc:
+        return key, "" if earlier else _LAST_TASK_ID
+    return key, _LAST_TASK_ID if earlier else ""
+
+
+def _projects_generation(generations):
+    import hashlib
+    digest = hashlib.sha1(json.dumps(sorted(generations.items())).encode("utf-8")).hexdigest()
+    return int(digest[:12], 16)
+
+
+def _open_list(root, db, project_id, status, tag, assignee, priority, filter_mode, fields, limit, offset, sort, desc, cursor, max_limit, after=None):
+    """Validate a list query; returns `(plan, count_total, rows)` with rows lazily starting at `offset` (or `after`)."""
+    if db is not None:
+        import sqlite_backend
+        statuses = sqlite_backend.statuses(db)
+    else:
+        statuses = load_project_statuses(root, project_id)
+    if status:
+        validate_status(status)
+        if status not in statuses:
+            raise NotFoundError("Status not found", {"status": status})
+        statuses = [status]
 
-    def key_fn(m):
-        return (sort_val(m), m.get("task_id"))
+    if filter_mode not in {"and", "or"}:
+        raise ValidationError("Invalid filter mode", {"filter_mode": filter_mode})
 
-    present_sorted = sorted(present, key=key_fn, reverse=bool(desc))
-    missing_sorted = sorted(missing, key=lambda m: m.get("task_id"))
-    items_sorted = present_sorted + missing_sorted
-    total_count = len(items_sorted)
+    if limit is None:
+        if max_limit is not None:
+            raise ValidationError("Limit must be > 0")
+    elif limit <= 0:
+        raise ValidationError("Limit must be > 0")
+    elif max_limit is not None and limit > max_limit:
+        raise ValidationError("Limit must be <= 1000")
+    if offset is None or offset < 0:
+        raise ValidationError("Offset must be >= 0")
 
-    paged = items_sorted[offset: offset + limit]
+    if sort not in SORT_FIELDS:
+        raise ValidationError("Invalid sort field", {"sort": sort})
 
     allowed_fields = {"task_id", "status", "created_at", "updated_at", "tags", "assignee", "priority", "due_date"}
     if fields:
@@ -373,14 +2004,240 @@ def list_tasks(project_id, status=None, tag=None, assignee=None, priority=None,
         if required not in fields_set:
             fields_set.append(required)
 
-    out_items = []
-    for m in paged:
-        item = {}
-        for f in fields_set:
-            item[f] = m.get(f)
-        out_items.append(item)
+    if cursor is not None and offset:
+        raise ValidationError("Use either cursor or offset")
+    query = _cursor_query(status, tag, assignee, priority, filter_mode, sort, desc)
+    if db is not None:
+        generation = sqlite_backend.generation(db)
+    else:
+        manifest = _read_manifest(root, project_id)
+        generation = manifest["generation"] if manifest else 0
+    if cursor is not None:
+        after = _decode_cursor(cursor, query, generation, sort)
+
+    filters = [(f, v) for f, v in (("tags", tag), ("assignee", assignee), ("priority", priority)) if v]
+    if db is not None:
+        # without a status filter the query is left free to pick the sort index
+        total_count, rows = _sqlite_rows(db, statuses if status else None, filters, filter_mode, sort, desc, after)
+    elif filters:
+        need = None if limit is None else offset + limit + 1
+        total_count, rows = _filtered_rows(root, project_id, statuses, filters, filter_mode, sort, desc, need, after)
+    else:
+        total_count, rows = _presorted_rows(root, project_id, statuses, sort, desc, after)
+
+    plan = {"fields": fields_set, "query": query, "generation": generation, "limit": limit}
+    return plan, total_count, itertools.islice(rows, offset, None)
+
+
+def _cursor_query(status, tag, assignee, priority, filter_mode, sort, desc, all_projects=False):
+    import hashlib
+    query = [status, tag, assignee, priority, filter_mode, sort, bool(desc)]
+    if all_projects:
+        query.append("*")
+    return hashlib.sha1(json.dumps(query).encode("utf-8")).hexdigest()[:16]
+
+
+def _encode_cursor(query, generation, key, task_id, project_id=None):
+    import base64
+    token = {"q": query, "g": generation, "k": key, "t": task_id}
+    if project_id is not None:
+        token["p"] = project_id
+    token = json.dumps(token, separators=(",", ":"))
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _read_cursor(cursor, query, sort):
+    """Validated token of a cursor issued for the same query (generation not checked)."""
+    import base64
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        token = json.loads(raw.decode("utf-8"))
+    except (ValueError, TypeError):
+        raise ValidationError("Invalid cursor")
+    if not isinstance(token, dict) or not isinstance(token.get("t"), str) or not isinstance(token.get("g"), int):
+        raise ValidationError("Invalid cursor")
+    key = token.get("k")
+    key_type = int if sort == "due_date" else str
+    if key is not None and (not isinstance(key, key_type) or isinstance(key, bool)):
+        raise ValidationError("Invalid cursor")
+    if token.get("q") != query:
+        raise ValidationError("Cursor does not match the list query")
+    return token
+
+
+def _check_cursor_generation(token, generation):
+    if token["g"] != generation:
+        raise ConflictError(
+            "Stale cursor",
+            {"reason": "STALE_CURSOR", "cursor_generation": token["g"], "generation": generation},
+        )
+
+
+def _decode_cursor(cursor, query, generation, sort):
+    """Position `(key, task_id)` of a cursor issued for the same query and generation."""
+    token = _read_cursor(cursor, query, sort)
+    _check_cursor_generation(token, generation)
+    return token.get("k"), token["t"]
+
+
+def _filtered_rows(root, project_id, statuses, filters, filter_mode, sort, desc, need, after=None):
+    present = []
+    missing = []
+    total_count = 0
+    for st in statuses:
+        # posting lists: only the matching task ids are looked at
+        with metrics.phase("postings"):
+            postings, index = _load_postings(root, project_id, st)
+        matches = [set(postings[f].get(v, ())) for f, v in filters]
+        candidates = set.intersection(*matches) if filter_mode == "and" else set.union(*matches)
+        if not candidates:
+            continue
+        if index is None:
+            index = _cached_index(root, project_id, st, candidates)
+        for task_id in candidates:
+            meta = index.get(task_id)
+            if not isinstance(meta, dict):
+                continue
+            total_count += 1
+            key = _sort_key(meta, sort)
+            if after is not None:
+                if key is None:
+                    if after[0] is None and task_id <= after[1]:
+                        continue
+                elif after[0] is None or ((key, task_id) <= after if not desc else (key, task_id) >= after):
+                    continue
+            meta_out = dict(meta)
+            meta_out["status"] = st
+            if key is None:
+                missing.append((None, task_id, meta_out))
+            else:
+                present.append((key, task_id, meta_out))
+
+    # missing values last, ties broken on task_id; with a page size only the top `need` are kept
+    if need is None:
+        top = sorted(present, key=lambda e: (e[0], e[1]), reverse=bool(desc))
+        top += sorted(missing, key=lambda e: e[1])
+        return total_count, top
+    pick = heapq.nlargest if desc else heapq.nsmallest
+    top = pick(need, present, key=lambda e: (e[0], e[1]))
+    if len(top) < need:
+        top += heapq.nsmallest(need - len(top), missing, key=lambda e: e[1])
+    return total_count, top
+
+
+def _sqlite_rows(db, statuses, filters, filter_mode, sort, desc, after=None):
+    import sqlite_backend
+    total_count, rows = sqlite_backend.query(db, statuses, filters, filter_mode, sort, desc, after)
+
+    def _rows():
+        for key, task_id, st, meta_json in rows:
+            meta = _load_meta(task_id, meta_json)
+            meta_out = dict(meta) if isinstance(meta, dict) else {}
+            meta_out["status"] = st
+            yield key, task_id, meta_out
+
+    return total_count, _rows()
+
+
+def _presorted_rows(root, project_id, statuses, sort, desc, after=None):
+    with metrics.phase("orders"):
+        orders = {st: _load_order(root, project_id, st, sort)[0] for st in statuses}
+    total_count = sum(len(o["keys"]) + len(o["missing"]) for o in orders.values())
+
+    def _rows():
+        get = _index_reader(root, project_id)
+        for key, task_id, st in _merge_orders(orders, desc, after):
+            meta_out = dict(get(st, task_id) or {})
+            meta_out["status"] = st
+            yield key, task_id, meta_out
+
+    return total_count, _rows()
+
+_BODY_CHUNK_CHARS = 64 * 1024
+_LINE_BREAKS = frozenset("\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029")
+
+
+def _read_body_file(root, project_id, status, task_id):
+    try:
+        with open(_body_path(root, project_id, status, task_id), "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        raise IntegrityError("Body file missing", {"task_id": task_id})
+    metrics.count("body_chars_read", len(text))
+    return text
+
+
+def _read_body_text(root, project_id, status, task_id, db):
+    if db is None:
+        return _read_body_file(root, project_id, status, task_id)
+    import sqlite_backend
+    text = sqlite_backend.read_body(db, task_id)
+    metrics.count("body_chars_read", len(text))
+    return text
+
+
+def _iter_body_chunks(root, project_id, status, task_id, db):
+    """The body in chunks of `_BODY_CHUNK_CHARS`; the caller stops reading when done."""
+    if db is not None:
+        import sqlite_backend
+        for chunk in sqlite_backend.iter_body(db, task_id, _BODY_CHUNK_CHARS):
+            metrics.count("body_chars_read", len(chunk))
+            yield chunk
+        return
+    try:
+        f = open(_body_path(root, project_id, status, task_id), "r", encoding="utf-8")
+    except FileNotFoundError:
+        raise IntegrityError("Body file missing", {"task_id": task_id})
+    with f:
+        while True:
+            chunk = f.read(_BODY_CHUNK_CHARS)
+            if not chunk:
+                return
+            metrics.count("body_chars_read", len(chunk))
+            yield chunk
+
+
+def _line_fragments(chunks):
+    """Yield `(fragment, ends_line)` pieces that join to the lines of `"".join(chunks).splitlines(keepends=True)`."""
+    pending_cr = False
+    for chunk in chunks:
+        if pending_cr:
+            # "\r" at a chunk end: a following "\n" belongs to the same line
+            if chunk.startswith("\n"):
+                chunk = chunk[1:]
+                yield "\n", True
+            else:
+                yield "", True
+            pending_cr = False
+        pieces = chunk.splitlines(keepends=True)
+        for i, piece in enumerate(pieces):
+            if i == len(pieces) - 1 and piece.endswith("\r"):
+                pending_cr = True
+                yield piece, False
+            else:
+                yield piece, piece[-1] in _LINE_BREAKS
+    if pending_cr:
+        yield "", True
+
+
+def _bounded_body(chunks, max_chars=None, max_lines=None):
+    """`(text, truncated)`: the body cut to `max_lines` lines, then `max_chars` characters, reading only that much."""
+    kept = []
+    size = 0
+    lines = 0
+    for fragment, ends_line in _line_fragments(chunks):
+        if max_lines is not None and lines == max_lines:
+            if fragment:
+                return "".join(kept), True
+            continue
+        kept.append(fragment)
+        size += len(fragment)
+        if max_chars is not None and size > max_chars:
+            return "".join(kept)[:max_chars], True
+        if ends_line:
+            lines += 1
+    return "".join(kept), False
 
-    return {"ok": True, "project_id": project_id, "count": len(out_items), "count_total": total_count, "items": out_items}
 
 def show_task(project_id, task_id, include_body=False, max_body_chars=None, max_body_lines=None):
     validate_id(project_id, "project_id")
@@ -390,29 +2247,20 @@ def show_task(project_id, task_id, include_body=False, max_body_chars=None, max_
     if max_body_lines is not None and max_body_lines < 0:
         raise ValidationError("max_body_lines must be >= 0")
     root = get_root()
-    with ProjectLock(_project_dir(root, project_id)):
-        _ensure_integrity(project_id, locked=True)
-        status, meta = find_task(root, project_id, task_id)
-        meta_out = dict(meta)
+    with _read_locked(root, project_id) as db:
+        if db is not None:
+            status, meta = _sqlite_find(db, project_id, task_id)
+        else:
+            status, meta = find_task(root, project_id, task_id)
+        meta_out = copy.deepcopy(meta)
         result = {"ok": True, "project_id": project_id, "task_id": task_id, "status": status, "meta": meta_out}
 
         if include_body:
-            body_path = _body_path(root, project_id, status, task_id)
-            try:
-                with open(body_path, "r", encoding="utf-8") as f:
-                    text = f.read()
-            except FileNotFoundError:
-                raise IntegrityError("Body file missing", {"task_id": task_id})
-
-            truncated = False
-            if max_body_lines is not None:
-                lines = text.splitlines(keepends=True)
-                if len(lines) > max_body_lines:
-                    text = "".join(lines[:max_body_lines])
-                    truncated = True
-            if max_body_chars is not None and len(text) > max_body_chars:
-                text = text[:max_body_chars]
-                truncated = True
+            if max_body_chars is None and max_body_lines is None:
+                text, truncated = _read_body_text(root, project_id, status, task_id, db), False
+            else:
+                with contextlib.closing(_iter_body_chunks(root, project_id, status, task_id, db)) as chunks:
+                    text, truncated = _bounded_body(chunks, max_body_chars, max_body_lines)
 
             body_obj = {"text": text, "truncated": truncated}
             if max_body_chars is not None:
@@ -423,205 +2271,1003 @@ def show_task(project_id, task_id, include_body=False, max_body_chars=None, max_
 
     return result
 
-def move_task(project_id, task_id, new_status):
-    validate_id(project_id, "project_id")
-    validate_id(task_id, "task_id")
-    validate_status(new_status)
-    root = get_root()
+SEARCH_MODES = ("and", "or")
+SNIPPET_CHARS = 160
+SNIPPET_BEFORE = 40
+SNIPPET_SCAN_CHARS = 1024 * 1024
+
+
+def search_tasks(project_id, query, mode="and", status=None, limit=20):
+    """Tasks whose body or string metadata contain the query terms, best BM25 score first."""
+    import search_index
+    validate_id(project_id, "project_id")
+    terms = list(dict.fromkeys(search_index.tokenize(query or "")))
+    if not terms:
+        raise ValidationError("Query has no searchable terms", {"query": query})
+    if mode not in SEARCH_MODES:
+        raise ValidationError("Invalid search mode", {"mode": mode})
+    if limit is None or limit <= 0:
+        raise ValidationError("Limit must be > 0")
+    if limit > 1000:
+        raise ValidationError("Limit must be <= 1000")
+    if status:
+        validate_status(status)
+    root = get_root()
+    # a stale filesystem index is rebuilt under the exclusive lock, where no other search reads or builds it
+    for exclusive in (False, True):
+        with _read_locked(root, project_id, exclusive=exclusive) as db:
+            with metrics.phase("query"):
+                if db is not None:
+                    found = _sqlite_search(db, terms, mode)
+                else:
+                    found = _fs_search(root, project_id, terms, mode, build=exclusive)
+                if found is None:
+                    continue
+                items, hits = _search_page(root, project_id, db, terms, status, limit, *found)
+        break
+
+    return {
+        "ok": True,
+        "project_id": project_id,
+        "query": query,
+        "terms": terms,
+        "mode": mode,
+        "count": len(items),
+        "count_total": len(hits),
+        "items": items,
+    }
+
+
+def _search_page(root, project_id, db, terms, status, limit, scores, located, statuses):
+    if status and status not in statuses:
+        raise NotFoundError("Status not found", {"status": status})
+    if status:
+        hits = [(-score, task_id) for task_id, score in scores.items() if located.get(task_id) == status]
+    else:
+        hits = [(-score, task_id) for task_id, score in scores.items() if isinstance(located.get(task_id), str)]
+    items = []
+    for score, task_id in heapq.nsmallest(limit, hits):
+        task_status = located[task_id]
+        with contextlib.closing(_iter_body_chunks(root, project_id, task_status, task_id, db)) as chunks:
+            snippet = _snippet(chunks, terms)
+        items.append({"task_id": task_id, "status": task_status, "score": round(-score, 4), "snippet": snippet})
+    return items, hits
+
+
+def _fs_search(root, project_id, terms, mode, build):
+    import search_index
+    statuses = load_project_statuses(root, project_id)
+    found = _search_postings(root, project_id, statuses, terms, build)
+    if found is None:
+        return None
+    reader, postings = found
+    scores = search_index.rank(postings, reader.lengths, reader.docs, reader.total_length, mode)
+    located = _load_locator(root, project_id, statuses) if scores else {}
+    return scores, located, statuses
+
+
+def _search_postings(root, project_id, statuses, terms, build):
+    """`(reader, postings of each term)`; a stale or unreadable index is rebuilt if `build`, else None."""
+    import search_index
+    sources = _index_sources(root, project_id, statuses)
+    meta = search_index.read_meta(root, project_id)
+    if meta is not None:
+        try:
+            reader = search_index.Reader(root, project_id, meta)
+            if reader.sources == sources:
+                return reader, [reader.postings(term) for term in terms]
+        except IntegrityError:
+            pass
+    if not build:
+        return None
+    with metrics.phase("search_index"):
+        _build_search(root, project_id, statuses, sources)
+    meta = search_index.read_meta(root, project_id)
+    if meta is None:
+        raise IntegrityError("Search index unreadable after rebuild", {"project_id": project_id})
+    reader = search_index.Reader(root, project_id, meta)
+    return reader, [reader.postings(term) for term in terms]
+
+
+def _build_search(root, project_id, statuses, sources=None):
+    import search_index
+    if sources is None:
+        sources = _index_sources(root, project_id, statuses)
+    docs = {}
+    for st in statuses:
+        for task_id, meta in read_index(root, project_id, st).items():
+            try:
+                body = _read_body_file(root, project_id, st, task_id)
+            except IntegrityError:
+                body = ""
+            docs[task_id] = _search_document(meta, body)
+    search_index.build(root, project_id, docs, sources)
+
+
+def _sqlite_search(db, terms, mode):
+    import search_index
+    import sqlite_backend
+    if not sqlite_backend.has_search(db):
+        with metrics.phase("search_index"):
+            # the read transaction becomes a write transaction for the one-time build
+            db.execute("COMMIT")
+            db.execute("BEGIN IMMEDIATE")
+            if not sqlite_backend.has_search(db):
+                _build_sqlite_search(db)
+            db.execute("COMMIT")
+            db.execute("BEGIN")
+    docs, total_length = sqlite_backend.search_stats(db)
+    postings = [sqlite_backend.search_postings(db, term) for term in terms]
+    candidates = set().union(*postings)
+    lengths = sqlite_backend.search_lengths(db, candidates)
+    scores = search_index.rank(postings, lengths, docs, total_length, mode)
+    return scores, sqlite_backend.statuses_of(db, scores), sqlite_backend.statuses(db)
+
+
+def _build_sqlite_search(conn):
+    """(Re)create the search tables of a SQLite project from every task (in the caller's transaction)."""
+    import sqlite_backend
+    if sqlite_backend.has_search(conn):
+        sqlite_backend.clear_search(conn)
+    else:
+        sqlite_backend.create_search(conn)
+    for task_id, _, meta_json, _, _, body in sqlite_backend.iter_tasks(conn, with_body=True):
+        try:
+            meta = json.loads(meta_json)
+        except ValueError:
+            meta = None
+        length, tf = _search_document(meta, body)
+        sqlite_backend.put_search_doc(conn, task_id, length, tf)
+
+
+def _snippet(chunks, terms):
+    """About `SNIPPET_CHARS` of body text around the first whole-word match of a query term (else the body's start)."""
+    import search_index
+    pattern = re.compile(
+        r"(?<![^\W_])(?:" + "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)) + r")(?![^\W_])",
+        re.IGNORECASE,
+    )
+    head = ""
+    window = ""
+    start = None
+    scanned = 0
+    for chunk in chunks:
+        if len(head) < SNIPPET_CHARS:
+            head += chunk[:SNIPPET_CHARS - len(head)]
+        if start is None:
+            # keep enough of the previous chunk for a match across the boundary
+            window = window[-(SNIPPET_BEFORE + search_index.MAX_TERM_CHARS):] + chunk
+            match = pattern.search(window)
+            if match is None:
+                scanned += len(chunk)
+                if scanned >= SNIPPET_SCAN_CHARS:
+                    break
+                continue
+            start = max(0, match.start() - SNIPPET_BEFORE)
+            if start:
+                # begin at a word boundary
+                space = re.search(r"\s", window[start:match.start()])
+                if space is not None:
+                    start += space.end()
+        else:
+            window += chunk
+        if len(window) - start >= SNIPPET_CHARS:
+            break
+    text = head if start is None else window[start:start + SNIPPET_CHARS]
+    return " ".join(text.split())
+
+
+def move_task(project_id, task_id, new_status):
+    validate_id(project_id, "project_id")
+    validate_id(task_id, "task_id")
+    validate_status(new_status)
+    root = get_root()
+
+    with _locked_workspace(root, project_id) as ws:
+        result = _op_move(ws, task_id, new_status)
+        _commit(ws)
+
+    return result
+
+def meta_update(project_id, task_id, patch):
+    validate_id(project_id, "project_id")
+    validate_id(task_id, "task_id")
+    set_obj, unset_list = _parse_patch(patch)
+
+    root = get_root()
+    with _locked_workspace(root, project_id) as ws:
+        result = _op_meta_update(ws, task_id, set_obj, unset_list)
+        _commit(ws)
+
+    return result
+
+def set_body(project_id, task_id, text=None, file_path=None):
+    validate_id(project_id, "project_id")
+    validate_id(task_id, "task_id")
+    if (text is None and file_path is None) or (text is not None and file_path is not None):
+        raise ValidationError("Provide exactly one of --text or --file")
+    root = get_root()
+
+    if file_path is not None:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            raise NotFoundError("Input file not found", {"file": file_path})
+
+    with _locked_workspace(root, project_id) as ws:
+        result = _op_set_body(ws, task_id, text)
+        _commit(ws)
+
+    return result
+
+BATCH_OPS = ("add", "move", "meta-update", "set-body")
 
-    with ProjectLock(_project_dir(root, project_id)):
-        _ensure_integrity(project_id, locked=True)
 
-        statuses = load_project_statuses(root, project_id)
-        if new_status not in statuses:
-            raise ValidationError("Invalid status", {"status": new_status})
+def _batch_str(op, field, required=False):
+    value = op.get(field)
+    if value is None:
+        if required:
+            raise ValidationError("Missing field in batch op", {"field": field})
+        return None
+    if not isinstance(value, str):
+        raise ValidationError("Batch op field must be a string", {"field": field})
+    return value
+
 
-        current_status, meta = find_task(root, project_id, task_id)
-        if current_status == new_status:
-            raise ValidationError("Task already in target status", {"status": new_status})
+def _apply_batch_op(ws, op):
+    if not isinstance(op, dict):
+        raise ValidationError("Batch op must be a JSON object")
+    name = op.get("op")
+    if name not in BATCH_OPS:
+        raise ValidationError("Unknown batch op", {"op": name, "allowed": list(BATCH_OPS)})
+    task_id = _batch_str(op, "task_id", required=True)
+    validate_id(task_id, "task_id")
 
-        src_index = read_index(root, project_id, current_status)
-        dst_index = read_index(root, project_id, new_status)
+    if name == "add":
+        tags = op.get("tags")
+        if isinstance(tags, list):
+            validate_tags(tags)
+            tags_list = tags
+        else:
+            tags_list = _parse_tags_csv(_batch_str(op, "tags"))
+        assignee = op.get("assignee")
+        priority = _batch_str(op, "priority")
+        due_date = _batch_str(op, "due_date")
+        _validate_add_fields(assignee, priority, due_date)
+        return _op_add(ws, task_id, _batch_str(op, "status"), _batch_str(op, "body"), tags_list, assignee, priority, due_date)
+    if name == "move":
+        to_status = _batch_str(op, "to", required=True)
+        validate_status(to_status)
+        return _op_move(ws, task_id, to_status)
+    if name == "meta-update":
+        set_obj, unset_list = _parse_patch(op.get("patch"))
+        return _op_meta_update(ws, task_id, set_obj, unset_list)
+    return _op_set_body(ws, task_id, _batch_str(op, "text", required=True))
+
+
+def batch(project_id, lines):
+    """Apply JSON operation lines under one lock and one flush; a failing line does not undo the others."""
+    validate_id(project_id, "project_id")
+    root = get_root()
+    results = []
+    failed = 0
+    added = []
 
-        if task_id not in src_index:
-            raise IntegrityError("Task missing from source index", {"task_id": task_id})
-        if task_id in dst_index:
-            raise IntegrityError("Task already exists in destination index", {"task_id": task_id})
+    with _locked_workspace(root, project_id) as ws:
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    raise ValidationError("Invalid JSON in batch line")
+                result = _apply_batch_op(ws, op)
+            except TaskTrackingError as e:
+                failed += 1
+                results.append({
+                    "line": line_no,
+                    "ok": False,
+                    "error": {"code": e.code, "message": e.message, "details": e.details},
+                    "exit_code": e.exit_code,
+                })
+                continue
+            results.append(dict({"line": line_no}, **result))
+            if op["op"] == "add":
+                added.append((result["status"], result["task_id"]))
+        try:
+            written = _commit(ws)
+        except Exception:
+            # like add_task: the bodies of tasks this batch added are not left behind
+            for status, task_id in added:
+                ws.discard_body(status, task_id)
+            raise
 
-        updated = _meta_for_storage(meta)
-        updated["updated_at"] = now_utc_iso()
+    return {
+        "results": results,
+        "summary": {
+            "ok": failed == 0,
+            "project_id": project_id,
+            "ops": len(results),
+            "failed": failed,
+            "indexes_written": len(written),
+        },
+    }
 
-        src_new = dict(src_index)
-        dst_new = dict(dst_index)
-        src_new.pop(task_id, None)
-        dst_new[task_id] = updated
+TRANSFER_FORMATS = ("ndjson", "csv")
+# CSV columns of import and export; other metadata goes into `meta` as a JSON object
+CSV_COLUMNS = ("task_id", "status", "created_at", "updated_at", "tags", "assignee", "priority", "due_date", "meta", "body")
+# record fields where null means absent
+_RECORD_FIELDS = ("task_id", "status", "body", "created_at", "updated_at", "tags", "assignee", "priority", "due_date")
+
+
+def _validate_format(fmt):
+    if fmt not in TRANSFER_FORMATS:
+        raise ValidationError("Invalid format", {"format": fmt, "allowed": list(TRANSFER_FORMATS)})
+
+
+def _ndjson_record(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise ValidationError("Invalid JSON in import line")
+
+
+def _csv_header(reader):
+    import csv
+    try:
+        header = next(reader, [])
+    except csv.Error as e:
+        raise ValidationError("Invalid CSV", {"line": reader.line_num, "error": str(e)})
+    if "task_id" not in header:
+        raise ValidationError("CSV header must name a task_id column", {"header": header})
+    for column in header:
+        if column not in CSV_COLUMNS:
+            raise ValidationError("Unknown CSV column", {"column": column, "allowed": list(CSV_COLUMNS)})
+        if header.count(column) > 1:
+            raise ValidationError("Duplicate CSV column", {"column": column})
+    return header
+
+
+def _csv_rows(reader):
+    import csv
+    while True:
+        line = reader.line_num + 1
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # a malformed row fails as its own record, like an invalid NDJSON line
+            yield line, e
+            continue
+        if any(row):
+            yield line, row
+
+
+def _csv_record(header, row):
+    """The NDJSON-shaped record of a CSV row; empty cells are absent fields."""
+    import csv
+    if isinstance(row, csv.Error):
+        raise ValidationError("Invalid CSV", {"error": str(row)})
+    if len(row) != len(header):
+        raise ValidationError("Wrong number of CSV cells", {"expected": len(header), "found": len(row)})
+    record = {}
+    extra = {}
+    for column, cell in zip(header, row):
+        if cell == "":
+            continue
+        if column == "tags":
+            record["tags"] = _parse_tags_csv(cell)
+        elif column == "meta":
+            try:
+                extra = json.loads(cell)
+            except ValueError:
+                raise ValidationError("Invalid JSON in meta cell")
+            if not isinstance(extra, dict):
+                raise ValidationError("meta cell must be a JSON object")
+        else:
+            record[column] = cell
+    for field, value in extra.items():
+        if field in record:
+            raise ValidationError("Field given in its column and in meta", {"field": field})
+        record[field] = value
+    return record
+
+
+def _import_rows(text, fmt):
+    """`(rows, decode)`: the `(line, raw record)` pairs of the input and the function turning one into a record dict."""
+    if text.startswith("\ufeff"):
+        text = text[1:]
+    if fmt == "ndjson":
+        # not splitlines(): U+2028 and friends may appear unescaped inside JSON strings
+        return ((n, line) for n, line in enumerate(text.split("\n"), start=1) if line.strip()), _ndjson_record
+    import csv
+    import io
+    reader = csv.reader(io.StringIO(text, newline=""), strict=True)
+    header = _csv_header(reader)
+    return _csv_rows(reader), functools.partial(_csv_record, header)
+
+
+def _import_entry(record):
+    """`(task_id, status, meta, body)` of one import record; `status` None means the first status."""
+    if not isinstance(record, dict):
+        raise ValidationError("Import record must be a JSON object")
+    fields = {k: v for k, v in record.items() if v is not None or k not in _RECORD_FIELDS}
+    task_id = fields.pop("task_id", None)
+    if not isinstance(task_id, str):
+        raise ValidationError("Invalid task_id", {"task_id": task_id})
+    validate_id(task_id, "task_id")
+    status = fields.pop("status", None)
+    if status is not None:
+        if not isinstance(status, str):
+            raise ValidationError("Invalid status", {"status": status})
+        validate_status(status)
+    body = fields.pop("body", "")
+    if not isinstance(body, str):
+        raise ValidationError("Body must be a string")
+    # missing timestamps are the time of the import
+    now = now_utc_iso()
+    meta = {"task_id": task_id}
+    for field in ("created_at", "updated_at"):
+        value = fields.pop(field, None)
+        meta[field] = now if value is None else normalize_timestamp(value, field)
+    if "title" in fields:
+        raise ValidationError("Forbidden field in import record", {"field": "title"})
+    set_obj, _ = _parse_patch({"set": fields})
+    meta.update(set_obj)
+    return task_id, status, meta, body
+
+
+def _record_failure(line, e):
+    return {
+        "line": line,
+        "ok": False,
+        "error": {"code": e.code, "message": e.message, "details": e.details},
+        "exit_code": e.exit_code,
+    }
 
-        src_body = _body_path(root, project_id, current_status, task_id)
-        dst_body = _body_path(root, project_id, new_status, task_id)
 
-        if not os.path.exists(src_body):
-            raise IntegrityError("Body file missing", {"task_id": task_id})
+def _read_input_file(file_path):
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        raise NotFoundError("Input file not found", {"file": file_path})
+    try:
+        return data.decode("utf-8", errors="strict")
+    except UnicodeDecodeError:
+        raise ValidationError("Input file must be valid UTF-8", {"file": file_path})
 
-        tx_path = _tx_path(root, project_id)
-        write_json_atomic(tx_path, {
-            "op": "move",
-            "task_id": task_id,
-            "from": current_status,
-            "to": new_status,
-            "updated_meta": updated,
-        })
 
-        # perform move + index updates with best-effort rollback
+def import_tasks(project_id, fmt="ndjson", text=None, file_path=None):
+    """Add the tasks of an NDJSON or CSV input as one unit: nothing is written unless every record is valid."""
+    validate_id(project_id, "project_id")
+    _validate_format(fmt)
+    if (text is None) == (file_path is None):
+        raise ValidationError("Provide exactly one of --file or --stdin")
+    if file_path is not None:
+        text = _read_input_file(file_path)
+    root = get_root()
+    rows, decode = _import_rows(text, fmt)
+    failures = []
+    entries = []
+    seen = set()
+    for line, raw in rows:
         try:
-            os.replace(src_body, dst_body)
-            write_index(root, project_id, current_status, src_new)
-            write_index(root, project_id, new_status, dst_new)
-            try:
-                if os.path.exists(tx_path):
-                    os.remove(tx_path)
-            except Exception:
-                pass
-        except Exception as e:
-            # rollback attempt
+            entry = _import_entry(decode(raw))
+            if entry[0] in seen:
+                raise ConflictError("Duplicate task_id in import", {"task_id": entry[0]})
+        except TaskTrackingError as e:
+            failures.append(_record_failure(line, e))
+            continue
+        seen.add(entry[0])
+        entries.append((line, entry))
+    records = len(entries) + len(failures)
+    written = []
+
+    with _locked_workspace(root, project_id) as ws:
+        tasks = []
+        for line, (task_id, status, meta, body) in entries:
             try:
-                if os.path.exists(dst_body) and not os.path.exists(src_body):
-                    os.replace(dst_body, src_body)
-            except Exception:
-                pass
-            # restore old indexes best-effort
+                tasks.append((task_id, _add_target(ws, task_id, status), meta, body))
+            except TaskTrackingError as e:
+                failures.append(_record_failure(line, e))
+        if not failures and tasks:
             try:
-                write_index(root, project_id, current_status, src_index)
-                write_index(root, project_id, new_status, dst_index)
+                with deferred_sync():
+                    for task_id, status, _, body in tasks:
+                        ws.write_body(status, task_id, body)
+                for task_id, status, meta, _ in tasks:
+                    ws.put(status, task_id, meta)
+                written = _commit(ws)
             except Exception:
-                pass
-            raise IntegrityError("Atomic move failed", {"error": str(e)})
+                for task_id, status, _, _ in tasks:
+                    ws.discard_body(status, task_id)
+                raise
 
+    failures.sort(key=lambda f: f["line"])
     return {
-        "ok": True,
-        "project_id": project_id,
-        "task_id": task_id,
-        "from": current_status,
-        "to": new_status,
-        "updated_at": updated["updated_at"],
+        "results": failures,
+        "summary": {
+            "ok": not failures,
+            "project_id": project_id,
+            "format": fmt,
+            "records": records,
+            "imported": 0 if failures else records,
+            "failed": len(failures),
+            "indexes_written": len(written),
+        },
     }
 
-def meta_update(project_id, task_id, patch):
+
+def _export_records(root, project_id, db, statuses):
+    """Yield `(status, meta, body)` of every task of `statuses`, one task in memory at a time."""
+    if db is not None:
+        import sqlite_backend
+        for task_id, status, meta_json, _, _, body in sqlite_backend.iter_tasks(db, with_body=True):
+            if status in statuses:
+                metrics.count("body_chars_read", len(body or ""))
+                yield status, _load_meta(task_id, meta_json), body or ""
+        return
+    for status in statuses:
+        shards, index, _ = _open_index(root, project_id, status)
+        # a sharded index is held one shard at a time
+        parts = (_read_shard(root, project_id, status, shards, shard) for shard in range(shards)) if shards else [index]
+        for part in parts:
+            for task_id in sorted(part):
+                yield status, part[task_id], _read_body_file(root, project_id, status, task_id)
+
+
+def _csv_row(status, meta, body):
+    fields = dict(meta)
+    row = {"status": status, "body": body}
+    for column in ("task_id", "created_at", "updated_at", "assignee", "priority", "due_date"):
+        if isinstance(fields.get(column), str):
+            row[column] = fields.pop(column)
+    tags = fields.get("tags")
+    # tags with commas (or none at all) only survive as JSON
+    if isinstance(tags, list) and tags and all(isinstance(t, str) and "," not in t for t in tags):
+        row["tags"] = ",".join(fields.pop("tags"))
+    if fields:
+        row["meta"] = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+    return [row.get(column, "") for column in CSV_COLUMNS]
+
+
+def export_tasks(project_id, output_path, fmt="ndjson", status=None):
+    """Stream every task (status, metadata and body) to `output_path` in the `import` record shape."""
     validate_id(project_id, "project_id")
-    validate_id(task_id, "task_id")
-    if not isinstance(patch, dict):
-        raise ValidationError("Patch must be a JSON object")
-    if "set" in patch:
-        set_obj = patch.get("set")
-        if not isinstance(set_obj, dict):
-            raise ValidationError("Invalid patch format", {"field": "set"})
-    else:
-        set_obj = {}
-    if "unset" in patch:
-        unset_list = patch.get("unset")
-        if not isinstance(unset_list, list):
-            raise ValidationError("Invalid patch format", {"field": "unset"})
-    else:
-        unset_list = []
+    _validate_format(fmt)
+    if status is not None:
+        validate_status(status)
+    if not os.path.isdir(os.path.dirname(output_path) or "."):
+        raise NotFoundError("Output directory not found", {"output": output_path})
+    root = get_root()
+    tasks = 0
 
-    forbidden = {"task_id", "created_at", "updated_at", "status", "title"}
-    for k in set_obj.keys():
-        if k in forbidden:
-            raise ValidationError("Forbidden field in set", {"field": k})
-    for k in unset_list:
-        if not isinstance(k, str) or not k:
-            raise ValidationError("Invalid patch format", {"field": "unset"})
-        if k in forbidden:
-            raise ValidationError("Forbidden field in unset", {"field": k})
+    with _read_locked(root, project_id) as db:
+        if db is not None:
+            import sqlite_backend
+            statuses = sqlite_backend.statuses(db)
+        else:
+            statuses = load_project_statuses(root, project_id)
+        if status is not None:
+            if status not in statuses:
+                raise NotFoundError("Status not found", {"project_id": project_id, "status": status})
+            statuses = [status]
+        with atomic_output(output_path) as f:
+            if fmt == "csv":
+                import csv
+                writer = csv.writer(f)
+                writer.writerow(CSV_COLUMNS)
+            for task_status, meta, body in _export_records(root, project_id, db, statuses):
+                if fmt == "csv":
+                    writer.writerow(_csv_row(task_status, meta, body))
+                else:
+                    record = {"task_id": meta.get("task_id"), "status": task_status}
+                    record.update(meta)
+                    record["body"] = body
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                tasks += 1
 
-    if "tags" in set_obj:
-        if set_obj.get("tags") is None:
-            raise ValidationError("Tags must be a list")
-        validate_tags(set_obj.get("tags"))
-    if "assignee" in set_obj:
-        if not isinstance(set_obj.get("assignee"), str):
-            raise ValidationError("Assignee must be a string")
-    if "priority" in set_obj:
-        if set_obj.get("priority") is None:
-            raise ValidationError("Invalid priority", {"priority": None})
-        validate_priority(set_obj.get("priority"))
-    if "due_date" in set_obj:
-        if set_obj.get("due_date") is None or not isinstance(set_obj.get("due_date"), str):
-            raise ValidationError("Invalid ISO 8601 date/datetime", {"due_date": set_obj.get("due_date")})
-        validate_due_date(set_obj.get("due_date"))
+    return {"ok": True, "project_id": project_id, "format": fmt, "tasks": tasks, "output": output_path}
 
+def migrate_index(project_id, shards, status=None):
+    """Rewrite status indexes into `shards` hash shards (0 or 1: back to one index.json)."""
+    validate_id(project_id, "project_id")
+    if status is not None:
+        validate_status(status)
+    if not isinstance(shards, int) or shards < 0 or shards > MAX_SHARDS:
+        raise ValidationError("shards must be between 0 and 256", {"shards": shards})
+    target = shards if shards >= MIN_SHARDS else 0
     root = get_root()
+    results = []
+
     with ProjectLock(_project_dir(root, project_id)):
+        if _is_sqlite(root, project_id):
+            raise ValidationError("Index sharding applies to the filesystem backend", {"project_id": project_id, "backend": "sqlite"})
         _ensure_integrity(project_id, locked=True)
-        status, meta = find_task(root, project_id, task_id)
-        index = read_index(root, project_id, status)
-        if task_id not in index:
-            raise IntegrityError("Task missing from index", {"task_id": task_id})
-
-        updated = _meta_for_storage(meta)
-        for k, v in set_obj.items():
-            updated[k] = v
-        for k in unset_list:
-            if k in updated:
-                updated.pop(k, None)
+        statuses = load_project_statuses(root, project_id)
+        if status is not None and status not in statuses:
+            raise NotFoundError("Status not found", {"project_id": project_id, "status": status})
+        for st in ([status] if status is not None else statuses):
+            current = _index_shards(root, project_id, st)
+            index, seq = _load_index(root, project_id, st)
+            results.append({"status": st, "tasks": len(index), "shards": target, "previous_shards": current, "changed": current != target})
+            if current == target:
+                continue
+            index_path = _index_path(root, project_id, st)
+            delta_path = _delta_path(root, project_id, st)
+            if target:
+                _write_shards(root, project_id, st, target, index)
+                write_json_atomic(index_path, {"$shards": target})
+            else:
+                if current and os.path.exists(delta_path):
+                    # a sharded status ignores delta logs; never replay a leftover one
+                    remove_durable(delta_path)
+                write_json_atomic(index_path, dict(index, **({"$seq": seq} if seq else {})))
+            if os.path.exists(delta_path):
+                remove_durable(delta_path)
+            for shard in range(current):
+                _remove_if_exists(_shard_path(root, project_id, st, current, shard))
+        if any(r["changed"] for r in results):
+            _record_manifest(root, project_id)
+
+    return {"ok": True, "project_id": project_id, "shards": target, "statuses": results}
+
+
+def convert_backend(project_id, backend):
+    """Convert a project between the filesystem layout and SQLite; the database file is the commit point."""
+    validate_id(project_id, "project_id")
+    _validate_backend(backend)
+    root = get_root()
+    project_dir = _project_dir(root, project_id)
+    if not os.path.isdir(project_dir):
+        raise NotFoundError("Project not found", {"project_id": project_id})
 
-        updated["updated_at"] = now_utc_iso()
-        index[task_id] = updated
-        write_index(root, project_id, status, index)
+    with ProjectLock(project_dir):
+        previous = "sqlite" if _is_sqlite(root, project_id) else "fs"
+        if previous == backend:
+            tasks = None
+        elif backend == "sqlite":
+            tasks = _convert_to_sqlite(root, project_id)
+        else:
+            tasks = _convert_to_fs(root, project_id)
 
     return {
         "ok": True,
         "project_id": project_id,
-        "task_id": task_id,
-        "updated_at": updated["updated_at"],
-        "changed": {"set": sorted(set_obj.keys()), "unset": sorted(unset_list)},
+        "backend": backend,
+        "previous_backend": previous,
+        "changed": tasks is not None,
+        "tasks": tasks,
     }
 
-def set_body(project_id, task_id, text=None, file_path=None):
-    validate_id(project_id, "project_id")
-    validate_id(task_id, "task_id")
-    if (text is None and file_path is None) or (text is not None and file_path is not None):
-        raise ValidationError("Provide exactly one of --text or --file")
-    root = get_root()
-
-    if file_path is not None:
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-        except FileNotFoundError:
-            raise NotFoundError("Input file not found", {"file": file_path})
 
-    with ProjectLock(_project_dir(root, project_id)):
-        _ensure_integrity(project_id, locked=True)
-        status, meta = find_task(root, project_id, task_id)
-        index = read_index(root, project_id, status)
-        if task_id not in index:
-            raise IntegrityError("Task missing from index", {"task_id": task_id})
-        body_path = _body_path(root, project_id, status, task_id)
-        write_text_atomic(body_path, text or "")
-        meta_updated = _meta_for_storage(meta)
-        meta_updated["updated_at"] = now_utc_iso()
-        index[task_id] = meta_updated
+def _convert_to_sqlite(root, project_id):
+    import sqlite_backend
+    from storage import replace_durable
+    _ensure_integrity(project_id, locked=True)
+    statuses = load_project_statuses(root, project_id)
+    manifest = _read_manifest(root, project_id)
+    path = _db_path(root, project_id)
+    tmp = path + ".tmp"
+    _remove_if_exists(tmp)
+    # generations continue, so cursors issued before the conversion are stale
+    conn = sqlite_backend.create(tmp, statuses, generation=(manifest["generation"] if manifest else 0) + 1)
+    tasks = 0
+    try:
+        for status in statuses:
+            for task_id, meta in read_index(root, project_id, status).items():
+                with open(_body_path(root, project_id, status, task_id), "r", encoding="utf-8") as f:
+                    body = f.read()
+                columns, tags = _sqlite_columns(meta)
+                sqlite_backend.put(conn, task_id, status, meta, columns, tags, body)
+                tasks += 1
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.close()
+        _remove_if_exists(tmp)
+        raise
+    conn.close()
+    replace_durable(tmp, path)
+    _remove_paths(_fs_leftovers(root, project_id))
+    return tasks
+
+
+def _convert_to_fs(root, project_id):
+    import sqlite_backend
+    path = _db_path(root, project_id)
+    # leftovers of an earlier interrupted conversion are not trusted
+    _remove_paths(_fs_leftovers(root, project_id))
+    conn = sqlite_backend.connect(path)
+    try:
+        conn.execute("BEGIN")
+        statuses = sqlite_backend.statuses(conn)
+        generation = sqlite_backend.generation(conn)
+        indexes = {st: {} for st in statuses}
+        for status in statuses:
+            os.makedirs(_status_dir(root, project_id, status), exist_ok=True)
+        for task_id, status, meta_json, _, _, body in sqlite_backend.iter_tasks(conn, with_body=True):
+            if status not in indexes:
+                raise IntegrityError("Task in unknown status", {"task_id": task_id, "status": status})
+            indexes[status][task_id] = _load_meta(task_id, meta_json)
+            write_text_atomic(_body_path(root, project_id, status, task_id), body)
+    finally:
+        conn.close()
+    locations = {}
+    for status, index in indexes.items():
         write_index(root, project_id, status, index)
+        for task_id in index:
+            _locator_add(locations, task_id, status)
+    _write_locator(root, project_id, statuses, locations)
+    # seeds the cursor generation; the fingerprints are recorded once the database is gone
+    write_json_atomic(_manifest_path(root, project_id), {"generation": generation, "statuses": {}}, rebuildable=True)
+    # everything the filesystem layout needs must be durable before the database goes
+    sync_barrier()
+    for suffix in ("", "-wal", "-shm"):
+        remove_durable(path + suffix)
+    _record_manifest(root, project_id)
+    return sum(len(index) for index in indexes.values())
+
 
+REQUIRED_META_FIELDS = ("task_id", "created_at", "updated_at")
+
+
+def _validate_jobs(jobs):
+    if not isinstance(jobs, int) or isinstance(jobs, bool) or not 1 <= jobs <= MAX_CHECK_JOBS:
+        raise ValidationError(f"Jobs must be between 1 and {MAX_CHECK_JOBS}", {"jobs": jobs})
+
+
+def _minimal_meta(task_id):
+    now = now_utc_iso()
     return {
-        "ok": True,
-        "project_id": project_id,
         "task_id": task_id,
-        "updated_at": meta_updated["updated_at"],
+        "created_at": now,
+        "updated_at": now,
     }
 
-def integrity_check(project_id, fix=False, locked=False):
+
+def _check_task_meta(status, task_id, meta, fix, record):
+    """Check one task's metadata via `record(issue, resolved, fixed_item)`; returns `(meta, changed)`."""
+    if not isinstance(meta, dict):
+        issue = {"type": "META_NOT_OBJECT", "status": status, "task_id": task_id}
+        if fix:
+            record(issue, resolved=True, fixed_item={"type": "META_REPLACED", "status": status, "task_id": task_id})
+            return _minimal_meta(task_id), True
+        record(issue)
+        return meta, False
+
+    changed = False
+
+    # mismatches
+    if meta.get("task_id") != task_id:
+        issue = {"type": "TASK_ID_MISMATCH", "status": status, "task_id": task_id}
+        if fix:
+            meta["task_id"] = task_id
+            changed = True
+            record(issue, resolved=True, fixed_item={"type": "TASK_ID_FIXED", "status": status, "task_id": task_id})
+        else:
+            record(issue)
+
+    for f in REQUIRED_META_FIELDS:
+        if f not in meta:
+            issue = {"type": "MISSING_FIELD", "status": status, "task_id": task_id, "field": f}
+            if fix:
+                if f == "task_id":
+                    meta["task_id"] = task_id
+                else:
+                    meta[f] = now_utc_iso()
+                changed = True
+                record(issue, resolved=True, fixed_item={"type": "FIELD_FILLED", "status": status, "task_id": task_id, "field": f})
+            else:
+                record(issue)
+
+    # type hardening for known fields
+    for tf in ("created_at", "updated_at"):
+        if tf in meta and not isinstance(meta.get(tf), str):
+            issue = {"type": "FIELD_TYPE_INVALID", "status": status, "task_id": task_id, "field": tf}
+            if fix:
+                meta[tf] = now_utc_iso()
+                changed = True
+                record(issue, resolved=True, fixed_item={"type": "FIELD_TYPE_FIXED", "status": status, "task_id": task_id, "field": tf})
+            else:
+                record(issue)
+
+    if "tags" in meta:
+        tags_val = meta.get("tags")
+        tags_ok = False
+        if isinstance(tags_val, list):
+            tags_ok = all(isinstance(t, str) and t.strip() for t in tags_val)
+        if not tags_ok:
+            issue = {"type": "TAGS_INVALID", "status": status, "task_id": task_id}
+            if fix:
+                if isinstance(tags_val, list):
+                    meta["tags"] = [t for t in tags_val if isinstance(t, str) and t.strip()]
+                else:
+                    meta["tags"] = []
+                changed = True
+                record(issue, resolved=True, fixed_item={"type": "TAGS_NORMALIZED", "status": status, "task_id": task_id})
+            else:
+                record(issue)
+
+    if "assignee" in meta and not isinstance(meta.get("assignee"), str):
+        issue = {"type": "ASSIGNEE_INVALID", "status": status, "task_id": task_id}
+        if fix:
+            meta.pop("assignee", None)
+            changed = True
+            record(issue, resolved=True, fixed_item={"type": "ASSIGNEE_REMOVED", "status": status, "task_id": task_id})
+        else:
+            record(issue)
+
+    if "priority" in meta:
+        prio = meta.get("priority")
+        priority_ok = isinstance(prio, str)
+        if priority_ok:
+            try:
+                validate_priority(prio)
+            except ValidationError:
+                priority_ok = False
+        if not priority_ok:
+            issue = {"type": "PRIORITY_INVALID", "status": status, "task_id": task_id, "priority": prio}
+            if fix:
+                meta.pop("priority", None)
+                changed = True
+                record(issue, resolved=True, fixed_item={"type": "PRIORITY_REMOVED", "status": status, "task_id": task_id})
+            else:
+                record(issue)
+
+    if "due_date" in meta:
+        due = meta.get("due_date")
+        due_ok = isinstance(due, str)
+        if due_ok:
+            try:
+                validate_due_date(due)
+            except ValidationError:
+                due_ok = False
+        if not due_ok:
+            issue = {"type": "DUE_DATE_INVALID", "status": status, "task_id": task_id, "due_date": due}
+            if fix:
+                meta.pop("due_date", None)
+                changed = True
+                record(issue, resolved=True, fixed_item={"type": "DUE_DATE_REMOVED", "status": status, "task_id": task_id})
+            else:
+                record(issue)
+
+    return meta, changed
+
+
+def _fs_leftovers(root, project_id):
+    """Paths of the filesystem layout left in a SQLite project by an interrupted conversion."""
+    keep = {".lock", DB_NAME, DB_NAME + "-wal", DB_NAME + "-shm"}
+    project_dir = _project_dir(root, project_id)
+    return [os.path.join(project_dir, name) for name in sorted(os.listdir(project_dir)) if name not in keep]
+
+
+def _remove_paths(paths):
+    import shutil
+    for path in paths:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            _remove_if_exists(path)
+
+
+def _sqlite_integrity_check(root, project_id, fix):
+    """integrity-check of a SQLite project: `PRAGMA quick_check`, metadata rules and column/tag consistency."""
+    import sqlite_backend
+    found = []
+    issues = []
+    fixed = []
+
+    def _record(issue, resolved=False, fixed_item=None):
+        found.append(issue)
+        if resolved:
+            if fixed_item is not None:
+                fixed.append(fixed_item)
+        else:
+            issues.append(issue)
+
+    try:
+        conn = sqlite_backend.connect(_db_path(root, project_id))
+    except IntegrityError as e:
+        _record({"type": "DATABASE_CORRUPT", "message": e.details.get("error", e.message)})
+        return {"ok": False, "project_id": project_id, "recovered": False, "fixed": fixed, "issues": issues, "found": found}
+    try:
+        conn.execute("BEGIN IMMEDIATE" if fix else "BEGIN")
+        problem = sqlite_backend.quick_check(conn)
+        if problem is not None:
+            _record({"type": "DATABASE_CORRUPT", "message": problem})
+        else:
+            statuses = set(sqlite_backend.statuses(conn))
+            for task_id, status, meta_json, columns, tags, _ in list(sqlite_backend.iter_tasks(conn)):
+                if status not in statuses:
+                    issue = {"type": "STATUS_UNKNOWN", "status": status, "task_id": task_id}
+                    if fix:
+                        sqlite_backend.add_status(conn, status)
+                        statuses.add(status)
+                        _record(issue, resolved=True, fixed_item={"type": "STATUS_ADDED", "status": status})
+                    else:
+                        _record(issue)
+                try:
+                    meta = json.loads(meta_json)
+                except ValueError:
+                    meta = None
+                meta, changed = _check_task_meta(status, task_id, meta, fix, _record)
+                if isinstance(meta, dict) and not changed and (columns, tags) != _sqlite_columns(meta):
+                    issue = {"type": "INDEX_COLUMNS_STALE", "status": status, "task_id": task_id}
+                    if fix:
+                        changed = True
+                        _record(issue, resolved=True, fixed_item={"type": "INDEX_COLUMNS_REBUILT", "status": status, "task_id": task_id})
+                    else:
+                        _record(issue)
+                if changed:
+                    columns, tags = _sqlite_columns(meta)
+                    sqlite_backend.put(conn, task_id, status, meta, columns, tags)
+            if fix and sqlite_backend.has_search(conn):
+                _build_sqlite_search(conn)
+            orphans = sqlite_backend.orphan_tags(conn)
+            if orphans:
+                issue = {"type": "ORPHAN_TAGS", "count": orphans}
+                if fix:
+                    sqlite_backend.drop_orphan_tags(conn)
+                    _record(issue, resolved=True, fixed_item={"type": "ORPHAN_TAGS_REMOVED", "count": orphans})
+                else:
+                    _record(issue)
+        for path in _fs_leftovers(root, project_id):
+            issue = {"type": "LEFTOVER_FILE", "path": path}
+            if fix:
+                _remove_paths([path])
+                _record(issue, resolved=True, fixed_item={"type": "LEFTOVER_REMOVED", "path": path})
+            else:
+                _record(issue)
+        if fix:
+            if fixed:
+                sqlite_backend.bump_generation(conn)
+            conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return {"ok": len(issues) == 0, "project_id": project_id, "recovered": False, "fixed": fixed, "issues": issues, "found": found}
+
+
+def _read_check_index(root, project_id, status):
+    """`(index, misplaced)` of a status with all shards merged; raises IntegrityError."""
+    shards, index, _ = _open_index(root, project_id, status)
+    misplaced = []
+    if shards:
+        index = {}
+        for shard in range(shards):
+            part = _read_shard(root, project_id, status, shards, shard)
+            misplaced.extend(tid for tid in part if _shard_of(tid, shards) != shard)
+            index.update(part)
+    return index, misplaced
+
+
+def _body_names(status_dir):
+    """Task ids with a body file in `status_dir` (one directory scan); None if it cannot be listed."""
+    metrics.count("dirs_listed")
+    try:
+        with os.scandir(status_dir) as entries:
+            return {entry.name[:-3] for entry in entries if entry.name.endswith(".md")}
+    except OSError:
+        return None
+
+
+MAX_CHECK_JOBS = 64
+
+
+def integrity_check(project_id, fix=False, locked=False, only_statuses=None, jobs=1):
+    """Check (and with `fix` repair) one project; `jobs` > 1 reads indexes and directories on threads."""
     validate_id(project_id, "project_id")
+    _validate_jobs(jobs)
     root = get_root()
     recovered = False
-
-    def _minimal_meta(task_id):
-        now = now_utc_iso()
-        return {
-            "task_id": task_id,
-            "created_at": now,
-            "updated_at": now,
-        }
+    if _is_sqlite(root, project_id):
+        if fix and not locked:
+            with ProjectLock(_project_dir(root, project_id)):
+                return _sqlite_integrity_check(root, project_id, fix)
+        return _sqlite_integrity_check(root, project_id, fix)
 
     def _parse_updated(meta):
         if not isinstance(meta, dict):
@@ -632,6 +3278,7 @@ def integrity_check(project_id, fix=False, locked=False):
         s = val
         if s.endswith("Z"):
             s = s[:-1] + "+00:00"
+        import datetime
         try:
             return datetime.datetime.fromisoformat(s)
         except Exception:
@@ -656,7 +3303,6 @@ def integrity_check(project_id, fix=False, locked=False):
         found = []
         issues = []
         fixed = []
-        required_fields = ["task_id", "created_at", "updated_at"]
 
         index_map = {}
         id_to_statuses = {}
@@ -671,25 +3317,48 @@ def integrity_check(project_id, fix=False, locked=False):
             else:
                 issues.append(issue)
 
-        for status in project_statuses:
-            status_dir = _status_dir(root, project_id, status)
+        def _in_scope(status):
+            return only_statuses is None or status in only_statuses
+
+        def _read(status):
             try:
-                index = read_index(root, project_id, status)
+                loaded = _read_check_index(root, project_id, status)
             except IntegrityError as e:
-                issue = {"type": "INDEX_ERROR", "status": status, "message": e.message}
+                loaded = e
+            names = _body_names(_status_dir(root, project_id, status)) if _in_scope(status) else None
+            return loaded, names
+
+        # index parsing and directory listings are independent per status
+        body_names = {}
+        for status, (loaded, names) in zip(project_statuses, _map_threads(_read, project_statuses, jobs)):
+            status_dir = _status_dir(root, project_id, status)
+            if _in_scope(status):
+                body_names[status] = names
+            misplaced = []
+            if isinstance(loaded, IntegrityError):
+                issue = {"type": "INDEX_ERROR", "status": status, "message": loaded.message}
                 # fix missing index file conservatively
-                if fix and e.message == "Missing required file" and os.path.isdir(status_dir):
+                if fix and loaded.message == "Missing required file" and os.path.isdir(status_dir):
                     index = {}
-                    index_map[status] = index
                     index_changed_statuses.add(status)
                     _record(issue, resolved=True, fixed_item={"type": "INDEX_CREATED", "status": status})
                 else:
                     _record(issue)
                     index_error_statuses.add(status)
                     continue
+            else:
+                index, misplaced = loaded
             index_map[status] = index
             for tid in index.keys():
                 id_to_statuses.setdefault(tid, []).append(status)
+            for tid in misplaced:
+                # tasks are only looked up in the shard their id hashes to
+                issue = {"type": "SHARD_MISPLACED", "status": status, "task_id": tid}
+                if fix:
+                    index_changed_statuses.add(status)
+                    _record(issue, resolved=True, fixed_item={"type": "SHARD_REWRITTEN", "status": status, "task_id": tid})
+                else:
+                    _record(issue)
 
         # resolve duplicates (keep newest updated_at)
         for task_id, sts in list(id_to_statuses.items()):
@@ -724,10 +3393,17 @@ def integrity_check(project_id, fix=False, locked=False):
                     candidate_body = _body_path(root, project_id, st, task_id)
                     if os.path.exists(candidate_body):
                         os.replace(candidate_body, winner_body)
+                        if body_names.get(st) is not None:
+                            body_names[st].discard(task_id)
+                        if body_names.get(winner) is not None:
+                            body_names[winner].add(task_id)
                         fixed.append({"type": "BODY_MOVED_FROM_DUPLICATE", "task_id": task_id, "from": st, "to": winner})
                         break
 
         for status in project_statuses:
+            # duplicate resolution may have changed an index outside only_statuses
+            if only_statuses is not None and status not in only_statuses and status not in index_changed_statuses:
+                continue
             status_dir = _status_dir(root, project_id, status)
             if not os.path.isdir(status_dir):
                 issue = {"type": "STATUS_DIR_MISSING", "status": status, "path": status_dir}
@@ -738,114 +3414,21 @@ def integrity_check(project_id, fix=False, locked=False):
 
             index = index_map.get(status, {})
             index_changed = status in index_changed_statuses
+            if status not in body_names:
+                body_names[status] = _body_names(status_dir)
+            names = body_names[status]
 
             for task_id, meta in list(index.items()):
+                checked, changed = _check_task_meta(status, task_id, meta, fix, _record)
+                if changed:
+                    index[task_id] = checked
+                    index_changed = True
                 if not isinstance(meta, dict):
-                    issue = {"type": "META_NOT_OBJECT", "status": status, "task_id": task_id}
-                    if fix:
-                        index[task_id] = _minimal_meta(task_id)
-                        index_changed = True
-                        _record(issue, resolved=True, fixed_item={"type": "META_REPLACED", "status": status, "task_id": task_id})
-                    else:
-                        _record(issue)
                     continue
 
-                # mismatches
-                if meta.get("task_id") != task_id:
-                    issue = {"type": "TASK_ID_MISMATCH", "status": status, "task_id": task_id}
-                    if fix:
-                        meta["task_id"] = task_id
-                        index_changed = True
-                        _record(issue, resolved=True, fixed_item={"type": "TASK_ID_FIXED", "status": status, "task_id": task_id})
-                    else:
-                        _record(issue)
-
-                for f in required_fields:
-                    if f not in meta:
-                        issue = {"type": "MISSING_FIELD", "status": status, "task_id": task_id, "field": f}
-                        if fix:
-                            if f == "task_id":
-                                meta["task_id"] = task_id
-                            else:
-                                meta[f] = now_utc_iso()
-                            index_changed = True
-                            _record(issue, resolved=True, fixed_item={"type": "FIELD_FILLED", "status": status, "task_id": task_id, "field": f})
-                        else:
-                            _record(issue)
-
-                # type hardening for known fields
-                for tf in ("created_at", "updated_at"):
-                    if tf in meta and not isinstance(meta.get(tf), str):
-                        issue = {"type": "FIELD_TYPE_INVALID", "status": status, "task_id": task_id, "field": tf}
-                        if fix:
-                            meta[tf] = now_utc_iso()
-                            index_changed = True
-                            _record(issue, resolved=True, fixed_item={"type": "FIELD_TYPE_FIXED", "status": status, "task_id": task_id, "field": tf})
-                        else:
-                            _record(issue)
-
-                if "tags" in meta:
-                    tags_val = meta.get("tags")
-                    tags_ok = False
-                    if isinstance(tags_val, list):
-                        tags_ok = all(isinstance(t, str) and t.strip() for t in tags_val)
-                    if not tags_ok:
-                        issue = {"type": "TAGS_INVALID", "status": status, "task_id": task_id}
-                        if fix:
-                            if isinstance(tags_val, list):
-                                meta["tags"] = [t for t in tags_val if isinstance(t, str) and t.strip()]
-                            else:
-                                meta["tags"] = []
-                            index_changed = True
-                            _record(issue, resolved=True, fixed_item={"type": "TAGS_NORMALIZED", "status": status, "task_id": task_id})
-                        else:
-                            _record(issue)
-
-                if "assignee" in meta and not isinstance(meta.get("assignee"), str):
-                    issue = {"type": "ASSIGNEE_INVALID", "status": status, "task_id": task_id}
-                    if fix:
-                        meta.pop("assignee", None)
-                        index_changed = True
-                        _record(issue, resolved=True, fixed_item={"type": "ASSIGNEE_REMOVED", "status": status, "task_id": task_id})
-                    else:
-                        _record(issue)
-
-                if "priority" in meta:
-                    prio = meta.get("priority")
-                    priority_ok = isinstance(prio, str)
-                    if priority_ok:
-                        try:
-                            validate_priority(prio)
-                        except ValidationError:
-                            priority_ok = False
-                    if not priority_ok:
-                        issue = {"type": "PRIORITY_INVALID", "status": status, "task_id": task_id, "priority": prio}
-                        if fix:
-                            meta.pop("priority", None)
-                            index_changed = True
-                            _record(issue, resolved=True, fixed_item={"type": "PRIORITY_REMOVED", "status": status, "task_id": task_id})
-                        else:
-                            _record(issue)
-
-                if "due_date" in meta:
-                    due = meta.get("due_date")
-                    due_ok = isinstance(due, str)
-                    if due_ok:
-                        try:
-                            validate_due_date(due)
-                        except ValidationError:
-                            due_ok = False
-                    if not due_ok:
-                        issue = {"type": "DUE_DATE_INVALID", "status": status, "task_id": task_id, "due_date": due}
-                        if fix:
-                            meta.pop("due_date", None)
-                            index_changed = True
-                            _record(issue, resolved=True, fixed_item={"type": "DUE_DATE_REMOVED", "status": status, "task_id": task_id})
-                        else:
-                            _record(issue)
-
                 body_path = _body_path(root, project_id, status, task_id)
-                if not os.path.exists(body_path):
+                has_body = task_id in names if names is not None else os.path.exists(body_path)
+                if not has_body:
                     issue = {"type": "MISSING_BODY", "status": status, "task_id": task_id, "path": body_path}
                     if fix:
                         write_text_atomic(body_path, "")
@@ -854,31 +3437,50 @@ def integrity_check(project_id, fix=False, locked=False):
                         _record(issue)
 
             # extra body files without index entry
-            try:
-                for name in os.listdir(status_dir):
-                    if not name.endswith(".md"):
-                        continue
-                    tid = name[:-3]
-                    if tid not in index:
-                        issue = {"type": "ORPHAN_BODY", "status": status, "task_id": tid, "path": os.path.join(status_dir, name)}
-                        if fix:
-                            # only auto-add if task_id not present elsewhere
-                            if tid not in id_to_statuses:
-                                index[tid] = _minimal_meta(tid)
-                                index_changed = True
-                                id_to_statuses.setdefault(tid, []).append(status)
-                                _record(issue, resolved=True, fixed_item={"type": "ORPHAN_INDEX_CREATED", "status": status, "task_id": tid})
-                            else:
-                                _record(issue)
-                        else:
-                            _record(issue)
-            except Exception:
+            if names is None:
                 issue = {"type": "STATUS_DIR_LIST_ERROR", "status": status, "path": status_dir}
                 _record(issue)
+                names = ()
+            for tid in sorted(names):
+                if tid not in index:
+                    issue = {"type": "ORPHAN_BODY", "status": status, "task_id": tid, "path": os.path.join(status_dir, tid + ".md")}
+                    if fix:
+                        # only auto-add if task_id not present elsewhere
+                        if tid not in id_to_statuses:
+                            index[tid] = _minimal_meta(tid)
+                            index_changed = True
+                            id_to_statuses.setdefault(tid, []).append(status)
+                            _record(issue, resolved=True, fixed_item={"type": "ORPHAN_INDEX_CREATED", "status": status, "task_id": tid})
+                        else:
+                            _record(issue)
+                    else:
+                        _record(issue)
 
-            if fix and index_changed:
+            # --fix also compacts the delta log back into index.json
+            if fix and (index_changed or os.path.exists(_delta_path(root, project_id, status))):
                 write_index(root, project_id, status, index)
 
+        if fix:
+            import search_index
+            if index_error_statuses:
+                _drop_locator(root, project_id)
+                search_index.drop(root, project_id)
+            else:
+                tasks = {}
+                for status in project_statuses:
+                    for task_id in index_map.get(status, {}):
+                        _locator_add(tasks, task_id, status)
+                _write_locator(root, project_id, project_statuses, tasks)
+                # a full --fix rebuilds an existing search index; the preflight leaves it to the next search
+                if only_statuses is None and search_index.exists(root, project_id):
+                    _build_search(root, project_id, project_statuses)
+            # a clean (or fully repaired) project becomes the new baseline for
+            # the incremental preflight; anything left over forces a full scan
+            if issues:
+                _drop_manifest(root, project_id)
+            else:
+                _record_manifest(root, project_id, bump=bool(fixed) or recovered)
+
         return found, issues, fixed
 
     if os.path.exists(_tx_path(root, project_id)):
@@ -906,3 +3508,67 @@ def integrity_check(project_id, fix=False, locked=False):
         "issues": issues,
         "found": found,
     }
+
+
+SCRUB_CHECKPOINT = ".integrity-scrub.json"
+
+
+def integrity_check_all(fix=False, jobs=1, budget_ms=None):
+    """`integrity-check --all-projects` in id order; with `budget_ms` it stops early and resumes from a checkpoint."""
+    import time
+    start = time.monotonic()
+    _validate_jobs(jobs)
+    if budget_ms is not None and budget_ms <= 0:
+        raise ValidationError("Budget must be > 0", {"budget_ms": budget_ms})
+    root = get_root()
+    projects = _discover_projects(root)
+    checkpoint = _read_scrub_checkpoint(root) if budget_ms is not None else None
+    failed = list(checkpoint["failed"]) if checkpoint else []
+    pending = [p for p in projects if checkpoint is None or p > checkpoint["after"]]
+
+    results = []
+    for project_id in pending:
+        if budget_ms is not None and results and (time.monotonic() - start) * 1000 >= budget_ms:
+            break
+        try:
+            result = integrity_check(project_id, fix=fix, jobs=jobs)
+        except TaskTrackingError as e:
+            # one unreadable or busy project does not stop the scrub
+            result = {"ok": False, "project_id": project_id, "error": {"code": e.code, "message": e.message, "details": e.details}}
+        results.append(result)
+        if not result["ok"]:
+            failed.append(project_id)
+
+    remaining = len(pending) - len(results)
+    if budget_ms is not None:
+        path = os.path.join(root, SCRUB_CHECKPOINT)
+        if remaining:
+            write_json_atomic(path, {"version": 1, "after": results[-1]["project_id"], "failed": failed})
+        elif os.path.exists(path):
+            remove_durable(path)
+    return {
+        # failures of earlier runs of the scrub count too
+        "ok": not failed,
+        "complete": remaining == 0,
+        "checked": len(results),
+        "remaining": remaining,
+        "failed_projects": failed,
+        "projects": results,
+    }
+
+
+def _read_scrub_checkpoint(root):
+    """Checkpoint of an unfinished budgeted scrub; None (start over) if there is none or it is unusable."""
+    path = os.path.join(root, SCRUB_CHECKPOINT)
+    if not os.path.exists(path):
+        return None
+    try:
+        data = read_json(path)
+    except IntegrityError:
+        return None
+    if not isinstance(data, dict) or data.get("version") != 1 or not isinstance(data.get("after"), str):
+        return None
+    failed = data.get("failed")
+    if not isinstance(failed, list) or not all(isinstance(p, str) for p in failed):
+        return None
+    return data
@@ -0,0 +1,290 @@
+import codecs
+import json
+import sqlite3
+from errors import IntegrityError
+from storage import get_durability
+import metrics
+
+# SQLite storage of one project (`<project>/tasks.sqlite`, WAL mode). Only
+# storage primitives live here; task semantics (validation, sort keys, posting
+# values, integrity rules) stay in service.py, which computes the indexed
+# column values it passes in.
+
+SCHEMA_VERSION = 1
+SORT_COLUMNS = ("created_at", "updated_at", "priority", "due_date")
+FILTER_COLUMNS = ("assignee", "priority")
+COLUMNS = SORT_COLUMNS + ("assignee",)
+SYNCHRONOUS = {"strict": "FULL", "batch": "NORMAL", "none": "OFF"}
+
+_SCHEMA = """
+CREATE TABLE settings (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE statuses (name TEXT PRIMARY KEY);
+CREATE TABLE tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    meta TEXT NOT NULL,
+    body TEXT NOT NULL DEFAULT '',
+    created_at TEXT,
+    updated_at TEXT,
+    priority TEXT,
+    due_date INTEGER,
+    assignee TEXT
+);
+CREATE TABLE tags (tag TEXT NOT NULL, task_id TEXT NOT NULL, PRIMARY KEY (tag, task_id)) WITHOUT ROWID;
+CREATE INDEX tags_task ON tags (task_id);
+CREATE INDEX tasks_status ON tasks (status);
+CREATE INDEX tasks_created_at ON tasks (created_at, task_id);
+CREATE INDEX tasks_updated_at ON tasks (updated_at, task_id);
+CREATE INDEX tasks_priority ON tasks (priority, task_id);
+CREATE INDEX tasks_due_date ON tasks (due_date, task_id);
+CREATE INDEX tasks_assignee ON tasks (assignee);
+"""
+
+# created by the first `search`; maintained by writes once present
+_SEARCH_SCHEMA = (
+    "CREATE TABLE search_docs (task_id TEXT PRIMARY KEY, length INTEGER NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE search_terms (term TEXT NOT NULL, task_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, task_id)) WITHOUT ROWID",
+    "CREATE INDEX search_terms_task ON search_terms (task_id)",
+)
+
+_PUT = (
+    "INSERT INTO tasks (task_id, status, meta, body, created_at, updated_at, priority, due_date, assignee) "
+    "VALUES (?1, ?2, ?3, COALESCE(?4, ''), ?5, ?6, ?7, ?8, ?9) "
+    "ON CONFLICT (task_id) DO UPDATE SET status = excluded.status, meta = excluded.meta, "
+    "body = COALESCE(?4, tasks.body), created_at = excluded.created_at, updated_at = excluded.updated_at, "
+    "priority = excluded.priority, due_date = excluded.due_date, assignee = excluded.assignee"
+)
+
+
+def connect(path):
+    """Connection in autocommit mode; callers open transactions explicitly."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={SYNCHRONOUS[get_durability()]}")
+    except sqlite3.DatabaseError as e:
+        conn.close()
+        raise IntegrityError("Database unreadable", {"path": path, "error": str(e)})
+    metrics.count("db_connects")
+    return conn
+
+
+def create(path, statuses, generation=0):
+    """Create the schema at `path`; returns the connection inside an open transaction."""
+    conn = connect(path)
+    try:
+        # executescript() would commit an already open transaction
+        conn.executescript("BEGIN IMMEDIATE;" + _SCHEMA)
+        conn.executemany("INSERT INTO settings (key, value) VALUES (?, ?)", [("schema_version", SCHEMA_VERSION), ("generation", generation)])
+        conn.executemany("INSERT INTO statuses (name) VALUES (?)", [(st,) for st in statuses])
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def statuses(conn):
+    return [row[0] for row in conn.execute("SELECT name FROM statuses ORDER BY name")]
+
+
+def add_status(conn, status):
+    conn.execute("INSERT OR IGNORE INTO statuses (name) VALUES (?)", (status,))
+
+
+def generation(conn):
+    row = conn.execute("SELECT value FROM settings WHERE key = 'generation'").fetchone()
+    return row[0] if row else 0
+
+
+def bump_generation(conn):
+    conn.execute("INSERT INTO settings (key, value) VALUES ('generation', 1) ON CONFLICT (key) DO UPDATE SET value = value + 1")
+
+
+def get(conn, task_id):
+    """`(status, meta_json)` of a task, or None."""
+    return conn.execute("SELECT status, meta FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+
+
+def read_body(conn, task_id):
+    row = conn.execute("SELECT body FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+    return row[0] if row else None
+
+
+def iter_body(conn, task_id, chunk_chars):
+    """Yield the body in chunks of about `chunk_chars` characters (nothing if there is no such task).
+
+    Uses incremental blob I/O where available (Python 3.11+), which reads only
+    the pages consumed; otherwise `substr()` windows of the stored text.
+    """
+    if hasattr(conn, "blobopen"):
+        row = conn.execute("SELECT rowid FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        with conn.blobopen("tasks", "body", row[0], readonly=True) as blob:
+            while True:
+                data = blob.read(chunk_chars)
+                chunk = decoder.decode(data, final=not data)
+                if chunk:
+                    yield chunk
+                if not data:
+                    return
+    start = 1
+    while True:
+        row = conn.execute("SELECT substr(body, ?, ?) FROM tasks WHERE task_id = ?", (start, chunk_chars, task_id)).fetchone()
+        if row is None or not row[0]:
+            return
+        yield row[0]
+        if len(row[0]) < chunk_chars:
+            return
+        start += chunk_chars
+
+
+def set_body(conn, task_id, text):
+    """Replace the body of an existing task; False if there is no such task."""
+    return conn.execute("UPDATE tasks SET body = ? WHERE task_id = ?", (text, task_id)).rowcount > 0
+
+
+def put(conn, task_id, status, meta, columns, tags, body=None):
+    """Insert or replace a task's row and tags; the body is kept unless given."""
+    meta_json = json.dumps(meta, ensure_ascii=False, sort_keys=True)
+    conn.execute(_PUT, (task_id, status, meta_json, body, *(columns[c] for c in COLUMNS)))
+    conn.execute("DELETE FROM tags WHERE task_id = ?", (task_id,))
+    conn.executemany("INSERT INTO tags (tag, task_id) VALUES (?, ?)", [(tag, task_id) for tag in tags])
+
+
+def iter_tasks(conn, with_body=False):
+    """Yield `(task_id, status, meta_json, columns, tags, body)` ordered by task_id.
+
+    `tags` is the sorted list stored in the tags table; `body` is None unless
+    `with_body`.
+    """
+    tags = {}
+    for tag, task_id in conn.execute("SELECT tag, task_id FROM tags ORDER BY task_id, tag"):
+        tags.setdefault(task_id, []).append(tag)
+    body = "body" if with_body else "NULL"
+    sql = f"SELECT task_id, status, meta, {body}, {', '.join(COLUMNS)} FROM tasks ORDER BY task_id"
+    for row in conn.execute(sql):
+        yield row[0], row[1], row[2], dict(zip(COLUMNS, row[4:])), tags.get(row[0], []), row[3]
+
+
+def has_search(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_docs'").fetchone() is not None
+
+
+def create_search(conn):
+    """Create the empty search tables (inside the caller's transaction)."""
+    for statement in _SEARCH_SCHEMA:
+        conn.execute(statement)
+
+
+def clear_search(conn):
+    conn.execute("DELETE FROM search_terms")
+    conn.execute("DELETE FROM search_docs")
+
+
+def put_search_doc(conn, task_id, length, tf):
+    """Replace the postings of a task; `tf` None removes them."""
+    conn.execute("DELETE FROM search_terms WHERE task_id = ?", (task_id,))
+    if tf is None:
+        conn.execute("DELETE FROM search_docs WHERE task_id = ?", (task_id,))
+        return
+    conn.execute("INSERT OR REPLACE INTO search_docs (task_id, length) VALUES (?, ?)", (task_id, length))
+    conn.executemany("INSERT INTO search_terms (term, task_id, tf) VALUES (?, ?, ?)", [(term, task_id, n) for term, n in tf.items()])
+
+
+def search_stats(conn):
+    """`(documents, total length)` of the search index."""
+    return tuple(conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM search_docs").fetchone())
+
+
+def search_postings(conn, term):
+    return dict(conn.execute("SELECT task_id, tf FROM search_terms WHERE term = ?", (term,)))
+
+
+def search_lengths(conn, task_ids):
+    lengths = {}
+    task_ids = list(task_ids)
+    for start in range(0, len(task_ids), 500):
+        part = task_ids[start:start + 500]
+        sql = f"SELECT task_id, length FROM search_docs WHERE task_id IN ({', '.join('?' * len(part))})"
+        lengths.update(conn.execute(sql, part))
+    return lengths
+
+
+def statuses_of(conn, task_ids):
+    """`{task_id: status}` of the given tasks."""
+    found = {}
+    task_ids = list(task_ids)
+    for start in range(0, len(task_ids), 500):
+        part = task_ids[start:start + 500]
+        sql = f"SELECT task_id, status FROM tasks WHERE task_id IN ({', '.join('?' * len(part))})"
+        found.update(conn.execute(sql, part))
+    return found
+
+
+def orphan_tags(conn):
+    return conn.execute("SELECT COUNT(*) FROM tags WHERE task_id NOT IN (SELECT task_id FROM tasks)").fetchone()[0]
+
+
+def drop_orphan_tags(conn):
+    conn.execute("DELETE FROM tags WHERE task_id NOT IN (SELECT task_id FROM tasks)")
+
+
+def quick_check(conn):
+    """None if `PRAGMA quick_check` passes, else its first message."""
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA quick_check")]
+    except sqlite3.DatabaseError as e:
+        return str(e)
+    return None if rows == ["ok"] else rows[0]
+
+
+def query(conn, statuses, filters, filter_mode, sort, desc, after=None):
+    """Count and rows of a list query, in the order of the filesystem backend.
+
+    `statuses` None means every status. `filters` are `(field, value)` pairs
+    on tags, assignee or priority. Rows
+    are `(key, task_id, status, meta_json)`: present keys first, ordered by
+    `(key, task_id)` (reversed when `desc`), then tasks without a value by
+    ascending task_id with key None. `after` is a cursor position.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(sort)
+    where = ["1"]
+    params = []
+    if statuses is not None:
+        where.append(f"status IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if filters:
+        clauses = []
+        for field, value in filters:
+            if field == "tags":
+                clauses.append("task_id IN (SELECT task_id FROM tags WHERE tag = ?)")
+            elif field in FILTER_COLUMNS:
+                clauses.append(f"{field} = ?")
+            else:
+                raise ValueError(field)
+            params.append(value)
+        where.append("(" + (" AND " if filter_mode == "and" else " OR ").join(clauses) + ")")
+    cond = " AND ".join(where)
+    total_count = conn.execute(f"SELECT COUNT(*) FROM tasks WHERE {cond}", params).fetchone()[0]
+    return total_count, _query_rows(conn, cond, params, sort, desc, after)
+
+
+def _query_rows(conn, cond, params, sort, desc, after):
+    order = "DESC" if desc else "ASC"
+    if after is None or after[0] is not None:
+        sql = f"SELECT {sort}, task_id, status, meta FROM tasks WHERE {cond} AND {sort} IS NOT NULL"
+        args = list(params)
+        if after is not None:
+            sql += f" AND ({sort}, task_id) {'<' if desc else '>'} (?, ?)"
+            args.extend(after)
+        sql += f" ORDER BY {sort} {order}, task_id {order}"
+        yield from conn.execute(sql, args)
+    sql = f"SELECT NULL, task_id, status, meta FROM tasks WHERE {cond} AND {sort} IS NULL"
+    args = list(params)
+    if after is not None and after[0] is None:
+        sql += " AND task_id > ?"
+        args.append(after[1])
+    yield from conn.execute(sql + " ORDER BY task_id", args)
@@ -1,10 +1,32 @@
+import contextlib
 import json
 import os
-import tempfile
+import stat
+import threading
+import time
 from errors import ValidationError, ConflictError, IntegrityError, NotFoundError
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to exclusive O_EXCL lock files
+    fcntl = None
 
 ROOT_ENV = "TASK_TRACKING_ROOT"
 DEFAULT_DIR = ".task_tracking"
+LOCK_TIMEOUT_ENV = "TASK_TRACKING_LOCK_TIMEOUT_MS"
+DURABILITY_ENV = "TASK_TRACKING_DURABILITY"
+DURABILITY_MODES = ("strict", "batch", "none")
+TIMINGS_ENV = "TASK_TRACKING_TIMINGS"
+CACHE_BYTES_ENV = "TASK_TRACKING_CACHE_BYTES"
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+LOCK_BACKOFF_INITIAL_MS = 2.0
+LOCK_BACKOFF_MAX_MS = 250.0
+
+# per-thread invocation state (lock timeout override, accumulated lock wait,
+# writes awaiting the durability barrier)
+_local = threading.local()
 
 
 def _validate_root_env_value(root_value):
@@ -19,7 +41,15 @@ def _validate_root_env_value(root_value):
         )
 
 
+def set_root(root):
+    """Root for the current thread (a library handle's); None = `TASK_TRACKING_ROOT` or the cwd default."""
+    _local.root = root
+
+
 def get_root():
+    root = getattr(_local, "root", None)
+    if root is not None:
+        return root
     root = os.getenv(ROOT_ENV)
     if not root:
         root = os.path.join(os.getcwd(), DEFAULT_DIR)
@@ -28,8 +58,82 @@ def get_root():
     return os.path.abspath(root)
 
 
+_real_roots = {}
+
+
+def _real_root(root):
+    # resolved once per process: the root is configuration, not task data
+    real = _real_roots.get(root)
+    if real is None:
+        real = os.path.realpath(root)
+        if os.path.isabs(root) and os.path.isdir(real):
+            _real_roots[root] = real
+    return real
+
+
+@contextlib.contextmanager
+def resolved_paths():
+    """Remember the results of `safe_join` in this thread until the block ends.
+
+    For the time a project lock is held: nothing else may replace the
+    project's directories by symlinks then, so each path is resolved once.
+    Nested blocks share the outer one's paths.
+    """
+    if getattr(_local, "paths", None) is not None:
+        yield
+        return
+    _local.paths = {}
+    try:
+        yield
+    finally:
+        _local.paths = None
+
+
 def safe_join(root, *parts):
-    root_real = os.path.realpath(root)
+    paths = getattr(_local, "paths", None)
+    if paths is None:
+        return _safe_join(root, parts)
+    key = (root,) + parts
+    path = paths.get(key)
+    if path is not None:
+        return path
+    name = parts[-1] if parts else ""
+    if len(parts) > 1 and os.name == "posix" and name not in ("", os.curdir, os.pardir) and os.sep not in name:
+        # the parent is resolved already: only the last component can be a new link
+        parent = safe_join(root, *parts[:-1])
+        metrics.count("paths_resolved")
+        path = os.path.join(parent, name)
+        try:
+            if stat.S_ISLNK(os.lstat(path).st_mode):
+                path = _safe_join(root, parts)
+        except OSError:
+            pass
+    else:
+        path = _safe_join(root, parts)
+    paths[key] = path
+    return path
+
+
+def _safe_join(root, parts):
+    metrics.count("paths_resolved")
+    root_real = _real_root(root)
+    relative = os.path.join(*parts) if parts else ""
+    names = [name for name in relative.split(os.sep) if name and name != os.curdir]
+    if not names:
+        return root_real
+    if os.name == "posix" and not os.path.isabs(relative) and os.pardir not in names:
+        # below the resolved root only a symlink can lead elsewhere: lstat the
+        # remaining components instead of resolving the whole path again
+        path = root_real
+        for i, name in enumerate(names):
+            path = os.path.join(path, name)
+            try:
+                if stat.S_ISLNK(os.lstat(path).st_mode):
+                    break
+            except OSError:
+                return os.path.join(path, *names[i + 1:])
+        else:
+            return path
     candidate = os.path.realpath(os.path.join(root, *parts))
     try:
         if os.path.commonpath([root_real, candidate]) != root_real:
@@ -42,23 +146,33 @@ def safe_join(root, *parts):
 
 def read_json(path):
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            raw = f.read()
     except FileNotFoundError:
         raise IntegrityError("Missing required file", {"path": path})
-    except json.JSONDecodeError:
+    metrics.count("files_read")
+    metrics.count("bytes_read", len(raw))
+    try:
+        return json.loads(raw)
+    except ValueError:
         raise IntegrityError("Invalid JSON", {"path": path})
 
 
+def _fsync(fd):
+    metrics.count("fsyncs")
+    try:
+        os.fsync(fd)
+    except Exception:
+        pass
+
+
 def _fsync_dir(directory):
     try:
         dir_fd = os.open(directory, getattr(os, "O_DIRECTORY", 0))
     except Exception:
         return
     try:
-        os.fsync(dir_fd)
-    except Exception:
-        pass
+        _fsync(dir_fd)
     finally:
         try:
             os.close(dir_fd)
@@ -66,19 +180,105 @@ def _fsync_dir(directory):
             pass
 
 
-def write_json_atomic(path, data):
+def get_durability():
+    """Durability mode of the current invocation (`TASK_TRACKING_DURABILITY`, default strict)."""
+    raw = _getenv(DURABILITY_ENV)
+    if not raw:
+        return "strict"
+    mode = raw.strip().lower()
+    if mode not in DURABILITY_MODES:
+        raise ValidationError(
+            "Invalid durability mode",
+            {"env": DURABILITY_ENV, "value": raw, "allowed": list(DURABILITY_MODES)},
+        )
+    return mode
+
+
+def _sync_now(critical):
+    """True if a write must be fsynced right away.
+
+    `critical` writes (the move journal) are synced immediately in `batch`
+    mode as well; everything else waits for sync_barrier().
+    """
+    mode = get_durability()
+    if critical:
+        return mode in ("strict", "batch")
+    return mode == "strict" and not getattr(_local, "deferring", False)
+
+
+def _defer_sync(path=None, directory=None, rebuildable=False):
+    # derived files are validated against index fingerprints on read, so a
+    # lost or torn copy is rebuilt; the barrier skips them
+    if rebuildable:
+        return
+    mode = get_durability()
+    if mode != "batch" and not (mode == "strict" and getattr(_local, "deferring", False)):
+        return
+    if getattr(_local, "pending_files", None) is None:
+        _local.pending_files = set()
+        _local.pending_dirs = set()
+    if path is not None:
+        _local.pending_files.add(path)
+    if directory is not None:
+        _local.pending_dirs.add(directory)
+
+
+def sync_barrier():
+    """fsync every file and directory written since the last barrier (durability `batch`)."""
+    files = getattr(_local, "pending_files", None)
+    dirs = getattr(_local, "pending_dirs", None)
+    _local.pending_files = None
+    _local.pending_dirs = None
+    for path in sorted(files or ()):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            # replaced or removed again later in the same command
+            continue
+        try:
+            _fsync(fd)
+        finally:
+            os.close(fd)
+    for directory in sorted(dirs or ()):
+        _fsync_dir(directory)
+
+
+@contextlib.contextmanager
+def deferred_sync():
+    """Sync the writes of the block together at its end instead of one by one (durability `strict`).
+
+    Many files written in a row (bulk import) then pay one pass of fsyncs,
+    each directory once. Critical writes are still synced right away; in
+    `batch` mode the writes wait for the invocation's barrier as usual.
+    """
+    if getattr(_local, "deferring", False):
+        yield
+        return
+    _local.deferring = True
+    try:
+        yield
+    finally:
+        _local.deferring = False
+    if get_durability() == "strict":
+        sync_barrier()
+
+
+def write_json_atomic(path, data, critical=False, rebuildable=False):
+    import tempfile
     directory = os.path.dirname(path)
+    sync = _sync_now(critical) and not rebuildable
     fd, tmp = tempfile.mkstemp(prefix=".tmp", dir=directory)
     try:
         with os.fdopen(fd, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, sort_keys=True)
             f.flush()
-            try:
-                os.fsync(f.fileno())
-            except Exception:
-                pass
+            if sync:
+                _fsync(f.fileno())
         os.replace(tmp, path)
-        _fsync_dir(directory)
+        if sync:
+            _fsync_dir(directory)
+        else:
+            _defer_sync(path, directory, rebuildable)
     finally:
         if os.path.exists(tmp):
             try:
@@ -88,18 +288,50 @@ def write_json_atomic(path, data):
 
 
 def write_text_atomic(path, text):
+    import tempfile
     directory = os.path.dirname(path)
+    sync = _sync_now(False)
     fd, tmp = tempfile.mkstemp(prefix=".tmp", dir=directory)
     try:
         with os.fdopen(fd, "w", encoding="utf-8") as f:
             f.write(text or "")
             f.flush()
+            if sync:
+                _fsync(f.fileno())
+        os.replace(tmp, path)
+        if sync:
+            _fsync_dir(directory)
+        else:
+            _defer_sync(path, directory)
+    finally:
+        if os.path.exists(tmp):
             try:
-                os.fsync(f.fileno())
-            except Exception:
+                os.remove(tmp)
+            except OSError:
                 pass
+
+
+@contextlib.contextmanager
+def atomic_output(path):
+    """A text file (no newline translation) that replaces `path` once the block completes.
+
+    An error in the block leaves `path` untouched.
+    """
+    import tempfile
+    directory = os.path.dirname(path) or "."
+    sync = _sync_now(False)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            yield f
+            f.flush()
+            if sync:
+                _fsync(f.fileno())
         os.replace(tmp, path)
-        _fsync_dir(directory)
+        if sync:
+            _fsync_dir(directory)
+        else:
+            _defer_sync(path, directory)
     finally:
         if os.path.exists(tmp):
             try:
@@ -108,6 +340,72 @@ def write_text_atomic(path, text):
                 pass
 
 
+def append_line_durable(path, line, rebuildable=False):
+    """Append one newline-terminated record and fsync it (`rebuildable` logs are not synced).
+
+    A torn record left by an interrupted earlier append (no trailing
+    newline) was never acknowledged and is cut off first.
+    """
+    created = not os.path.exists(path)
+    sync = _sync_now(False) and not rebuildable
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        size = os.fstat(fd).st_size
+        if size and os.pread(fd, 1, size - 1) != b"\n":
+            os.ftruncate(fd, os.pread(fd, size, 0).rfind(b"\n") + 1)
+        os.write(fd, line.encode("utf-8") + b"\n")
+        if sync:
+            _fsync(fd)
+    finally:
+        os.close(fd)
+    directory = os.path.dirname(path) if created else None
+    if sync:
+        if directory is not None:
+            _fsync_dir(directory)
+    else:
+        _defer_sync(path, directory, rebuildable)
+
+
+def read_appended_lines(path):
+    """Complete records of a log written by append_line_durable; empty if there is no log."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return []
+    metrics.count("files_read")
+    metrics.count("bytes_read", len(raw))
+    return raw.split(b"\n")[:-1]
+
+
+def replace_durable(src, dst):
+    """Rename `src` over `dst`; synced right away as it commits a layout switch."""
+    os.replace(src, dst)
+    if _sync_now(True):
+        _fsync_dir(os.path.dirname(dst))
+    else:
+        _defer_sync(directory=os.path.dirname(dst))
+
+
+def sync_dir(directory):
+    """Make renames into and out of `directory` durable (right away, or at the barrier in `batch` mode)."""
+    if _sync_now(False):
+        _fsync_dir(directory)
+    else:
+        _defer_sync(directory=directory)
+
+
+def remove_durable(path, rebuildable=False):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    if _sync_now(False) and not rebuildable:
+        _fsync_dir(os.path.dirname(path))
+    else:
+        _defer_sync(directory=os.path.dirname(path), rebuildable=rebuildable)
+
+
 def _pid_alive(pid):
     try:
         pid = int(pid)
@@ -123,15 +421,189 @@ def _pid_alive(pid):
         return True
 
 
+def set_env_overrides(env):
+    """Per-thread TASK_TRACKING_* values that take precedence over os.environ."""
+    _local.env = dict(env) if env else None
+
+
+def _getenv(name):
+    env = getattr(_local, "env", None)
+    if env and name in env:
+        return env[name]
+    return os.getenv(name)
+
+
+def get_cache_max_bytes():
+    """Memory budget of long-lived caches (`TASK_TRACKING_CACHE_BYTES`, default 256 MiB)."""
+    raw = _getenv(CACHE_BYTES_ENV)
+    if not raw:
+        return DEFAULT_CACHE_BYTES
+    try:
+        value = int(raw)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise ValidationError("Cache size must be >= 0", {"env": CACHE_BYTES_ENV, "value": raw})
+    return value
+
+
+def timings_requested():
+    """True if `TASK_TRACKING_TIMINGS` asks for the timings object."""
+    raw = _getenv(TIMINGS_ENV)
+    return bool(raw) and raw.strip().lower() not in ("0", "off", "false", "no")
+
+
+def set_lock_timeout_ms(value):
+    """Override the lock timeout for the current thread (None = use the env var)."""
+    if value is not None and (not isinstance(value, int) or value < 0):
+        raise ValidationError("Lock timeout must be >= 0", {"lock_timeout_ms": value})
+    _local.lock_timeout_ms = value
+
+
+def get_lock_timeout_ms():
+    value = getattr(_local, "lock_timeout_ms", None)
+    if value is not None:
+        return value
+    raw = _getenv(LOCK_TIMEOUT_ENV)
+    if not raw:
+        return 0
+    try:
+        value = int(raw)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise ValidationError("Lock timeout must be >= 0", {"env": LOCK_TIMEOUT_ENV, "value": raw})
+    return value
+
+
+def reset_lock_wait():
+    _local.lock_wait_ms = 0.0
+
+
+def add_lock_wait(wait_ms):
+    _local.lock_wait_ms = get_lock_wait_ms() + wait_ms
+
+
+def thread_context():
+    """Settings of the current invocation, for `use_thread_context` in a worker thread."""
+    return {
+        "env": getattr(_local, "env", None),
+        "lock_timeout_ms": getattr(_local, "lock_timeout_ms", None),
+        "root": getattr(_local, "root", None),
+    }
+
+
+def use_thread_context(context):
+    _local.env = context["env"]
+    _local.lock_timeout_ms = context["lock_timeout_ms"]
+    _local.root = context["root"]
+    _local.lock_wait_ms = 0.0
+
+
+def get_lock_wait_ms():
+    return getattr(_local, "lock_wait_ms", 0.0)
+
+
+def _lock_conflict(lock_path, waited_ms=None):
+    details = {"lock": lock_path, "reason": "LOCKED"}
+    if waited_ms is not None:
+        details["lock_wait_ms"] = round(waited_ms, 3)
+    return ConflictError("Project is locked", details)
+
+
 class ProjectLock:
-    def __init__(self, project_dir):
+    """Project lock on `<project>/.lock`.
+
+    Where `fcntl` is available the lock is an advisory `flock`: read-only
+    commands take it shared, mutations exclusive. The file itself stays in
+    place; while an exclusive holder runs it contains `{"pid": ...}` so that
+    pid-style locks (stale or foreign) keep their previous semantics.
+    Without `fcntl` (Windows) every lock is exclusive via `O_CREAT|O_EXCL`.
+
+    With a lock timeout (`timeout_ms`, default from `get_lock_timeout_ms()`)
+    a held lock is retried with jittered exponential backoff until the
+    deadline instead of failing immediately; the time spent waiting is
+    added to the per-thread `get_lock_wait_ms()` total.
+    """
+
+    def __init__(self, project_dir, shared=False, timeout_ms=None):
         self.project_dir = project_dir
         self.lock_path = os.path.join(project_dir, ".lock")
+        self.shared = shared
+        self.timeout_ms = timeout_ms
+        self.wait_ms = 0.0
         self.fd = None
+        self._flocked = False
 
     def __enter__(self):
         if not os.path.isdir(self.project_dir):
             raise NotFoundError("Project not found", {"path": self.project_dir})
+        metrics.count("locks_shared" if self.shared else "locks_exclusive")
+        with metrics.phase("lock"):
+            return self._acquire()
+
+    def _acquire(self):
+        timeout_ms = self.timeout_ms if self.timeout_ms is not None else get_lock_timeout_ms()
+        acquire = self._enter_exclusive_file if fcntl is None else self._enter_flock
+        if timeout_ms <= 0:
+            return acquire()
+
+        import random
+        start = time.monotonic()
+        deadline = start + timeout_ms / 1000.0
+        delay_ms = LOCK_BACKOFF_INITIAL_MS
+        while True:
+            try:
+                acquire()
+            except ConflictError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._add_wait(start)
+                    raise _lock_conflict(self.lock_path, self.wait_ms)
+                time.sleep(min(remaining, random.uniform(0.5, 1.0) * delay_ms / 1000.0))
+                delay_ms = min(delay_ms * 2, LOCK_BACKOFF_MAX_MS)
+                continue
+            self._add_wait(start)
+            return self
+
+    def _add_wait(self, start):
+        self.wait_ms = (time.monotonic() - start) * 1000.0
+        add_lock_wait(self.wait_ms)
+
+    def _enter_flock(self):
+        fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise _lock_conflict(self.lock_path)
+        try:
+            content = os.pread(fd, 4096, 0).decode("utf-8", errors="replace").strip()
+            if content:
+                # a pid payload we could still lock: a crashed holder or a pid-style lock
+                try:
+                    data = json.loads(content)
+                    pid = data.get("pid")
+                except Exception:
+                    raise _lock_conflict(self.lock_path)
+                if pid is None or _pid_alive(pid):
+                    raise _lock_conflict(self.lock_path)
+                if self.shared:
+                    os.ftruncate(fd, 0)
+            if not self.shared:
+                payload = json.dumps({"pid": os.getpid()}).encode("utf-8")
+                os.ftruncate(fd, 0)
+                os.pwrite(fd, payload, 0)
+        except BaseException:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+            raise
+        self.fd = fd
+        self._flocked = True
+        return self
+
+    def _enter_exclusive_file(self):
         try:
             self.fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
             payload = json.dumps({"pid": os.getpid()})
@@ -145,10 +617,10 @@ class ProjectLock:
                 data = json.loads(content)
                 pid = data.get("pid")
             except Exception:
-                raise ConflictError("Project is locked", {"lock": self.lock_path, "reason": "LOCKED"})
+                raise _lock_conflict(self.lock_path)
 
             if pid is None or _pid_alive(pid):
-                raise ConflictError("Project is locked", {"lock": self.lock_path, "reason": "LOCKED"})
+                raise _lock_conflict(self.lock_path)
 
             # stale lock: remove and acquire again
             try:
@@ -159,9 +631,21 @@ class ProjectLock:
                 os.write(self.fd, payload.encode("utf-8"))
                 return self
             except Exception:
-                raise ConflictError("Project is locked", {"lock": self.lock_path, "reason": "LOCKED"})
+                raise _lock_conflict(self.lock_path)
 
     def __exit__(self, exc_type, exc, tb):
+        # the end of a locked section is the durability barrier of a command
+        sync_barrier()
+        if self._flocked:
+            try:
+                if not self.shared:
+                    os.ftruncate(self.fd, 0)
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self.fd)
+                self.fd = None
+                self._flocked = False
+            return
         try:
             if self.fd is not None:
                 os.close(self.fd)
@@ -1,5 +1,15 @@
 #!/usr/bin/env python3
-from cli import main
+import sys
+import client
+
+
+def _run(argv):
+    exit_code = client.forward(argv)
+    if exit_code is not None:
+        return exit_code
+    from cli import main
+    return main(argv)
+
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(_run(sys.argv[1:]))
@@ -1,5 +1,3 @@
-import datetime
-
-
 def now_utc_iso():
+    import datetime
     return datetime.datetime.now(datetime.timezone.utc).isoformat()
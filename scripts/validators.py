@@ -1,5 +1,4 @@
 import re
-import datetime
 from errors import ValidationError
 
 ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
@@ -46,6 +45,7 @@ def validate_priority(priority):
 def _parse_iso(date_str: str):
     if date_str is None:
         return None
+    import datetime
     s = date_str
     if s.endswith("Z"):
         s = s[:-1] + "+00:00"
@@ -61,6 +61,7 @@ def _parse_iso(date_str: str):
 def parse_due_date(due_date):
     if due_date is None:
         return None
+    import datetime
     val = _parse_iso(due_date)
     # normalize date to datetime at midnight UTC for sorting
     if isinstance(val, datetime.date) and not isinstance(val, datetime.datetime):
@@ -74,3 +75,15 @@ def validate_due_date(due_date):
     if due_date is None:
         return
     _parse_iso(due_date)
+
+
+def normalize_timestamp(value, field_name: str):
+    """An ISO 8601 date/datetime as a UTC datetime string (the form `created_at`/`updated_at` are stored in)."""
+    import datetime
+    if not isinstance(value, str):
+        raise ValidationError("Invalid ISO 8601 date/datetime", {field_name: value})
+    try:
+        parsed = parse_due_date(value)
+    except ValidationError:
+        raise ValidationError("Invalid ISO 8601 date/datetime", {field_name: value})
+    return parsed.astimezone(datetime.timezone.utc).isoformat()